@@ -0,0 +1,85 @@
+"""Decoding stored tunes: a TuneCodec.decode() per tune versus one
+TuneCodec.decode_many() call for all of them
+
+Each tune is --tunes sets of random page bytes. [PcVariables] are 0.
+Reports the time to build the codecs, then to decode every tune each way.
+
+Usage:
+  python -m benchmarks.codec_benchmark [--files "speeduino*.ini"] [--tunes 1000]
+"""
+
+import argparse
+import io
+import sys
+
+import numpy
+
+from ts_ini_parser import TsIniParser, DataClassTransformer, TuneCodec
+from ts_ini_parser.codec import expression_text
+from ts_ini_parser.expressions import ExpressionCompiler, computed_channels
+from . import harness
+from .expression_benchmark import placeholder_functions
+
+
+def make_compiler(ini_file):
+    """An expression compiler with placeholders for the TunerStudio functions
+    the INI file's expressions call that the compiler doesn't have"""
+    expressions = computed_channels(ini_file)
+    for page in ini_file['Constants'].values():
+        for variable in page.values():
+            for factor in ('scale', 'translate'):
+                expression = expression_text(getattr(variable, factor, None))
+                if expression is not None:
+                    expressions[f'{variable.name}.{factor}'] = expression
+    return ExpressionCompiler(placeholder_functions(expressions))
+
+
+def make_codec(ini_file):
+    return TuneCodec(ini_file, make_compiler(ini_file))
+
+
+def random_tune(codec, ini_file, tunes=None):
+    """Random page bytes & the constants to decode them: [PcVariables] are 0.
+    A page array per page number: (tunes, page size) or (page size,)"""
+    generator = numpy.random.default_rng(0)
+    shape = () if tunes is None else (tunes,)
+    pages = {page_num: generator.integers(0, 256, shape + (page.size,), dtype=numpy.uint8)
+             for page_num, page in codec.pages.items()}
+    return pages, dict.fromkeys(ini_file.get('PcVariables', {}), 0)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='speeduino*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--tunes', type=int, default=1000)
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    rows = []
+    for path in harness.corpus_files(args.files):
+        try:
+            ini_file = DataClassTransformer().transform(parser.parse(io.StringIO(harness.read_ini(path))))
+            build_s, codec = harness.measure_time(lambda f=ini_file: make_codec(f), args.repeat)
+            pages, constants = random_tune(codec, ini_file, args.tunes)
+            tunes_bytes = sum(page.nbytes for page in pages.values())
+            per_tune_s, _ = harness.measure_time(
+                lambda: [codec.decode({page_num: page[tune] for page_num, page in pages.items()}, constants)
+                         for tune in range(args.tunes)], args.repeat)
+            many_s, _ = harness.measure_time(lambda: codec.decode_many(pages, constants), args.repeat)
+        except Exception as error:  # pylint: disable=broad-except
+            rows.append([path.name, f'{type(error).__name__}: {error}', '-', '-', '-', '-'])
+            continue
+        rows.append([path.name, harness.format_seconds(build_s), harness.format_bytes(tunes_bytes),
+                     harness.format_seconds(per_tune_s), harness.format_seconds(many_s),
+                     f'{per_tune_s / many_s:.1f}x'])
+
+    harness.print_table(['file', 'build', 'tunes', 'per tune', 'decode_many', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
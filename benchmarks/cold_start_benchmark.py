@@ -0,0 +1,73 @@
+"""Cold start: `import ts_ini_parser` & the first TsIniParser() in a new process
+
+Each step is timed in a fresh interpreter (as a CLI tool or a serverless job
+would run), with the grammar cache warm, cold (an empty cache folder) and
+turned off. Reports the median over --runs processes.
+
+Usage:
+  python -m benchmarks.cold_start_benchmark [--runs 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from ts_ini_parser.grammar_cache import CACHE_DIR_VARIABLE
+from . import harness
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import ts_ini_parser
+imported = time.perf_counter()
+lark = 'lark' in sys.modules
+ts_ini_parser.TsIniParser()
+created = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'parser_s': created - imported, 'lark': lark}))
+'''
+
+_ROOT = Path(__file__).parent.parent
+
+
+def run_probe(cache_dir):
+    environment = dict(os.environ)
+    environment[CACHE_DIR_VARIABLE] = cache_dir
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [str(_ROOT), environment.get('PYTHONPATH')]))
+    output = subprocess.run([sys.executable, '-c', _PROBE], env=environment, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--runs', type=int, default=10)
+    args = arg_parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        warm_dir = str(Path(folder) / 'warm')
+        run_probe(warm_dir)
+        cases = [
+            ('warm', lambda: run_probe(warm_dir)),
+            # A new, empty folder every run
+            ('cold', lambda: run_probe(tempfile.mkdtemp(dir=folder))),
+            ('off', lambda: run_probe('')),
+        ]
+        for label, probe in cases:
+            results = [probe() for _ in range(args.runs)]
+            rows.append([label,
+                         harness.format_seconds(statistics.median(result['import_s'] for result in results)),
+                         harness.format_seconds(statistics.median(result['parser_s'] for result in results)),
+                         'yes' if any(result['lark'] for result in results) else 'no'])
+
+    harness.print_table(['grammar cache', 'import ts_ini_parser', 'first TsIniParser()', 'import loads Lark'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Per-stage benchmark over every INI file in tests/Test_Files
+
+Each file is put through the three pipeline stages separately:
+
+  pre_process - TsIniPreProcessor (#if etc.)
+  parse       - the TsIniParser LALR pass over the preprocessed tree
+  transform   - DataClassTransformer
+
+plus "streamed": pre_process & parse in a single pass using
+TsIniParser(streaming=True), which never builds the preprocessed tree.
+
+For each stage the wall time, peak traced memory and net allocated blocks of each
+stage are reported, plus the pre_process throughput (MB/s of INI text).
+
+Usage:
+  python -m benchmarks.corpus_benchmark --save baseline.json
+  python -m benchmarks.corpus_benchmark --compare baseline.json
+
+--compare exits with status 1 if any stage regressed by more than
+--tolerance.
+"""
+
+import argparse
+import io
+import sys
+from pathlib import Path
+
+from ts_ini_parser import TsIniParser, DataClassTransformer
+from . import harness
+
+STAGES = ('pre_process', 'parse', 'transform', 'streamed')
+
+
+def benchmark_file(path: Path, parser: TsIniParser, streaming_parser: TsIniParser,
+                   repeat: int, memory: bool) -> harness.FileResult:
+    text = harness.read_ini(path)
+    result = harness.FileResult(lines=text.count('\n'), size_bytes=len(text.encode('latin-1')))
+
+    stage_funcs = (
+        ('pre_process', lambda _: parser.pre_process(io.StringIO(text))),
+        ('parse', parser.parse_pre_processed),
+        ('transform', lambda tree: DataClassTransformer().transform(tree)),
+    )
+    stage_input = None
+    for stage, func in stage_funcs:
+        metrics, stage_input = harness.run_stage(lambda f=func, i=stage_input: f(i), repeat, memory)
+        result.stages[stage] = metrics
+        if metrics.error:
+            break
+
+    result.stages['streamed'], _ = harness.run_stage(lambda: streaming_parser.parse(io.StringIO(text)),
+                                                     repeat, memory)
+    return result
+
+
+def print_results(results):
+    rows = []
+    totals = {stage: 0.0 for stage in STAGES}
+    total_bytes = 0
+    for name, result in results.items():
+        pre_process = result.stages.get('pre_process')
+        row = [name, result.lines, _throughput(result.size_bytes, pre_process)]
+        if pre_process is not None and not pre_process.error:
+            total_bytes += result.size_bytes
+        for stage in STAGES:
+            metrics = result.stages.get(stage)
+            if metrics is None or metrics.error:
+                row.extend(['error' if metrics else '-', '-'])
+                continue
+            totals[stage] += metrics.wall_s
+            row.extend([harness.format_seconds(metrics.wall_s), harness.format_bytes(metrics.peak_bytes)])
+        rows.append(row)
+    rows.append(['TOTAL', '', f'{total_bytes / 1e6 / totals["pre_process"]:.2f}' if totals['pre_process'] else '-']
+                + [cell for stage in STAGES for cell in (harness.format_seconds(totals[stage]), '')])
+
+    headers = ['file', 'lines', 'pre_process MB/s']
+    for stage in STAGES:
+        headers.extend([f'{stage} time', f'{stage} peak'])
+    harness.print_table(headers, rows)
+
+    for name, result in results.items():
+        for stage, metrics in result.stages.items():
+            if metrics.error:
+                print(f'{name}: {stage} failed: {metrics.error}')
+
+
+def _throughput(size_bytes, metrics) -> str:
+    if metrics is None or metrics.error or not metrics.wall_s:
+        return '-'
+    return f'{size_bytes / 1e6 / metrics.wall_s:.2f}'
+
+
+def _format_metric(metric, value):
+    return harness.format_seconds(value) if metric == 'wall_s' else harness.format_bytes(value)
+
+
+def print_regressions(regressions):
+    if not regressions:
+        print('No regressions')
+        return
+    print(f'{len(regressions)} regression(s):')
+    harness.print_table(
+        ['file', 'stage', 'metric', 'baseline', 'current', 'ratio'],
+        [[r.file_name, r.stage, r.metric, _format_metric(r.metric, r.baseline), _format_metric(r.metric, r.current),
+          f'{r.ratio:.2f}'] for r in regressions])
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Timing runs per stage (best is kept)')
+    arg_parser.add_argument('--define', action='append', help='Preprocessor symbol (repeatable)')
+    arg_parser.add_argument('--no-memory', action='store_true', help='Skip the (slow) tracemalloc pass')
+    arg_parser.add_argument('--save', type=Path, help='Write the results to this JSON file')
+    arg_parser.add_argument('--compare', type=Path, help='Compare the results against this JSON file')
+    arg_parser.add_argument('--tolerance', type=float, default=0.15,
+                            help='Allowed fractional growth before a metric counts as a regression')
+    args = arg_parser.parse_args(argv)
+
+    defines = args.define if args.define is not None else harness.DEFAULT_DEFINES
+    parser = TsIniParser(ignore_hash_error=True)
+    streaming_parser = TsIniParser(ignore_hash_error=True, streaming=True)
+    for symbol in defines:
+        parser.define(symbol, True)
+        streaming_parser.define(symbol, True)
+
+    results = {}
+    for path in harness.corpus_files(args.files):
+        print(f'Benchmarking {path.name}', file=sys.stderr)
+        results[path.name] = benchmark_file(path, parser, streaming_parser, args.repeat, not args.no_memory)
+
+    print_results(results)
+
+    if args.save:
+        harness.save_results(args.save, results, {'repeat': args.repeat, 'defines': list(defines)})
+    if args.compare:
+        regressions = harness.compare_results(harness.load_results(args.compare), results, args.tolerance)
+        print_regressions(regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""How fast is diff_ini once the files are parsed?
+
+Diffs consecutive revisions of a firmware's INI file (the corpus files
+matching --files, in name order) and reports, per pair:
+
+  hash - ContentHasher over both models (the one off cost)
+  cold - diff_ini with a new hasher, so including the hashing
+  warm - diff_ini reusing the hasher of the files
+  same - diff_ini of a file against itself (the O(1) case)
+
+Usage:
+  python -m benchmarks.diff_benchmark [--files "MS3Format0262*.ini"] [--repeat 5]
+"""
+
+import argparse
+import io
+import sys
+
+from ts_ini_parser import TsIniParser, ContentHasher, diff_ini
+from . import harness
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='MS3Format0*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True, pre_processor_backend='scanner')
+    defines = dict.fromkeys(harness.DEFAULT_DEFINES, True)
+    models = []
+    for path in sorted(harness.corpus_files(args.files)):
+        try:
+            models.append((path, parser.parse_model(io.StringIO(harness.read_ini(path)), defines)))
+        except Exception as error:  # pylint: disable=broad-except
+            print(f'{path.name}: {type(error).__name__}', file=sys.stderr)
+
+    hasher = ContentHasher()
+    rows = []
+    for (old_path, old), (new_path, new) in zip(models, models[1:]):
+        hash_s, _ = harness.measure_time(lambda o=old, n=new: (ContentHasher()(o), ContentHasher()(n)), args.repeat)
+        cold_s, diff = harness.measure_time(lambda o=old, n=new: diff_ini(o, n), args.repeat)
+        warm_s, _ = harness.measure_time(lambda o=old, n=new: diff_ini(o, n, hasher), args.repeat)
+        same_s, _ = harness.measure_time(lambda n=new: diff_ini(n, n, hasher), args.repeat)
+        rows.append([f'{old_path.stem} -> {new_path.stem}', len(diff.changes), harness.format_seconds(hash_s),
+                     harness.format_seconds(cold_s), harness.format_seconds(warm_s), harness.format_seconds(same_s)])
+    harness.print_table(['pair', 'changes', 'hash', 'cold', 'warm', 'same'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""INI file to TsIniFile: via the parse tree versus parse_model()
+
+For each file reports the wall time & peak traced memory of:
+  tree   - TsIniParser.parse (preprocessed tree, then the parse tree)
+           followed by DataClassTransformer
+  direct - TsIniParser.parse_model: the model is built by the parser
+           callbacks from the streamed preprocessor lines, no Tree
+
+Usage:
+  python -m benchmarks.direct_model_benchmark [--files "MS3*.ini"] [--no-memory]
+"""
+
+import argparse
+import io
+import sys
+
+from ts_ini_parser import TsIniParser, DataClassTransformer
+from . import harness
+
+MODES = ('tree', 'direct')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='MS3*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Timing runs per mode (best is kept)')
+    arg_parser.add_argument('--no-memory', action='store_true', help='Skip the (slow) tracemalloc pass')
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    rows = []
+    totals = {mode: [0.0, 0] for mode in MODES}
+    for path in harness.corpus_files(args.files):
+        print(f'Benchmarking {path.name}', file=sys.stderr)
+        text = harness.read_ini(path)
+        funcs = {
+            'tree': lambda t=text: DataClassTransformer().transform(parser.parse(io.StringIO(t))),
+            'direct': lambda t=text: parser.parse_model(io.StringIO(t)),
+        }
+        metrics = {mode: harness.run_stage(funcs[mode], args.repeat, not args.no_memory)[0] for mode in MODES}
+        errors = [f'{mode}: {metrics[mode].error}' for mode in MODES if metrics[mode].error]
+        if errors:
+            print(f'{path.name}: {"; ".join(errors)}', file=sys.stderr)
+            continue
+        row = [path.name]
+        for mode in MODES:
+            totals[mode][0] += metrics[mode].wall_s
+            totals[mode][1] = max(totals[mode][1], metrics[mode].peak_bytes or 0)
+            row.extend([harness.format_seconds(metrics[mode].wall_s), harness.format_bytes(metrics[mode].peak_bytes)])
+        row.append(f'{metrics["tree"].wall_s / metrics["direct"].wall_s:.2f}x')
+        rows.append(row)
+
+    rows.append(['TOTAL (peak: max)']
+                + [cell for mode in MODES
+                   for cell in (harness.format_seconds(totals[mode][0]),
+                                harness.format_bytes(totals[mode][1] or None))]
+                + [f'{totals["tree"][0] / totals["direct"][0]:.2f}x' if totals['direct'][0] else '-'])
+    harness.print_table(['file', 'tree time', 'tree peak', 'direct time', 'direct peak', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
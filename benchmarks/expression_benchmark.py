@@ -0,0 +1,92 @@
+"""Evaluating the computed OutputChannels over a datalog
+
+For each file, evaluates every computed channel over --rows rows of
+random channel values. Reports:
+  compile    - compiling every expression (scalar & vectorized)
+  per row    - the scalar functions, called once per row
+  vectorized - evaluate_channels(), once per channel over whole columns
+
+Usage:
+  python -m benchmarks.expression_benchmark [--files "speeduino*.ini"] [--rows 10000]
+"""
+
+import argparse
+import io
+import sys
+
+import numpy
+
+from ts_ini_parser import TsIniParser, DataClassTransformer
+from ts_ini_parser.expressions import ExpressionCompiler, computed_channels, evaluate_channels
+from . import harness
+
+
+def placeholder_functions(expressions):
+    """Functions that TunerStudio provides but the compiler doesn't (e.g.
+    arrayValue): they return their first argument"""
+    compiler = ExpressionCompiler()
+    names = set()
+    for expression in expressions.values():
+        names |= compiler.compile(expression).functions
+    return {name: lambda *args: args[0] if args else 0 for name in names}
+
+
+def compile_all(expressions, functions):
+    compiler = ExpressionCompiler(functions)
+    for expression in expressions.values():
+        compiler.compile(expression)
+        compiler.compile(expression, vectorized=True)
+    return compiler
+
+
+def input_columns(expressions, compiler, rows):
+    # Every identifier that isn't a computed channel is an input
+    names = set()
+    for expression in expressions.values():
+        names |= compiler.compile(expression).identifiers
+    generator = numpy.random.default_rng(0)
+    return {name: generator.integers(1, 256, rows).astype(float) for name in names - set(expressions)}
+
+
+def evaluate_per_row(expressions, compiler, columns, rows):
+    for row in range(rows):
+        values = {name: column[row] for name, column in columns.items()}
+        evaluate_channels(expressions, values, compiler=compiler, vectorized=False)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='speeduino*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--rows', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    rows = []
+    for path in harness.corpus_files(args.files):
+        expressions = {}
+        try:
+            ini_file = DataClassTransformer().transform(parser.parse(io.StringIO(harness.read_ini(path))))
+            expressions = computed_channels(ini_file)
+            functions = placeholder_functions(expressions)
+            compile_s, compiler = harness.measure_time(lambda e=expressions: compile_all(e, functions), args.repeat)
+            columns = input_columns(expressions, compiler, args.rows)
+            row_s, _ = harness.measure_time(
+                lambda e=expressions: evaluate_per_row(e, compiler, columns, args.rows), args.repeat)
+            vector_s, _ = harness.measure_time(
+                lambda e=expressions: evaluate_channels(e, columns, compiler=compiler), args.repeat)
+        except Exception as error:  # pylint: disable=broad-except
+            rows.append([path.name, len(expressions), f'{type(error).__name__}: {error}', '-', '-', '-'])
+            continue
+        rows.append([path.name, len(expressions), harness.format_seconds(compile_s), harness.format_seconds(row_s),
+                     harness.format_seconds(vector_s), f'{row_s / vector_s:.1f}x'])
+
+    harness.print_table(['file', 'channels', 'compile', 'per row', 'vectorized', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Decoding captured realtime frames: FrameDecoder.decode() per frame versus
+one FrameDecoder.decode_many() call for the whole capture
+
+Each capture is --frames random [OutputChannels] frames (10,000 is under 2
+minutes at 100Hz), decoded with a random tune's constants. Every channel
+in the frame is decoded. Reports frames per second each way.
+
+Usage:
+  python -m benchmarks.frames_benchmark [--files "speeduino*.ini"] [--frames 10000]
+"""
+
+import argparse
+import io
+import sys
+
+import numpy
+
+from ts_ini_parser import TsIniParser, DataClassTransformer, FrameDecoder
+from . import harness
+from .codec_benchmark import make_compiler, make_codec, random_tune
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='speeduino*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--frames', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    rows = []
+    for path in harness.corpus_files(args.files):
+        try:
+            ini_file = DataClassTransformer().transform(parser.parse(io.StringIO(harness.read_ini(path))))
+            decoder = FrameDecoder(ini_file, make_compiler(ini_file))
+            codec = make_codec(ini_file)
+            pages, constants = random_tune(codec, ini_file)
+            constants.update(codec.decode(pages, constants))
+            frames = numpy.random.default_rng(0).integers(0, 256, (args.frames, decoder.size), dtype=numpy.uint8)
+            per_frame_s, _ = harness.measure_time(
+                lambda: [decoder.decode(frame, constants=constants) for frame in frames], args.repeat)
+            many_s, _ = harness.measure_time(lambda: decoder.decode_many(frames, constants=constants), args.repeat)
+        except Exception as error:  # pylint: disable=broad-except
+            rows.append([path.name, f'{type(error).__name__}: {error}', '-', '-', '-', '-'])
+            continue
+        rows.append([path.name, len(decoder.names), decoder.size,
+                     f'{args.frames / per_frame_s:,.0f}', f'{args.frames / many_s:,.0f}',
+                     f'{per_frame_s / many_s:.1f}x'])
+
+    harness.print_table(['file', 'channels', 'frame bytes', 'per frame (frames/s)', 'decode_many (frames/s)',
+                         'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
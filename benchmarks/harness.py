@@ -0,0 +1,193 @@
+"""Shared plumbing for the benchmark scripts
+
+Timing and memory are measured in separate runs: tracemalloc slows
+allocation heavy code down by several times, so a traced run would
+distort the wall clock figures.
+"""
+
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import lark
+
+TEST_FILES = Path(__file__).parent.parent / 'tests' / 'Test_Files'
+
+# The symbols the corpus tests (tests/test_dataclasstransformer.py) define
+DEFAULT_DEFINES = ('LAMBDA', 'ALPHA_N', 'INI_VERSION_2', 'NARROW_BAND_EGO')
+
+# Metrics compared against a baseline & the minimum absolute change
+# that counts as a regression (filters out timer & allocator noise)
+COMPARED_METRICS = {
+    'wall_s': 0.005,
+    'peak_bytes': 64 * 1024,
+}
+
+
+@dataclass
+class StageMetrics:
+    wall_s: Optional[float] = None
+    peak_bytes: Optional[int] = None
+    alloc_blocks: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class FileResult:
+    lines: int
+    size_bytes: int
+    stages: Dict[str, StageMetrics] = field(default_factory=dict)
+
+
+def corpus_files(pattern: str = '*.ini') -> List[Path]:
+    """The test corpus, smallest file first"""
+    return sorted(TEST_FILES.glob(pattern), key=lambda path: path.stat().st_size)
+
+
+def read_ini(path: Path) -> str:
+    with open(path, 'r', encoding='latin-1') as file:
+        return file.read()
+
+
+def measure_time(func: Callable, repeat: int):
+    """Best of repeat wall clock time. Returns (seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measure_memory(func: Callable):
+    """Peak traced memory & the net number of allocated blocks for one call
+
+    Returns (peak_bytes, alloc_blocks, result)
+    """
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Blocks still alive once the stage is done (i.e. the size of its output)
+    alloc_blocks = sys.getallocatedblocks() - blocks_before
+    return peak - base, alloc_blocks, result
+
+
+def run_stage(func: Callable, repeat: int, memory: bool):
+    """Time (and optionally trace) a single pipeline stage
+
+    Returns (StageMetrics, result). The result is None if the stage failed.
+    """
+    try:
+        wall_s, result = measure_time(func, repeat)
+        metrics = StageMetrics(wall_s=wall_s)
+        if memory:
+            metrics.peak_bytes, metrics.alloc_blocks, _ = measure_memory(func)
+        return metrics, result
+    except Exception as error:  # pylint: disable=broad-except
+        return StageMetrics(error=f'{type(error).__name__}: {error}'), None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'lark': lark.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save_results(path: Path, results: Dict[str, FileResult], settings: dict):
+    document = {
+        'environment': environment(),
+        'settings': settings,
+        'files': {name: asdict(result) for name, result in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2, sort_keys=True)
+
+
+def load_results(path: Path) -> Dict[str, FileResult]:
+    with open(path, 'r', encoding='utf-8') as file:
+        document = json.load(file)
+    results = {}
+    for name, result in document['files'].items():
+        stages = {stage: StageMetrics(**metrics) for stage, metrics in result.pop('stages').items()}
+        results[name] = FileResult(stages=stages, **result)
+    return results
+
+
+@dataclass
+class Regression:
+    file_name: str
+    stage: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float('inf')
+
+
+def compare_results(baseline: Dict[str, FileResult],
+                    current: Dict[str, FileResult],
+                    tolerance: float) -> List[Regression]:
+    """Find metrics that grew by more than tolerance (a fraction) versus the baseline
+
+    Files or stages missing from either side are ignored.
+    """
+    regressions = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        for stage, metrics in result.stages.items():
+            old_metrics = baseline[name].stages.get(stage)
+            if old_metrics is None:
+                continue
+            for metric, noise_floor in COMPARED_METRICS.items():
+                old = getattr(old_metrics, metric)
+                new = getattr(metrics, metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1.0 + tolerance) and new - old > noise_floor:
+                    regressions.append(Regression(name, stage, metric, old, new))
+    return regressions
+
+
+def format_bytes(value: Optional[int]) -> str:
+    if value is None:
+        return '-'
+    return f'{value / (1024 * 1024):.1f}MB'
+
+
+def format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return '-'
+    return f'{value * 1000:.0f}ms'
+
+
+def print_table(headers: Iterable[str], rows: Iterable[Iterable[str]]):
+    rows = [list(map(str, row)) for row in rows]
+    headers = list(headers)
+    widths = [max([len(header)] + [len(row[i]) for row in rows]) for i, header in enumerate(headers)]
+    print('  '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
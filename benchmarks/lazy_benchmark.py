@@ -0,0 +1,51 @@
+"""Time to first constant: eager parse versus parse_lazy()
+
+For each file reports the time until TsIniFile['Constants'] is available:
+  eager - TsIniParser.parse + DataClassTransformer over the whole file
+  lazy  - parse_lazy (preprocess & section index) then ['Constants']
+
+Loading a section parses only its own lines, so the speedup is about
+the inverse of the section's share of the file: [Constants] is a third of
+MS3Format0568 (~3x), [OutputChannels] much less (~15x).
+
+Usage:
+  python -m benchmarks.lazy_benchmark [--files "MS3Format0568*.ini"] [--section Constants]
+"""
+
+import argparse
+import io
+import sys
+
+from ts_ini_parser import TsIniParser, DataClassTransformer, parse_lazy
+from . import harness
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='MS3Format0568*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--section', default='Constants')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    rows = []
+    for path in harness.corpus_files(args.files):
+        text = harness.read_ini(path)
+        eager_s, _ = harness.measure_time(
+            lambda t=text: DataClassTransformer().transform(parser.parse(io.StringIO(t)))[args.section],
+            args.repeat)
+        index_s, _ = harness.measure_time(lambda t=text: parse_lazy(parser, io.StringIO(t)), args.repeat)
+        lazy_s, _ = harness.measure_time(lambda t=text: parse_lazy(parser, io.StringIO(t))[args.section],
+                                         args.repeat)
+        rows.append([path.name, harness.format_seconds(eager_s), harness.format_seconds(index_s),
+                     harness.format_seconds(lazy_s), f'{eager_s / lazy_s:.1f}x'])
+
+    harness.print_table(['file', 'eager', 'lazy index', f'lazy [{args.section}]', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
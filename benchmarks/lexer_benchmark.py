@@ -0,0 +1,73 @@
+"""Preprocessor input feeding: a line at a time versus blocks of lines
+
+TextIoLexer restarts the preprocessor's inner lexer for every chunk of
+input it feeds it. Each corpus file is preprocessed (lexing dominates) fed:
+
+  line   - a line at a time (block_size=0), from a text stream
+  block  - blocks of TextIoLexer.BLOCK_SIZE characters, from a text stream
+  mmap   - blocks, straight from a memory mapped file (latin-1)
+
+Reports the throughput of each in MB/s of INI text.
+
+Usage:
+  python -m benchmarks.lexer_benchmark [--files "speeduino*.ini"] [--repeat 3]
+"""
+
+import argparse
+import io
+import mmap
+import sys
+
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
+from ts_ini_parser.text_io_lexer import TextIoLexer
+from . import harness
+
+
+def make_pre_processor(block_size: int) -> TsIniPreProcessor:
+    pre_processor = TsIniPreProcessor(ignore_hash_error=True, block_size=block_size)
+    for symbol in harness.DEFAULT_DEFINES:
+        pre_processor.define(symbol, True)
+    return pre_processor
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    line_pre_processor = make_pre_processor(0)
+    block_pre_processor = make_pre_processor(TextIoLexer.BLOCK_SIZE)
+
+    rows = []
+    totals = {'line': 0.0, 'block': 0.0, 'mmap': 0.0}
+    total_mb = 0.0
+    for path in harness.corpus_files(args.files):
+        text = harness.read_ini(path)
+        size_mb = len(text.encode('latin-1')) / 1e6
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            cases = {
+                'line': lambda: line_pre_processor.pre_process(io.StringIO(text)),
+                'block': lambda: block_pre_processor.pre_process(io.StringIO(text)),
+                'mmap': lambda m=mapped: block_pre_processor.pre_process(m),
+            }
+            try:
+                times = {label: harness.measure_time(case, args.repeat)[0] for label, case in cases.items()}
+            except Exception as error:  # pylint: disable=broad-except
+                rows.append([path.name, f'{size_mb:.2f}', f'{type(error).__name__}', '-', '-', '-'])
+                continue
+        total_mb += size_mb
+        for label, wall_s in times.items():
+            totals[label] += wall_s
+        rows.append([path.name, f'{size_mb:.2f}'] + [f'{size_mb / times[label]:.2f}' for label in totals]
+                    + [f'{times["line"] / times["block"]:.2f}x'])
+
+    rows.append(['TOTAL', f'{total_mb:.2f}'] + [f'{total_mb / totals[label]:.2f}' if totals[label] else '-'
+                                                for label in totals]
+                + [f'{totals["line"] / totals["block"]:.2f}x' if totals['block'] else '-'])
+    harness.print_table(['file', 'MB', 'line MB/s', 'block MB/s', 'mmap MB/s', 'block speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Table lookups: a point at a time versus TableLookup
+
+Builds a tune for speeduino.ini (the VE table & its bins) and evaluates
+the VE table at --samples random (RPM, load) points, as replaying a
+datalog would:
+
+  python     - bilinear interpolation in Python, a point at a time
+  vectorized - TableLookup, all of the points in one call
+
+Usage:
+  python -m benchmarks.lookup_benchmark [--samples 1000000] [--repeat 3]
+"""
+
+import argparse
+import bisect
+import sys
+
+from ts_ini_parser import TsIniParser, TuneCodec, TableLookup
+from . import harness
+
+TABLE = 'veTable1Tbl'
+
+
+def lookup_point(x_bins, y_bins, z_values, x, y):
+    """Clamped bilinear interpolation of one point"""
+    def bracket(bins, point):
+        point = min(max(point, bins[0]), bins[-1])
+        lower = min(max(bisect.bisect_right(bins, point) - 1, 0), len(bins) - 2)
+        return lower, (point - bins[lower]) / (bins[lower + 1] - bins[lower])
+
+    column, x_fraction = bracket(x_bins, x)
+    row, y_fraction = bracket(y_bins, y)
+    lower = z_values[row][column] * (1 - x_fraction) + z_values[row][column + 1] * x_fraction
+    upper = z_values[row + 1][column] * (1 - x_fraction) + z_values[row + 1][column + 1] * x_fraction
+    return lower * (1 - y_fraction) + upper * y_fraction
+
+
+def make_tune():
+    import numpy  # pylint: disable=import-outside-toplevel
+    ini_file = TsIniParser().parse_model(harness.read_ini(harness.TEST_FILES / 'speeduino.ini'))
+    codec = TuneCodec(ini_file)
+    rows, columns = numpy.mgrid[0:16, 0:16]
+    values = {'rpmBins': numpy.arange(500, 8001, 500), 'fuelLoadBins': numpy.arange(10, 161, 10),
+              'veTable': 20 + rows * 10 + columns * 3}
+    pages = codec.encode(values, {page_num: bytearray(page.size) for page_num, page in codec.pages.items()})
+    return ini_file['TableEditor'][TABLE], codec.decode(pages)
+
+
+def main(argv=None):
+    import numpy  # pylint: disable=import-outside-toplevel
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--samples', type=int, default=1_000_000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    table, values = make_tune()
+    generator = numpy.random.default_rng(0)
+    rpm = generator.uniform(0, 9000, args.samples)
+    load = generator.uniform(0, 200, args.samples)
+
+    build_s, lookup = harness.measure_time(lambda: TableLookup(table, values), args.repeat)
+    vectorized_s, result = harness.measure_time(lambda: lookup(rpm, load), args.repeat)
+    x_bins, y_bins = lookup.x_bins.tolist(), lookup.y_bins.tolist()
+    z_values = lookup.z_values.tolist()
+    points = list(zip(rpm.tolist(), load.tolist()))
+    python_s, expected = harness.measure_time(lambda: [lookup_point(x_bins, y_bins, z_values, x, y)
+                                                       for x, y in points], 1)
+    if not numpy.allclose(expected, result):
+        print('The lookups differ', file=sys.stderr)
+        return 1
+
+    rows = [['python', harness.format_seconds(python_s), f'{args.samples / python_s / 1e6:.2f}'],
+            ['vectorized', harness.format_seconds(vectorized_s), f'{args.samples / vectorized_s / 1e6:.2f}']]
+    harness.print_table(['mode', 'time', 'M points/s'], rows)
+    print(f'\nTableLookup built in {harness.format_seconds(build_s)}, '
+          f'{python_s / vectorized_s:.0f}x faster than a point at a time')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
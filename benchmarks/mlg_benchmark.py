@@ -0,0 +1,78 @@
+"""Scanning binary datalogs (.mlg) with MlgReader.iter_chunks()
+
+Writes a synthetic log per --rows size with --fields U16 fields, then scans
+it reading every field & reading only --select fields. Reports the
+throughput (of the whole file size) & peak traced memory, which should
+stay the same as the log grows.
+
+Usage:
+  python -m benchmarks.mlg_benchmark [--rows 100000 1000000] [--fields 120] [--select 3]
+"""
+
+import argparse
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy
+
+from ts_ini_parser import MlgReader
+from . import harness
+
+
+def write_log(path: Path, rows: int, fields: int):
+    """A version 2 log of random U16 fields, with a marker in the middle"""
+    names = [f'field{index}' for index in range(fields)]
+    descriptors = b''.join(struct.pack('>B34s10sbffb34s', 2, name.encode(), b'', 0, 0.1, 0.0, 1, b'')
+                           for name in names)
+    record_length = 2 * fields
+    header = struct.pack('>6shiiihh', b'MLVLG\0', 2, 0, 0, 24 + len(descriptors), record_length, fields)
+    block = numpy.dtype([('header', '>u4')] + [(name, '>u2') for name in names] + [('crc', 'u1')])
+    with open(path, 'wb') as file:
+        file.write(header + descriptors)
+        generator = numpy.random.default_rng(0)
+        for start in range(0, rows, 100000):
+            blocks = numpy.zeros(min(100000, rows - start), block)
+            for name in names:
+                blocks[name] = generator.integers(0, 65536, len(blocks))
+            file.write(blocks.tobytes())
+            if start == rows // 2 // 100000 * 100000:
+                file.write(struct.pack('>BBH50s', 1, 0, 0, b'Marker'))
+
+
+def scan(path: Path, names):
+    total = 0.0
+    with MlgReader(path) as log:
+        for chunk in log.iter_chunks(names):
+            total += sum(float(column.sum()) for column in chunk.values())
+    return total
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    arg_parser.add_argument('--fields', type=int, default=120)
+    arg_parser.add_argument('--select', type=int, default=3)
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    args = arg_parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for row_count in args.rows:
+            path = Path(folder) / f'{row_count}.mlg'
+            write_log(path, row_count, args.fields)
+            size_mb = path.stat().st_size / 1e6
+            for label, names in [('all', None), (f'{args.select}', [f'field{index}' for index in range(args.select)])]:
+                wall_s, _ = harness.measure_time(lambda names=names: scan(path, names), args.repeat)
+                peak_bytes, _, _ = harness.measure_memory(lambda names=names: scan(path, names))
+                rows.append([f'{row_count:,}', f'{size_mb:,.0f}', label, harness.format_seconds(wall_s),
+                             f'{size_mb / wall_s:,.0f}', harness.format_bytes(peak_bytes)])
+            path.unlink()
+
+    harness.print_table(['rows', 'MB', 'fields read', 'time', 'MB/s', 'peak memory'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Resident size of the TsIniFile object graph
+
+For each file, reports the memory still allocated once the file is
+parsed & transformed into a TsIniFile, and the parse tree is gone, plus
+the number of objects in it. This is what a loaded INI file costs while
+it is kept around.
+
+--by-type breaks each model down by the type of object, e.g. to see how
+little the section & page containers (UserDict/UserList) themselves
+cost next to the strings, lists & tuples of the entries.
+
+Usage:
+  python -m benchmarks.model_memory_benchmark [--files "MS3*.ini"] [--save model.json] [--compare model.json]
+                                              [--by-type]
+"""
+
+import argparse
+import collections
+import gc
+import io
+import sys
+import tracemalloc
+from collections import UserDict, UserList
+from pathlib import Path
+
+from ts_ini_parser import TsIniParser, DataClassTransformer
+from . import harness
+
+
+def retained_memory(func):
+    """Bytes & GC tracked objects still allocated for the result of func
+
+    Returns (bytes, objects, result)
+    """
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        result = func()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current - base, len(gc.get_objects()) - objects_before, result
+
+
+def size_by_type(root) -> collections.Counter:
+    """sys.getsizeof() of each object reachable from root, summed by type
+
+    The containers' instance __dict__s are counted as their own type,
+    'container __dict__'. Classes aren't part of the model: they are
+    neither counted nor followed.
+    """
+    sizes = collections.Counter()
+    seen = set()
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        if isinstance(item, (UserDict, UserList)):
+            seen.add(id(item.__dict__))
+            sizes['container __dict__'] += sys.getsizeof(item.__dict__)
+            stack.extend(gc.get_referents(item.__dict__))
+        sizes[type(item).__name__] += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return sizes
+
+
+def load(text: str):
+    """Parse & transform with a parser of its own, so nothing but the
+    TsIniFile outlives the call (the parser keeps a reference to its
+    last input)"""
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+    return DataClassTransformer().transform(parser.parse(io.StringIO(text)))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--save', type=Path, help='Write the results to this JSON file')
+    arg_parser.add_argument('--compare', type=Path, help='Baseline JSON file to compare against')
+    arg_parser.add_argument('--tolerance', type=float, default=0.15)
+    arg_parser.add_argument('--by-type', action='store_true', help='Break each model down by object type')
+    args = arg_parser.parse_args(argv)
+
+    # One-off allocations (e.g. regex caches) aren't part of the model
+    load('[Warmup]\nkey = value\n')
+
+    results = {}
+    rows = []
+    for path in harness.corpus_files(args.files):
+        text = harness.read_ini(path)
+        try:
+            retained, objects, model = retained_memory(lambda t=text: load(t))
+        except Exception as error:  # pylint: disable=broad-except
+            rows.append([path.name, harness.format_bytes(len(text)), f'{type(error).__name__}: {error}', '-', '-'])
+            continue
+        metrics = harness.StageMetrics(peak_bytes=retained, alloc_blocks=objects)
+        results[path.name] = harness.FileResult(lines=text.count('\n'), size_bytes=len(text),
+                                                stages={'model': metrics})
+        rows.append([path.name, harness.format_bytes(len(text)), harness.format_bytes(retained), objects,
+                     f'{retained / len(text):.1f}'])
+        if args.by_type:
+            sizes = size_by_type(model)
+            total = sum(sizes.values())
+            shown = [name for name, _ in sizes.most_common(8) if name != 'container __dict__']
+            print(path.name)
+            harness.print_table(['type', 'size', 'share'],
+                                [[name, f'{sizes[name] / 1024:.1f}kB', f'{sizes[name] / total:.1%}']
+                                 for name in shown + ['container __dict__']])
+            print()
+        del model
+
+    harness.print_table(['file', 'size', 'model', 'objects', 'bytes/char'], rows)
+    total = sum(result.stages['model'].peak_bytes for result in results.values())
+    print(f'\nTotal: {harness.format_bytes(total)}')
+
+    if args.save:
+        harness.save_results(args.save, results, {'files': args.files})
+    if args.compare:
+        regressions = harness.compare_results(harness.load_results(args.compare), results, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression.file_name}: {harness.format_bytes(regression.baseline)} -> '
+                  f'{harness.format_bytes(regression.current)} ({regression.ratio:.2f}x)')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
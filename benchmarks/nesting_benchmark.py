@@ -0,0 +1,64 @@
+"""Preprocessor cost versus #if nesting depth
+
+Generates a synthetic file where every level of a deeply nested #if
+block holds the same number of lines, so the total line count grows
+linearly with the depth. If preprocessing is linear in the file size,
+the time per line stays flat as the depth increases.
+
+Usage:
+  python -m benchmarks.nesting_benchmark [--depths 1 8 64 256] [--lines-per-level 20]
+"""
+
+import argparse
+import io
+import sys
+
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
+from . import harness
+
+
+def nested_conditionals(depth: int, lines_per_level: int) -> str:
+    """depth nested #if blocks, all true, each with lines_per_level lines
+    before and after the nested block"""
+    body = [f'value{index} = {index}\n' for index in range(lines_per_level)]
+    lines = []
+    for level in range(depth):
+        lines.extend(body)
+        lines.append(f'#if LEVEL_{level}\n' if level % 2 else f'#ifdef LEVEL_{level}\n')
+    lines.extend(body)
+    for level in reversed(range(depth)):
+        lines.append('#else\n')
+        lines.append('#error never\n')
+        lines.append('#endif\n')
+        lines.extend(body)
+    return ''.join(lines)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--depths', type=int, nargs='+', default=[1, 4, 16, 64, 128, 256])
+    arg_parser.add_argument('--lines-per-level', type=int, default=20)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    pre_processor = TsIniPreProcessor(ignore_hash_error=False)
+    for level in range(max(args.depths)):
+        pre_processor.define(f'LEVEL_{level}', True)
+
+    rows = []
+    baseline_per_line = None
+    for depth in args.depths:
+        text = nested_conditionals(depth, args.lines_per_level)
+        line_count = text.count('\n')
+        wall_s, _ = harness.measure_time(lambda t=text: pre_processor.pre_process(io.StringIO(t)), args.repeat)
+        per_line = wall_s / line_count
+        baseline_per_line = baseline_per_line or per_line
+        rows.append([depth, line_count, harness.format_seconds(wall_s),
+                     f'{per_line * 1e6:.1f}us', f'{per_line / baseline_per_line:.2f}'])
+
+    harness.print_table(['depth', 'lines', 'time', 'per line', 'vs depth 1'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Resident memory of many INI files loaded together, with & without a ModelPool
+
+Loads every corpus file (parse_model) & keeps them all, as a service
+holding every firmware revision would. Reports the memory each file adds
+to what is already loaded, with no pool & with one ModelPool shared by
+all of the files (the pool's own memory is included), and the totals.
+
+Usage:
+  python -m benchmarks.pool_benchmark [--files "MS3*.ini"]
+"""
+
+import argparse
+import gc
+import io
+import sys
+import tracemalloc
+
+from ts_ini_parser import TsIniParser, ModelPool
+from . import harness
+
+MODES = ('no pool', 'pool')
+
+
+def load_all(texts, pool):
+    """Load each file, keeping every model. Yields the bytes each file adds"""
+    parser = TsIniParser(ignore_hash_error=True, pre_processor_backend='scanner')
+    defines = dict.fromkeys(harness.DEFAULT_DEFINES, True)
+    models = []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for text in texts:
+            try:
+                models.append(parser.parse_model(io.StringIO(text), defines, pool=pool))
+            except Exception:  # pylint: disable=broad-except
+                models.append(None)
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            yield current - before if models[-1] is not None else None
+            before = current
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='*.ini', help='Glob pattern within tests/Test_Files')
+    args = arg_parser.parse_args(argv)
+
+    paths = sorted(harness.corpus_files(args.files))
+    texts = [harness.read_ini(path) for path in paths]
+    # One-off allocations (e.g. the grammar, regex caches) aren't part of the models
+    list(load_all(texts[:1], None))
+
+    pool = ModelPool()
+    added = {'no pool': list(load_all(texts, None)), 'pool': list(load_all(texts, pool))}
+    rows = [[path.name, harness.format_bytes(len(text))]
+            + [harness.format_bytes(added[mode][index]) for mode in MODES]
+            for index, (path, text) in enumerate(zip(paths, texts))]
+    totals = {mode: sum(size for size in sizes if size is not None) for mode, sizes in added.items()}
+    rows.append(['TOTAL', harness.format_bytes(sum(len(text) for text in texts))]
+                + [harness.format_bytes(totals[mode]) for mode in MODES])
+    harness.print_table(['file', 'size'] + [f'{mode} resident' for mode in MODES], rows)
+    print(f'\nPooled: {totals["pool"] / totals["no pool"]:.0%} of the unpooled memory. '
+          f'Reused {pool.hits["string"]} strings, {pool.hits["value"]} values & {pool.hits["page"]} pages')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Where does the time go parsing one INI file?
+
+Parses the file with a ParseStats & prints the slowest rules of each
+stage, the busiest terminals, the #define expansions & the #if nesting.
+
+Usage:
+  python -m benchmarks.rule_profile path/to/file.ini [--model] [--json stats.json] [--folded stats.folded]
+
+--folded writes stacks for flamegraph.pl/speedscope/inferno, e.g.
+  flamegraph.pl stats.folded > stats.svg
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from ts_ini_parser import TsIniParser, DataClassTransformer, ParseStats
+from . import harness
+
+
+def print_stats(stats: ParseStats, top: int):
+    for name, stage in stats.stages.items():
+        print(f'\n{name}')
+        rules = sorted(stage.rules.items(), key=lambda item: item[1].seconds, reverse=True)[:top]
+        harness.print_table(['rule', 'calls', 'time'],
+                            [[rule, rule_stats.calls, harness.format_seconds(rule_stats.seconds)]
+                             for rule, rule_stats in rules])
+        if stage.tokens:
+            print()
+            harness.print_table(['terminal', 'tokens'], stage.tokens.most_common(top))
+    if stats.define_expansions:
+        print('\n#define expansions')
+        harness.print_table(['symbol', 'expansions'], stats.define_expansions.most_common(top))
+    print(f'\nmax #if nesting: {stats.max_conditional_depth}')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('file', type=Path)
+    arg_parser.add_argument('--model', action='store_true', help='Use TsIniParser.parse_model (no tree)')
+    arg_parser.add_argument('--define', action='append', help='Preprocessor symbol (repeatable)')
+    arg_parser.add_argument('--top', type=int, default=15, help='Rows per table')
+    arg_parser.add_argument('--json', type=Path, help='Write the stats to this JSON file')
+    arg_parser.add_argument('--folded', type=Path, help='Write the rule times as folded stacks to this file')
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser(ignore_hash_error=True)
+    for symbol in args.define if args.define is not None else harness.DEFAULT_DEFINES:
+        parser.define(symbol, True)
+
+    stats = ParseStats()
+    with open(args.file, 'r', encoding='latin-1') as file:
+        if args.model:
+            parser.parse_model(file, stats=stats)
+        else:
+            DataClassTransformer(stats=stats).transform(parser.parse(file, stats=stats))
+
+    print_stats(stats, args.top)
+    if args.json:
+        args.json.write_text(stats.to_json(indent=2), encoding='utf-8')
+    if args.folded:
+        with open(args.folded, 'w', encoding='utf-8') as file:
+            stats.write_folded(file)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Does the pipeline scale linearly with the INI file size?
+
+Generates synthetic INI files (see synthetic_ini) at growing multiples of
+a base size & puts each through the pipeline stages:
+
+  pre_process - TsIniPreProcessor (#if etc.)
+  parse       - the TsIniParser LALR pass over the preprocessed tree
+  transform   - DataClassTransformer
+  parse_model - TsIniParser.parse_model (preprocess, parse & model at once)
+
+For each stage & size the wall time, the time per 1000 lines & the peak
+traced memory are reported. A stage's scaling exponent is the slope of
+log(time) (or log(peak memory)) against log(lines): 1.0 is linear.
+Exponents above --threshold are flagged as super-linear & the exit
+status is 1. --csv writes every measurement, for plotting.
+
+Usage:
+  python -m benchmarks.scaling_benchmark [--factors 1 2 4 8 16] [--csv scaling.csv]
+"""
+
+import argparse
+import csv
+import io
+import math
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from ts_ini_parser import TsIniParser, DataClassTransformer
+from . import harness
+from .synthetic_ini import SyntheticSize, generate_ini, symbols
+
+STAGES = ('pre_process', 'parse', 'transform', 'parse_model')
+
+
+def scaling_exponent(sizes: Sequence[float], values: Sequence[float]) -> float:
+    """The least squares slope of log(values) against log(sizes)"""
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if value]
+    if len(points) < 2:
+        return float('nan')
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else float('nan')
+
+
+def benchmark_size(parser: TsIniParser, text: str, defines: dict, repeat: int,
+                   memory: bool) -> Dict[str, harness.StageMetrics]:
+    stage_funcs = (
+        ('pre_process', lambda _: parser.pre_process(io.StringIO(text), defines=defines)),
+        ('parse', parser.parse_pre_processed),
+        ('transform', lambda tree: DataClassTransformer().transform(tree)),
+    )
+    results = {}
+    stage_input = None
+    for stage, func in stage_funcs:
+        results[stage], stage_input = harness.run_stage(lambda f=func, i=stage_input: f(i), repeat, memory)
+        if results[stage].error:
+            break
+    results['parse_model'], _ = harness.run_stage(lambda: parser.parse_model(io.StringIO(text), defines),
+                                                  repeat, memory)
+    return results
+
+
+def write_csv(path: Path, rows: List[dict]):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    # pylint: disable=too-many-locals
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--factors', type=float, nargs='+', default=[1, 2, 4, 8, 16],
+                            help='Multiples of the base size (see synthetic_ini.SyntheticSize)')
+    arg_parser.add_argument('--if-depth', type=int, default=SyntheticSize.if_depth)
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Timing runs per stage (best is kept)')
+    arg_parser.add_argument('--no-memory', action='store_true', help='Skip the (slow) tracemalloc pass')
+    arg_parser.add_argument('--threshold', type=float, default=1.15,
+                            help='Flag stages whose scaling exponent is above this')
+    arg_parser.add_argument('--csv', type=Path, help='Write the measurements to this CSV file')
+    args = arg_parser.parse_args(argv)
+
+    parser = TsIniParser()
+    base = SyntheticSize(if_depth=args.if_depth)
+    defines = dict.fromkeys(symbols(base), True)
+
+    rows = []
+    measurements = []
+    for factor in args.factors:
+        text = generate_ini(base.scaled(factor))
+        lines = text.count('\n')
+        print(f'Benchmarking x{factor:g}: {lines} lines', file=sys.stderr)
+        results = benchmark_size(parser, text, defines, args.repeat, not args.no_memory)
+        for stage in STAGES:
+            metrics = results.get(stage)
+            if metrics is None or metrics.error:
+                print(f'x{factor:g} {stage}: {metrics.error if metrics else "skipped"}', file=sys.stderr)
+                continue
+            measurements.append({'factor': factor, 'lines': lines, 'bytes': len(text), 'stage': stage,
+                                 'wall_s': metrics.wall_s, 'peak_bytes': metrics.peak_bytes})
+            rows.append([f'x{factor:g}', lines, stage, harness.format_seconds(metrics.wall_s),
+                         f'{metrics.wall_s / lines * 1e6:.1f}ms', harness.format_bytes(metrics.peak_bytes)])
+    harness.print_table(['size', 'lines', 'stage', 'time', 'per 1k lines', 'peak'], rows)
+
+    print()
+    flagged = []
+    exponent_rows = []
+    for stage in STAGES:
+        stage_rows = [row for row in measurements if row['stage'] == stage]
+        sizes = [row['lines'] for row in stage_rows]
+        exponents = {'time': scaling_exponent(sizes, [row['wall_s'] for row in stage_rows]),
+                     'memory': scaling_exponent(sizes, [row['peak_bytes'] or 0 for row in stage_rows])}
+        verdicts = [f'super-linear {metric}' for metric, exponent in exponents.items() if exponent > args.threshold]
+        flagged.extend(f'{stage}: {verdict}' for verdict in verdicts)
+        exponent_rows.append([stage] + [f'{exponent:.2f}' for exponent in exponents.values()]
+                             + [', '.join(verdicts) or 'ok'])
+    harness.print_table(['stage', 'time exponent', 'memory exponent', 'verdict'], exponent_rows)
+
+    if args.csv and measurements:
+        write_csv(args.csv, measurements)
+    for message in flagged:
+        print(f'SUPER-LINEAR {message}', file=sys.stderr)
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
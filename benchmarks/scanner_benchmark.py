@@ -0,0 +1,72 @@
+"""Preprocessor backends: the Lark grammar versus the line scanner
+
+Each corpus file is preprocessed (streamed, the lines are collected) with:
+
+  lark    - TsIniPreProcessor(backend='lark'), the preprocessor grammar
+  scanner - TsIniPreProcessor(backend='scanner'), see LineScanner
+
+Checks both keep the same lines & reports the throughput of each in MB/s
+of INI text, plus the speedup.
+
+Usage:
+  python -m benchmarks.scanner_benchmark [--files "speeduino*.ini"] [--repeat 3]
+"""
+
+import argparse
+import sys
+
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
+from . import harness
+
+BACKENDS = TsIniPreProcessor.BACKENDS
+
+
+def make_pre_processor(backend: str) -> TsIniPreProcessor:
+    pre_processor = TsIniPreProcessor(ignore_hash_error=True, backend=backend)
+    for symbol in harness.DEFAULT_DEFINES:
+        pre_processor.define(symbol, True)
+    return pre_processor
+
+
+def kept_lines(pre_processor: TsIniPreProcessor, text: str) -> list:
+    return [(token.value, token.start_pos) for token in pre_processor.pre_process_stream(text)]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    pre_processors = {backend: make_pre_processor(backend) for backend in BACKENDS}
+    rows = []
+    totals = dict.fromkeys(BACKENDS, 0.0)
+    total_mb = 0.0
+    for path in harness.corpus_files(args.files):
+        text = harness.read_ini(path)
+        size_mb = len(text.encode('latin-1')) / 1e6
+        try:
+            results = {backend: kept_lines(pre_processor, text) for backend, pre_processor in pre_processors.items()}
+            times = {backend: harness.measure_time(lambda p=pre_processor: kept_lines(p, text), args.repeat)[0]
+                     for backend, pre_processor in pre_processors.items()}
+        except Exception as error:  # pylint: disable=broad-except
+            rows.append([path.name, f'{size_mb:.2f}', f'{type(error).__name__}', '-', '-'])
+            continue
+        if results['lark'] != results['scanner']:
+            print(f'{path.name}: the backends kept different lines', file=sys.stderr)
+            return 1
+        total_mb += size_mb
+        for backend, wall_s in times.items():
+            totals[backend] += wall_s
+        rows.append([path.name, f'{size_mb:.2f}'] + [f'{size_mb / times[backend]:.2f}' for backend in BACKENDS]
+                    + [f'{times["lark"] / times["scanner"]:.2f}x'])
+
+    rows.append(['TOTAL', f'{total_mb:.2f}'] + [f'{total_mb / totals[backend]:.2f}' if totals[backend] else '-'
+                                                for backend in BACKENDS]
+                + [f'{totals["lark"] / totals["scanner"]:.2f}x' if totals['scanner'] else '-'])
+    harness.print_table(['file', 'MB', 'lark MB/s', 'scanner MB/s', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Synthetic TunerStudio INI files of any size
+
+generate_ini() writes a valid ts_ini.lark file with the requested number
+of pages, scalars, arrays, bit fields, tables, curves, #define macros &
+#if nesting depth. The constants are spread over the pages; each table
+& curve gets its own axis & value arrays (which aren't counted in
+arrays).
+
+Every group of lines is wrapped in if_depth nested #if blocks whose #else
+branches hold the same keys at the same offsets, so the file has the same
+variables & page layout whatever the symbols (SYNTHETIC_0, SYNTHETIC_1,
+...) are. The values differ: the #else constants have double the scale
+(and max) & the #else bit fields list plain options.
+
+Usage:
+  python -m benchmarks.synthetic_ini --scalars 10000 --tables 200 > big.ini
+"""
+
+import argparse
+import sys
+from dataclasses import dataclass, fields
+from typing import List
+
+TABLE_SIZE = 16
+CURVE_SIZE = 8
+# Lines per #if group
+GROUP_SIZE = 8
+
+
+@dataclass
+class SyntheticSize:
+    # pylint: disable=too-many-instance-attributes
+    """The counts of each kind of definition in a synthetic file"""
+    pages: int = 4
+    scalars: int = 400
+    arrays: int = 40
+    bits: int = 100
+    tables: int = 10
+    curves: int = 10
+    defines: int = 20
+    if_depth: int = 2
+
+    def __post_init__(self):
+        negative = [item.name for item in fields(self) if getattr(self, item.name) < 0]
+        if negative:
+            raise ValueError(f'Counts can\'t be negative: {", ".join(negative)}')
+        if self.pages == 0:
+            raise ValueError('There must be at least 1 page')
+        if self.bits and not self.defines:
+            raise ValueError('Bit fields need at least 1 define (their options)')
+
+    def scaled(self, factor: float) -> 'SyntheticSize':
+        """Every count (but the #if depth) times factor"""
+        return SyntheticSize(**{item.name: getattr(self, item.name) if item.name == 'if_depth'
+                                else max(1, round(getattr(self, item.name) * factor))
+                                for item in fields(self)})
+
+
+def symbols(size: SyntheticSize) -> List[str]:
+    """The symbols the #if blocks test"""
+    return [f'SYNTHETIC_{level}' for level in range(size.if_depth)]
+
+
+def _conditional(lines: List[str], alternative: List[str], depth: int, level: int = 0) -> List[str]:
+    # The lines, in depth nested #if blocks. Each #else holds the
+    # alternative lines.
+    if level == depth:
+        return lines
+    test = f'#if SYNTHETIC_{level}' if level % 2 else f'#ifdef SYNTHETIC_{level}'
+    return [test] + _conditional(lines, alternative, depth, level + 1) + ['#else'] + alternative + ['#endif']
+
+
+def _grouped(lines: List[str], alternatives: List[str], depth: int) -> List[str]:
+    result = []
+    for start in range(0, len(lines), GROUP_SIZE):
+        result.extend(_conditional(lines[start:start + GROUP_SIZE], alternatives[start:start + GROUP_SIZE], depth))
+    return result
+
+
+class _Page:
+    # pylint: disable=too-few-public-methods
+    """The lines of one page & their #else alternatives, which double the scale"""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.size = 0
+        # Bit fields on this page so far
+        self.bits = 0
+        self.lines: List[str] = []
+        self.alternatives: List[str] = []
+
+    def add(self, name: str, shape: str, units: str, scale: float, translate: int = 0):
+        kind = 'array' if shape else 'scalar'
+        shape = f'{shape}, ' if shape else ''
+        for lines, factor in ((self.lines, 1), (self.alternatives, 2)):
+            lines.append(f'   {name} = {kind}, U08, {self.size}, {shape}"{units}", {scale * factor:g}, {translate}, '
+                         f'{translate}, {(255 + translate) * scale * factor:g}, 0')
+        count = 1
+        for dimension in shape.strip('[], ').split('x') if shape else ():
+            count *= int(dimension)
+        self.size += count
+
+    def add_bits(self, name: str, options: str):
+        # Bit fields share a byte: 4 x 2 bits
+        if self.bits % 4 == 0:
+            self.size += 1
+        start = (self.bits % 4) * 2
+        self.bits += 1
+        prefix = f'   {name} = bits, U08, {self.size - 1}, [{start}:{start + 1}], '
+        self.lines.append(prefix + options)
+        self.alternatives.append(prefix + '"A", "B", "C", "D"')
+
+
+def _constants(size: SyntheticSize) -> List[_Page]:
+    pages = [_Page(number + 1) for number in range(size.pages)]
+
+    def page(index: int) -> _Page:
+        return pages[index % len(pages)]
+
+    for index in range(size.scalars):
+        page(index).add(f'scalar{index}', '', 'ms', 0.1)
+    for index in range(size.arrays):
+        page(index).add(f'array{index}', '[16]', 'kPa', 1)
+    for index in range(size.bits):
+        page(index).add_bits(f'bits{index}', f'$options{index % size.defines}')
+    for index in range(size.tables):
+        page(index).add(f'table{index}X', f'[{TABLE_SIZE}]', 'rpm', 100)
+        page(index).add(f'table{index}Y', f'[{TABLE_SIZE}]', 'kPa', 1)
+        page(index).add(f'table{index}Z', f'[{TABLE_SIZE}x{TABLE_SIZE}]', '%', 1)
+    for index in range(size.curves):
+        page(index).add(f'curve{index}X', f'[{CURVE_SIZE}]', 'C', 1, -40)
+        page(index).add(f'curve{index}Y', f'[{CURVE_SIZE}]', '%', 1)
+    return pages
+
+
+def generate_ini(size: SyntheticSize) -> str:
+    """A TunerStudio INI file of the given size"""
+    pages = _constants(size)
+    lines = ['[MegaTune]', '   signature = "synthetic"', '',
+             '[Constants]',
+             '   endianness = big',
+             '   nPages = ' + ', '.join(str(page.number) for page in pages),
+             '   pageSize = ' + ', '.join(str(page.size) for page in pages)]
+    lines.extend(f'   #define options{index} = "A{index}", "B{index}", "C{index}", "D{index}"'
+                 for index in range(size.defines))
+    for page in pages:
+        lines.append(f'page = {page.number}')
+        lines.extend(_grouped(page.lines, page.alternatives, size.if_depth))
+
+    lines.extend(['', '[OutputChannels]',
+                  '   rpm = scalar, U16, 0, "rpm", 1, 0',
+                  '   map = scalar, U08, 2, "kPa", 1, 0',
+                  '   coolant = scalar, U08, 3, "C", 1, -40'])
+
+    # The grammar doesn't allow an empty [TableEditor] or [CurveEditor]
+    if size.tables:
+        lines.extend(['', '[TableEditor]'])
+    for index in range(size.tables):
+        table = [f'   table = table{index}Tbl, table{index}Map, "Table {index}", {pages[index % len(pages)].number}',
+                 f'      xBins = table{index}X, rpm',
+                 f'      yBins = table{index}Y, map',
+                 f'      zBins = table{index}Z',
+                 '      gridHeight = 2.0',
+                 '      upDownLabel = "RICHER", "LEANER"']
+        lines.extend(_conditional(table, table, size.if_depth))
+
+    if size.curves:
+        lines.extend(['', '[CurveEditor]'])
+    for index in range(size.curves):
+        curve = [f'   curve = curve{index}, "Curve {index}"',
+                 '      columnLabel = "Coolant", "Value"',
+                 '      xAxis = -40, 215, 9',
+                 '      yAxis = 0, 255, 6',
+                 f'      xBins = curve{index}X, coolant',
+                 f'      yBins = curve{index}Y']
+        lines.extend(_conditional(curve, curve, size.if_depth))
+    # The grammar needs a blank line at the end
+    lines.extend(['', ''])
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = SyntheticSize()
+    for item in fields(SyntheticSize):
+        arg_parser.add_argument(f'--{item.name.replace("_", "-")}', type=int, default=getattr(defaults, item.name))
+    args = arg_parser.parse_args(argv)
+    try:
+        size = SyntheticSize(**{item.name: getattr(args, item.name) for item in fields(SyntheticSize)})
+    except ValueError as error:
+        arg_parser.error(str(error))
+    sys.stdout.write(generate_ini(size))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
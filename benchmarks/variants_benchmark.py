@@ -0,0 +1,65 @@
+"""Many define sets: a parse per define set versus parse_variants()
+
+Every combination of the --symbols is parsed (on top of the default
+defines), so 2^len(symbols) variants per file. Reports:
+  separate - TsIniParser.parse + DataClassTransformer per variant
+  variants - a single parse_variants() call for all of them
+  distinct - the number of different TsIniFiles, after deduplication
+
+Usage:
+  python -m benchmarks.variants_benchmark [--files "MS3Format0568*.ini"] [--symbols LAMBDA CELSIUS]
+"""
+
+import argparse
+import io
+import itertools
+import sys
+
+from ts_ini_parser import TsIniParser, DataClassTransformer, parse_variants
+from . import harness
+
+
+def define_sets(symbols):
+    for selected in itertools.product([False, True], repeat=len(symbols)):
+        defines = dict.fromkeys(harness.DEFAULT_DEFINES, True)
+        defines.update({symbol: True for symbol, on in zip(symbols, selected) if on})
+        yield defines
+
+
+def parse_separately(parser, text, all_defines):
+    results = []
+    for defines in all_defines:
+        for symbol in list(parser.symbols):
+            parser.undefine(symbol)
+        for symbol, value in defines.items():
+            parser.define(symbol, value)
+        results.append(DataClassTransformer().transform(parser.parse(io.StringIO(text))))
+    return results
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', default='MS3Format0568*.ini', help='Glob pattern within tests/Test_Files')
+    arg_parser.add_argument('--symbols', nargs='+', default=['CELSIUS', 'PW_4X', 'CAN_COMMANDS', 'EXPANDED_CLT_TEMP'])
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    args = arg_parser.parse_args(argv)
+
+    all_defines = list(define_sets(args.symbols))
+    parser = TsIniParser(ignore_hash_error=True)
+
+    rows = []
+    for path in harness.corpus_files(args.files):
+        text = harness.read_ini(path)
+        separate_s, _ = harness.measure_time(lambda t=text: parse_separately(parser, t, all_defines), args.repeat)
+        variants_s, variants = harness.measure_time(
+            lambda t=text: parse_variants(parser, io.StringIO(t), all_defines), args.repeat)
+        rows.append([path.name, len(all_defines), len({id(variant) for variant in variants}),
+                     harness.format_seconds(separate_s), harness.format_seconds(variants_s),
+                     f'{separate_s / variants_s:.1f}x'])
+
+    harness.print_table(['file', 'variants', 'distinct', 'separate', 'parse_variants', 'speedup'], rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,11 @@
 from setuptools import setup
 
+_version = {}
+with open('ts_ini_parser/version.py', encoding='utf-8') as version_file:
+    exec(version_file.read(), _version)  # pylint: disable=exec-used
+
 setup(name='TsIniParser',
-      version='0.6',
+      version=_version['__version__'],
       description='A parser for TunerStudio INI files',
       url='https://github.com/adbancroft/TunerStudioIniParser',
       author='adbancroft',
@@ -19,8 +23,11 @@ setup(name='TsIniParser',
       license='LGPL',
       packages=['TsIniParser', 'TsIniParser.dataclasses'],
       package_dir={'TsIniParser': 'ts_ini_parser'},
-      package_data={'TsIniParser': ['grammars/*.lark', 'grammars/*.lark.cache']},
+      package_data={'TsIniParser': ['grammars/*.lark']},
       install_requires=[
           'lark-parser'
       ],
+      extras_require={
+          'numpy': ['numpy']
+      },
       zip_safe=False)
@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+import unittest
+from pathlib import Path
+from ts_ini_parser import parse_many, DataClassTransformer, TsIniFile
+try:
+    from test_utils import get_test_ini_path, model_state
+except:
+    from .test_utils import get_test_ini_path, model_state
+
+_INI_TEXT = """[MegaTune]
+   signature = "test"
+#if LAMBDA
+   afr = 1
+#else
+   afr = 2
+#endif
+#set LAMBDA
+
+"""
+
+
+class test_batch(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        folder = Path(self._temp_dir.name)
+        self.good = [folder / f'good{index}.ini' for index in range(3)]
+        for path in self.good:
+            path.write_text(_INI_TEXT, encoding='latin-1')
+        self.bad = folder / 'bad.ini'
+        self.bad.write_text('[MegaTune\n', encoding='latin-1')
+        self.missing = folder / 'missing.ini'
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def check_results(self, workers):
+        results = {result.path: result for result in parse_many(self.good + [self.bad, self.missing], workers=workers)}
+
+        self.assertEqual(5, len(results))
+        for path in self.good:
+            self.assertTrue(results[path].ok)
+            self.assertIsInstance(results[path].result, TsIniFile)
+            # The #set at the end of each file mustn't leak into the next one
+            self.assertEqual('2', results[path].result['MegaTune'][1].values[0][1])
+        self.assertFalse(results[self.bad].ok)
+        self.assertIsNone(results[self.bad].result)
+        self.assertIn('FileNotFoundError', results[self.missing].error)
+
+    def test_serial(self):
+        self.check_results(workers=1)
+
+    def test_process_pool(self):
+        self.check_results(workers=2)
+
+    def test_defines(self):
+        results = list(parse_many(self.good[:1], defines={'LAMBDA': True}, workers=1))
+        self.assertEqual('1', results[0].result['MegaTune'][1].values[0][1])
+
+    def test_tree(self):
+        results = list(parse_many(self.good[:1], transform=False, workers=1))
+        self.assertEqual('start', results[0].result.data)
+
+    def test_all_ini(self):
+        # All known INI files, spread over all available cores: the model
+        # built by the parser callbacks is the same as the one built from
+        # the tree
+        defines = {'LAMBDA': True, 'ALPHA_N': True, 'INI_VERSION_2': True, 'NARROW_BAND_EGO': True}
+        exclude_ini = [
+            'MS2ExtraSerial321.ini',
+            'MS2ExtraSerial323.ini',
+            'MS2ExtraSerial324.ini',
+            'MS2ExtraSerial325.ini',
+        ]
+        ini_files = [ini_file for ini_file in get_test_ini_path('Test_Files').glob("*.ini")
+                     if ini_file.name not in exclude_ini]
+
+        results = {}
+        for transform in (True, False):
+            for result in parse_many(ini_files, defines=defines, ignore_hash_error=True, transform=transform):
+                if not result.ok:
+                    self.fail(f'{result.path} failed with {result.error} (transform={transform})')
+                model = result.result if transform else DataClassTransformer().transform(result.result)
+                self.assertIsInstance(model, TsIniFile)
+                results.setdefault(result.path, []).append(model_state(model))
+
+        self.assertEqual(set(ini_files), set(results))
+        for path, (direct, from_tree) in results.items():
+            self.assertEqual(from_tree, direct, path.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
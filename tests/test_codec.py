@@ -0,0 +1,136 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import unittest
+from pathlib import Path
+from ts_ini_parser import *
+try:
+    from test_utils import parse_file, get_test_ini_path
+except:
+    from .test_utils import parse_file, get_test_ini_path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipUnless(numpy, 'Needs NumPy')
+class test_codec(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        tree = parse_file(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), TsIniParser())
+        cls.ini_file = DataClassTransformer().transform(tree)
+        cls.tune = TuneCodec(cls.ini_file)
+
+    def test_layout(self):
+        codec = self.tune[2]
+        self.assertEqual(288, codec.size)
+        self.assertEqual(128, self.tune[1].size)
+        self.assertEqual((16, 16), codec.dtype['veTable'].shape)
+        self.assertEqual(numpy.dtype('<i2'), self.tune[4].dtype['TrigAng'])
+
+    def test_decode_scalar(self):
+        data = bytearray(self.tune[1].size)
+        data[0] = 25   # aseTaperTime: scale 0.1
+        data[3] = 0b110   # aeMode [0:1], battVCorMode [2:2]
+        values = self.tune[1].decode(data, names=['aseTaperTime', 'aeMode', 'battVCorMode'])
+        self.assertAlmostEqual(2.5, values['aseTaperTime'])
+        self.assertEqual(2, values['aeMode'])
+        self.assertEqual(1, values['battVCorMode'])
+
+    def test_decode_little_endian(self):
+        codec = self.tune[4]
+        data = bytearray(codec.size)
+        offset = codec.dtype.fields['TrigAng'][1]
+        data[offset:offset + 2] = (-90).to_bytes(2, 'little', signed=True)
+        self.assertEqual(-90, codec.decode(data)['TrigAng'])
+
+    def test_zero_copy(self):
+        data = numpy.arange(self.tune[2].size, dtype=numpy.uint8)
+        ve_table = self.tune[2].decode(data, names=['veTable'])['veTable']
+        self.assertEqual((16, 16), ve_table.shape)
+        self.assertTrue(numpy.shares_memory(data, ve_table))
+        self.assertEqual(16, ve_table[1, 0])
+
+    def test_encode(self):
+        codec = self.tune[1]
+        data = codec.encode({'aseTaperTime': 2.5, 'aeMode': 2})
+        data = codec.encode({'battVCorMode': 1}, data)
+        values = codec.decode(data, names=['aseTaperTime', 'aeMode', 'battVCorMode'])
+        self.assertAlmostEqual(2.5, values['aseTaperTime'])
+        self.assertEqual(2, values['aeMode'])
+        self.assertEqual(1, values['battVCorMode'])
+        self.assertEqual(0b110, data[3])
+
+    def test_round_trip(self):
+        generator = numpy.random.default_rng(0)
+        pages = {page_num: generator.integers(0, 256, codec.size, dtype=numpy.uint8).tobytes()
+                 for page_num, codec in self.tune.pages.items()}
+        values = self.tune.decode(pages)
+        encoded = self.tune.encode(values, {page_num: bytearray(codec.size)
+                                            for page_num, codec in self.tune.pages.items()})
+        for name, value in self.tune.decode(encoded).items():
+            numpy.testing.assert_array_equal(values[name], value, name)
+
+    def test_expression_scale(self):
+        pages = {page_num: bytearray(codec.size) for page_num, codec in self.tune.pages.items()}
+        pages[1][50] = 147   # stoich: scale 0.1
+        pages[5][0] = 10     # lambdaTable: scale 0.1 / stoich
+        values = self.tune.decode(pages)
+        self.assertAlmostEqual(14.7, values['stoich'])
+        self.assertAlmostEqual(10 * 0.1 / 14.7, values['lambdaTable'][0, 0])
+
+    def test_decode_many(self):
+        codec = self.tune[1]
+        pages = numpy.zeros((3, codec.size), dtype=numpy.uint8)
+        pages[:, 0] = [10, 20, 30]
+        values = codec.decode_many(pages, names=['aseTaperTime'])
+        numpy.testing.assert_allclose([1.0, 2.0, 3.0], values['aseTaperTime'])
+
+    def test_decode_many_tunes(self):
+        pages = {page_num: numpy.zeros((4, codec.size), dtype=numpy.uint8) for page_num, codec in self.tune.pages.items()}
+        pages[1][:, 50] = [100, 147, 0, 147]   # stoich
+        pages[5][:, 0] = 10                    # lambdaTable: scale 0.1 / stoich
+        values = self.tune.decode_many(pages)
+        numpy.testing.assert_allclose([10.0, 14.7, 0.0, 14.7], values['stoich'])
+        self.assertEqual((4, 16, 16), values['lambdaTable'].shape)
+        numpy.testing.assert_allclose([0.1, 1 / 14.7, numpy.inf, 1 / 14.7], values['lambdaTable'][:, 0, 0])
+
+    def test_frame_layout(self):
+        decoder = FrameDecoder(self.ini_file)
+        self.assertEqual(127, decoder.size)
+        self.assertIn('rpm', decoder.names)
+        self.assertIn('coolant', decoder.computed_names)
+
+    def test_decode_frames(self):
+        decoder = FrameDecoder(self.ini_file)
+        frames = numpy.zeros((3, decoder.size), dtype=numpy.uint8)
+        rpm = decoder.dtype.fields['rpm'][1]
+        frames[:, rpm:rpm + 2] = numpy.array([800, 3000, 6500], dtype='<u2').view(numpy.uint8).reshape(3, 2)
+        coolant = decoder.dtype.fields['coolantRaw'][1]
+        frames[:, coolant] = [40, 120, 130]
+        frames[:, 1] = [0b01, 0b10, 0b11]   # inj1Status [0:0], inj2Status [1:1]
+        columns = decoder.decode_many(frames, names=['rpm', 'coolant', 'inj1Status', 'inj2Status'])
+        numpy.testing.assert_array_equal([800, 3000, 6500], columns['rpm'])
+        numpy.testing.assert_allclose([32, 176, 194], columns['coolant'])
+        numpy.testing.assert_array_equal([1, 0, 1], columns['inj1Status'])
+        numpy.testing.assert_array_equal([0, 1, 1], columns['inj2Status'])
+
+        frame = decoder.decode(frames[1].tobytes(), names=['rpm', 'coolant'])
+        self.assertEqual({'rpm': 3000, 'coolant': 176.0}, frame)
+        with self.assertRaises(KeyError):
+            decoder.decode_many(frames, names=['not_a_channel'])
+
+    def test_string(self):
+        page = Page(dict_data={'name': StringVariable(name='name', length=8, encoding='ASCII', offset=2)}, page_num=1)
+        codec = PageCodec(page)
+        data = codec.encode({'name': 'abc'})
+        self.assertEqual(10, len(data))
+        self.assertEqual('abc', codec.decode(data)['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
 
 from ts_ini_parser import *
 try:
-    from test_utils import parse_file, get_test_ini_path
+    from test_utils import parse_file, get_test_ini_path, model_state
 except:
-    from .test_utils import parse_file, get_test_ini_path
+    from .test_utils import parse_file, get_test_ini_path, model_state
 
 from lark import logger
 from logging import DEBUG, StreamHandler, getLogger
@@ -95,6 +95,29 @@ class test_dataclasstransformer(unittest.TestCase):
         self.assertIs(self.subject['Constants'][4]['taeBins'], self.subject['CurveEditor']['time_accel_tpsdot_curve'].lines[0].xbin.variable)
         self.assertIs(self.subject['PcVariables']['wueAFR'], self.subject['CurveEditor']['warmup_afr_curve'].lines[0].ybin.variable)
 
+    def test_outputchannel_refs(self):
+        self.assertIs(self.subject['OutputChannels']['rpm'], self.subject['TableEditor']['boostTbl'].table_xbin.outputchannel_ref)
+        self.assertIs(self.subject['OutputChannels']['coolant'], self.subject['CurveEditor']['warmup_curve'].lines[0].xbin.outputchannel_ref)
+
+    def test_lookup(self):
+        self.assertIs(self.subject['Constants'][7]['rpmBinsBoost'], self.subject.lookup('rpmBinsBoost'))
+        self.assertIs(self.subject['PcVariables']['wueAFR'], self.subject.lookup('wueAFR'))
+        self.assertIs(self.subject['OutputChannels']['rpm'], self.subject.lookup('rpm'))
+        with self.assertRaises(KeyError):
+            self.subject.lookup('not_a_variable')
+
+    def test_find(self):
+        self.assertIs(self.subject['Constants'][7]['boostTable'], self.subject.find('boostTable', Array2dVariable))
+        self.assertIsNone(self.subject.find('boostTable', Array1dVariable))
+        self.assertIsNone(self.subject.find('not_a_variable'))
+
+    def test_reindex(self):
+        variable = ScalarVariable(name='newVariable', type_name='U08')
+        self.subject['Constants'][1]['newVariable'] = variable
+        self.assertIsNone(self.subject.find('newVariable'))
+        self.subject.reindex()
+        self.assertIs(variable, self.subject.lookup('newVariable'))
+
     def test_datatype(self):
         data_type = self.subject['Constants'][1]['aseTaperTime'].data_type
         self.assertIsInstance(data_type, DataType)
@@ -108,6 +131,28 @@ class test_dataclasstransformer(unittest.TestCase):
         self.assertEqual(self.subject['Constants'][1]['vssPulsesPerKm'].size, 2)
         self.assertEqual(self.subject['Constants'][1]['vssMode'].size, 1)
 
+    def test_slotted(self):
+        # No per-instance __dict__ for the numerous model objects
+        table = self.subject['TableEditor']['boostTbl']
+        curve = self.subject['CurveEditor']['warmup_afr_curve']
+        for model in [self.subject['Constants'][7]['boostTable'], self.subject['Constants'][1]['aeMode'],
+                      self.subject['Constants'][1]['aeMode'].bit_size, self.subject['TunerStudio'][0],
+                      table, table.table_xbin, curve, curve.lines[0], curve.lines[0].xaxis]:
+            self.assertFalse(hasattr(model, '__dict__'), type(model).__name__)
+
+    def test_parse_model(self):
+        # Built by the parser callbacks, no tree: same model
+        parser = TsIniParser(ignore_hash_error=True)
+        parser.define('LAMBDA', True)
+        for name in ('MS3Format0262.11.ini', 'speeduino.ini'):
+            path = get_test_ini_path(Path("Test_Files") / name)
+            expected = DataClassTransformer().transform(parse_file(path, parser))
+            with open(path, 'r', encoding='latin-1') as file:
+                subject = parser.parse_model(file)
+            self.assertIsInstance(subject, TsIniFile)
+            self.assertEqual(model_state(expected), model_state(subject))
+        self.assertIs(subject['Constants'][7]['rpmBinsBoost'], subject['TableEditor']['boostTbl'].table_xbin.variable)
+
     # @unittest.skip("Not sure about always running this yet - it's slow")
     def test_all_ini(self):
         # Test all known INI files
@@ -0,0 +1,150 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import unittest
+from ts_ini_parser import TsIniParser, diff_ini, ContentHasher
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+_OLD = '''[Menu]
+   menu = "Fuel"
+   subMenu = std_separator
+   subMenu = reqFuel, "Required fuel"
+
+[Constants]
+page = 1
+   reqFuel = scalar, U08, 0, "ms", 0.1, 0, 0, 25.5, 1
+   nCylinders = bits, U08, 1, [0:3], "1", "2", "3", "4"
+   veBins = array, U08, 2, [4], "RPM", 100, 0, 0, 25500, 0
+   mapBins = array, U08, 6, [4], "kPa", 1, 0, 0, 255, 0
+   veTable = array, U08, 10, [4x4], "%", 1, 0, 0, 255, 0
+page = 2
+   idleRpm = scalar, U08, 0, "RPM", 10, 0, 0, 2550, 0
+   unused = scalar, U08, 1, "", 1, 0, 0, 255, 0
+
+[OutputChannels]
+   rpm = scalar, U16, 0, "RPM", 1, 0
+   map = scalar, U08, 2, "kPa", 1, 0
+
+[TableEditor]
+   table = veTbl, veMap, "VE Table", 1
+      xBins = veBins, rpm
+      yBins = mapBins, map
+      zBins = veTable
+
+'''
+
+_NEW = '''[Menu]
+   menu = "Fuel"
+   subMenu = std_separator
+   subMenu = idleRpm, "Idle"
+   subMenu = reqFuel, "Required fuel"
+
+[Constants]
+page = 1
+   reqFuel = scalar, U16, 0, "ms", 0.01, 0, 0, 655.35, 2
+   nCylinders = bits, U08, 2, [0:3], "1", "2", "3", "4"
+   veBins = array, U08, 3, [4], "RPM", 100, 0, 0, 25500, 0
+   mapBins = array, U08, 7, [4], "kPa", 1, 0, 0, 255, 0
+   veTable = array, U08, 11, [4x4], "%", 1, 0, 0, 255, 0
+   idleRpm = scalar, U08, 27, "RPM", 10, 0, 0, 2550, 0
+page = 2
+   boostTarget = scalar, U08, 0, "kPa", 1, 0, 0, 255, 0
+
+[OutputChannels]
+   rpm = scalar, U16, 0, "RPM", 1, 0
+   map = scalar, U08, 2, "kPa", 1, 0
+
+[TableEditor]
+   table = veTbl, veMap, "Volumetric Efficiency", 1
+      xBins = veBins, rpm
+      yBins = mapBins, map
+      zBins = veTable
+
+'''
+
+
+def _names(changes):
+    return sorted((change.section, change.name) for change in changes)
+
+
+class test_diff(unittest.TestCase):
+
+    def setUp(self):
+        parser = TsIniParser()
+        self.old = parser.parse_model(_OLD)
+        self.new = parser.parse_model(_NEW)
+
+    def test_identical(self):
+        diff = diff_ini(self.old, TsIniParser().parse_model(_OLD))
+        self.assertFalse(diff)
+        self.assertEqual([], diff.changes)
+
+    def test_variables(self):
+        diff = diff_ini(self.old, self.new)
+        self.assertEqual(['Constants', 'Menu', 'TableEditor'], sorted(diff.changed_sections))
+        self.assertEqual([('Constants', 'boostTarget'), ('Menu', 'subMenu')], _names(diff.added))
+        self.assertEqual([('Constants', 'unused')], _names(diff.removed))
+
+        moved, = diff.moved
+        self.assertEqual('idleRpm', moved.name)
+        self.assertEqual({'page': (2, 1), 'offset': (0, 27)}, moved.fields)
+
+        self.assertEqual({('Constants', 'nCylinders'): 1, ('Constants', 'veBins'): 1, ('Constants', 'mapBins'): 1,
+                          ('Constants', 'veTable'): 1, ('Constants', 'idleRpm'): 27}, diff.offset_shifts)
+        self.assertEqual([('Constants', 'reqFuel')], _names(diff.type_changes))
+        self.assertEqual([('Constants', 'reqFuel')], _names(diff.scale_changes))
+        self.assertEqual(('U08', 'U16'), diff.type_changes[0].fields['data_type'])
+        self.assertEqual((0.1, 0.01), diff.scale_changes[0].fields['scale'])
+
+    def test_other_sections(self):
+        diff = diff_ini(self.old, self.new)
+        table, = diff.section('TableEditor')
+        self.assertEqual(('changed', 'veTbl'), (table.kind, table.name))
+        self.assertEqual({'title': ('VE Table', 'Volumetric Efficiency')}, table.fields)
+        menu, = diff.section('Menu')
+        self.assertEqual(('added', 'subMenu'), (menu.kind, menu.name))
+        self.assertIs(self.new['Menu'][2], menu.new)
+
+    def test_hasher(self):
+        hasher = ContentHasher()
+        self.assertEqual(hasher(self.old['OutputChannels']), hasher(self.new['OutputChannels']))
+        self.assertNotEqual(hasher(self.old['Constants'][1]), hasher(self.new['Constants'][1]))
+        # Hashes are remembered
+        self.assertEqual(str(diff_ini(self.old, self.new)), str(diff_ini(self.old, self.new, hasher)))
+
+    def test_digest_collision(self):
+        # hash(-1) == hash(-2): equal content must not be decided by hash()
+        old = TsIniParser().parse_model(_OLD.replace('"kPa", 1, 0,', '"kPa", 1, -1,'))
+        new = TsIniParser().parse_model(_OLD.replace('"kPa", 1, 0,', '"kPa", 1, -2,'))
+        self.assertEqual(hash(-1.0), hash(-2.0))
+        diff = diff_ini(old, new)
+        change, = diff.scale_changes
+        self.assertEqual(('Constants', 'mapBins'), (change.section, change.name))
+        self.assertEqual({'translate': (-1.0, -2.0)}, change.fields)
+
+    def test_firmware_revisions(self):
+        parser = TsIniParser(ignore_hash_error=True, pre_processor_backend='scanner')
+
+        def load(name):
+            return parser.parse_model((get_test_ini_path('Test_Files') / name).read_bytes())
+        old = load('MS3Format0262.08.ini')
+        new = load('MS3Format0262.09.ini')
+        diff = diff_ini(old, new)
+        self.assertTrue(diff.changes)
+        self.assertFalse(diff_ini(new, load('MS3Format0262.09.ini')))
+        for change in diff.changes:
+            self.assertEqual(change.kind in ('changed', 'moved'), bool(change.fields), change)
+            self.assertEqual(change.kind != 'added', change.old is not None)
+            self.assertEqual(change.kind != 'removed', change.new is not None)
+        # Reversed, added & removed swap
+        reverse = diff_ini(new, old)
+        self.assertEqual(_names(diff.added), _names(reverse.removed))
+        self.assertEqual(_names(diff.removed), _names(reverse.added))
+
+
+if __name__ == '__main__':
+    unittest.main()
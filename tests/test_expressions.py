@@ -0,0 +1,98 @@
+from pathlib import Path
+import unittest
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+from ts_ini_parser import *
+from ts_ini_parser.expressions import expression_text
+try:
+    from test_utils import parse_file, get_test_ini_path
+except:
+    from .test_utils import parse_file, get_test_ini_path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class test_expressions(unittest.TestCase):
+
+    def setUp(self):
+        self.compiler = ExpressionCompiler()
+
+    def evaluate(self, expression, **values):
+        return self.compiler.compile(expression)(values)
+
+    def test_arithmetic(self):
+        self.assertAlmostEqual(176.0, self.evaluate('(coolantRaw - 40) * 1.8 + 32', coolantRaw=120))
+        self.assertEqual(2.0, self.evaluate('x / 0.5f', x=1))
+        self.assertEqual(-1.0, self.evaluate('x % 3', x=-7))
+        self.assertEqual(-3, self.evaluate('-x', x=3))
+
+    def test_ternary(self):
+        self.assertEqual(1, self.evaluate('x > 3 ? 1 : 2', x=5))
+        self.assertEqual(2, self.evaluate('x > 3 ? 1 : 2', x=3))
+        self.assertEqual(3, self.evaluate('x == 1 ? 2 : x == 2 ? 3 : 4', x=2))
+
+    def test_logical(self):
+        self.assertTrue(self.evaluate('x >= 1 && y != 0', x=1, y=2))
+        self.assertFalse(self.evaluate('!x || y', x=1, y=0))
+
+    def test_bits(self):
+        self.assertEqual(60, self.evaluate('(x & 0x0f) << 2', x=0xff))
+        self.assertEqual(3, self.evaluate('x >> 4', x=0x3f))
+        self.assertEqual(4, self.evaluate('0b101 ^ 1'))
+        self.assertEqual(7, self.evaluate('x | 3', x=4.0))
+        self.assertEqual(-1, self.evaluate('~x', x=0))
+
+    def test_functions(self):
+        self.assertEqual(11.0, self.evaluate('sqrt(x*x) + pow(2, 3)', x=-3))
+        self.assertEqual(5, self.evaluate('arrayValue(array.outputs, layout)', outputs=[4, 5], layout=1.0))
+        compiler = ExpressionCompiler(functions={'double': lambda value: value * 2})
+        self.assertEqual(8, compiler.compile('double(x)')({'x': 4}))
+
+    def test_identifiers(self):
+        compiled = self.compiler.compile('abs(x) + table[y]')
+        self.assertEqual({'x', 'y', 'table'}, compiled.identifiers)
+        self.assertEqual({'abs'}, compiled.functions)
+        self.assertEqual(6, compiled({'x': -1, 'y': 1, 'table': [4, 5]}))
+
+    def test_cached(self):
+        self.assertIs(self.compiler.compile('x + 1'), self.compiler.compile(' x + 1   '))
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            self.compiler.compile('x++')
+
+    def test_computed_channels(self):
+        ini_file = DataClassTransformer().transform(parse_file(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), TsIniParser()))
+        channels = computed_channels(ini_file)
+        self.assertEqual('(coolantRaw - 40) * 1.8 + 32', channels['coolant'].strip())
+        self.assertIsNone(expression_text(ini_file['OutputChannels']['rpm'].scale))
+        for expression in channels.values():
+            self.compiler.compile(expression)
+
+    def test_evaluate_row(self):
+        result = evaluate_channels({'x': 'y * 2', 'y': 'a + 1'}, {'a': 1}, vectorized=False)
+        self.assertEqual({'x': 4, 'y': 2}, result)
+
+    @unittest.skipUnless(numpy, 'Needs NumPy')
+    def test_vectorized(self):
+        compiled = self.compiler.compile('x > 3 ? x / 0 : ~y & 3', vectorized=True)
+        result = compiled({'x': numpy.array([1.0, 5.0]), 'y': numpy.array([0, 1])})
+        numpy.testing.assert_array_equal([3, numpy.inf], result)
+        self.assertIsNot(compiled, self.compiler.compile('x > 3 ? x / 0 : ~y & 3'))
+
+    @unittest.skipUnless(numpy, 'Needs NumPy')
+    def test_evaluate_channels(self):
+        result = evaluate_channels({'x': 'y * 2', 'y': 'a + 1'}, {'a': numpy.arange(3)})
+        numpy.testing.assert_array_equal([1, 2, 3], result['y'])
+        numpy.testing.assert_array_equal([2, 4, 6], result['x'])
+        self.assertEqual(['y'], list(evaluate_channels({'x': 'y * 2', 'y': 'a + 1'}, {'a': 1}, names=['y'])))
+        with self.assertRaises(ValueError):
+            evaluate_channels({'x': 'y', 'y': 'x'}, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from ts_ini_parser.grammar_cache import CACHE_DIR_VARIABLE, cache_dir, cache_path, open_grammar
+
+_GRAMMAR = Path(__file__).parent.parent / 'ts_ini_parser' / 'grammars' / 'ts_expression.lark'
+
+
+class test_grammar_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.old_dir = os.environ.get(CACHE_DIR_VARIABLE)
+        os.environ[CACHE_DIR_VARIABLE] = self.folder.name
+
+    def tearDown(self):
+        if self.old_dir is None:
+            del os.environ[CACHE_DIR_VARIABLE]
+        else:
+            os.environ[CACHE_DIR_VARIABLE] = self.old_dir
+        self.folder.cleanup()
+
+    def test_cache_path(self):
+        path = cache_path(_GRAMMAR, start='conditional_expression')
+        self.assertEqual(Path(self.folder.name), path.parent)
+        self.assertTrue(path.name.startswith('ts_expression-'))
+        # Different options, different tables
+        self.assertNotEqual(path, cache_path(_GRAMMAR))
+
+    def test_open_grammar(self):
+        path = cache_path(_GRAMMAR, parser='lalr', start='conditional_expression')
+        first = open_grammar(_GRAMMAR, start='conditional_expression')
+        self.assertTrue(path.exists())
+        self.assertEqual([path], list(Path(self.folder.name).iterdir()))
+        # Loaded from the cache
+        second = open_grammar(_GRAMMAR, start='conditional_expression')
+        self.assertEqual(first.parse('a + 1'), second.parse('a + 1'))
+
+    def test_corrupt_cache(self):
+        path = cache_path(_GRAMMAR, parser='lalr', start='conditional_expression')
+        path.write_bytes(b'not a cache\n')
+        parser = open_grammar(_GRAMMAR, start='conditional_expression')
+        self.assertEqual('additive_expression', parser.parse('a + 1').data)
+        # Rebuilt
+        self.assertNotEqual(b'not a cache\n', path.read_bytes()[:12])
+
+    def test_disabled(self):
+        os.environ[CACHE_DIR_VARIABLE] = ''
+        self.assertIsNone(cache_dir())
+        open_grammar(_GRAMMAR, start='conditional_expression')
+        self.assertEqual([], list(Path(self.folder.name).iterdir()))
+
+    def test_lazy_import(self):
+        # Importing the package doesn't import Lark until it is needed
+        code = 'import sys, ts_ini_parser; print("lark" in sys.modules); ts_ini_parser.TsIniParser; print("lark" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                                cwd=str(Path(__file__).parent.parent)).stdout
+        self.assertEqual(['False', 'True'], output.split())
+
+
+if __name__ == '__main__':
+    unittest.main()
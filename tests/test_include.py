@@ -0,0 +1,190 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+import pickle
+from lark.exceptions import UnexpectedInput
+from ts_ini_parser import TsIniParser, IncludeCache, IncludedToken, DataClassTransformer, ParseCache
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
+
+_MAIN = '''[OutputChannels]
+   a = scalar, U08, 0, "", 1, 0
+#include "sensors.ini" ; lambda sensors
+#if FROM_INCLUDE
+   b = scalar, U08, 1, "", 1, 0
+#endif
+
+'''
+
+_SENSORS = '''#if LAMBDA
+   lambda = scalar, U08, 2, "", 1, 0
+#else
+   afr = scalar, U08, 2, "", 1, 0
+#endif
+#set FROM_INCLUDE
+'''
+
+
+def _lines(lines):
+    return [(token.line, token.value.strip()) for token in lines]
+
+
+class test_include(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.TemporaryDirectory()
+        self.folder = Path(self._folder.name)
+        (self.folder / 'sub').mkdir()
+        self.main = self._write('main.ini', _MAIN)
+        self.sensors = self._write('sub/sensors.ini', _SENSORS)
+
+    def tearDown(self):
+        self._folder.cleanup()
+
+    def _write(self, name, text):
+        path = self.folder / name
+        path.write_text(text)
+        return path
+
+    def _pre_process(self, pre_processor, path=None, defines=None):
+        with open(path or self.main) as source:
+            return _lines(pre_processor.pre_process_stream(source, defines))
+
+    def test_splice(self):
+        for backend in TsIniPreProcessor.BACKENDS:
+            pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=IncludeCache(),
+                                              backend=backend)
+            # Included lines keep their position in the included file
+            self.assertEqual([(1, '[OutputChannels]'),
+                              (2, 'a = scalar, U08, 0, "", 1, 0'),
+                              (2, 'lambda = scalar, U08, 2, "", 1, 0'),
+                              (5, 'b = scalar, U08, 1, "", 1, 0')],
+                             self._pre_process(pre_processor, defines={'LAMBDA': True}))
+            self.assertEqual({self.sensors.resolve()}, pre_processor.included)
+            self.assertEqual({'LAMBDA', 'FROM_INCLUDE'}, pre_processor.tested_symbols)
+
+    def test_parse(self):
+        for streaming in (False, True):
+            parser = TsIniParser(streaming=streaming, include_paths=[self.folder / 'sub'])
+            with open(self.main) as source:
+                ini_file = DataClassTransformer().transform(parser.parse(source, {}))
+            self.assertEqual(['a', 'afr', 'b'], list(ini_file['OutputChannels'].keys()))
+
+    def test_skipped(self):
+        # Without include paths, #include lines are skipped
+        self.assertEqual([(1, '[OutputChannels]'), (2, 'a = scalar, U08, 0, "", 1, 0')],
+                         self._pre_process(TsIniPreProcessor(False)))
+
+    def test_not_found(self):
+        pre_processor = TsIniPreProcessor(False, include_paths=[], include_cache=IncludeCache())
+        self.assertRaises(SyntaxError, self._pre_process, pre_processor)
+        # Not an error in an inactive branch
+        source = io.StringIO('a = 1\n#if MISSING\n#include "missing.ini"\n#endif\n')
+        self.assertEqual(['a = 1\n'], [token.value for token in pre_processor.pre_process_stream(source)])
+
+    def test_recursive(self):
+        self._write('sub/sensors.ini', '#include "sensors.ini"\n')
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=IncludeCache())
+        self.assertRaises(SyntaxError, self._pre_process, pre_processor)
+
+    def test_cache(self):
+        cache = IncludeCache()
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=cache)
+        first = self._pre_process(pre_processor)
+        self.assertEqual(first, self._pre_process(pre_processor))
+        self.assertEqual(1, len(cache))
+        # One entry per set of defined symbols
+        self._pre_process(pre_processor, defines={'LAMBDA': True})
+        self.assertEqual(2, len(cache))
+        # A changed file is preprocessed again
+        self._write('sub/sensors.ini', '   egt = scalar, U08, 2, "", 1, 0\n')
+        os.utime(self.sensors, ns=(0, 0))
+        self.assertIn((1, 'egt = scalar, U08, 2, "", 1, 0'), self._pre_process(pre_processor))
+
+    def test_cache_nested(self):
+        # A changed file included by an included file is preprocessed again
+        self._write('sub/sensors.ini', '#include "egt.ini"\n')
+        egt = self._write('sub/egt.ini', '   egt = scalar, U08, 2, "", 1, 0\n')
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=IncludeCache())
+        self.assertIn((1, 'egt = scalar, U08, 2, "", 1, 0'), self._pre_process(pre_processor))
+        self._write('sub/egt.ini', '   egt = scalar, U08, 3, "", 1, 0\n')
+        os.utime(egt, ns=(0, 0))
+        self.assertIn((1, 'egt = scalar, U08, 3, "", 1, 0'), self._pre_process(pre_processor))
+
+    def test_graph(self):
+        self._write('sub/sensors.ini', '#include "egt.ini"\n')
+        egt = self._write('sub/egt.ini', '   egt = scalar, U08, 2, "", 1, 0\n')
+        other = self._write('other.ini', '#include "egt.ini"\n')
+        cache = IncludeCache()
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=cache)
+        self._pre_process(pre_processor)
+        self._pre_process(pre_processor, other)
+        self.assertEqual({egt.resolve()}, pre_processor.included)
+        graph = pre_processor.include_graph
+        self.assertEqual({self.sensors.resolve()}, graph.includes(self.main))
+        self.assertEqual({self.main.resolve(), self.sensors.resolve(), other.resolve()}, graph.dependents(egt))
+        self.assertEqual({self.main.resolve(), other.resolve()}, graph.roots(egt))
+        self.assertEqual({self.main.resolve()}, graph.roots(self.sensors))
+
+    def test_graph_replaced(self):
+        # A file that stops including another is no longer its dependent
+        cache = IncludeCache()
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=cache)
+        self._pre_process(pre_processor)
+        self.assertEqual({self.main.resolve()}, pre_processor.include_graph.roots(self.sensors))
+        self._write('main.ini', _MAIN.replace('#include "sensors.ini" ; lambda sensors\n', ''))
+        self._pre_process(pre_processor)
+        self.assertEqual(frozenset(), pre_processor.include_graph.includes(self.main))
+        self.assertEqual(set(), pre_processor.include_graph.roots(self.sensors))
+
+    def test_error_source(self):
+        # Spliced lines keep their own line numbers: errors say which file
+        for text in ('   = 1\n', 'a = "b\n', '#if LAMBDA\n#error lambda\n#endif\n'):
+            self._write('sub/sensors.ini', text)
+            os.utime(self.sensors, ns=(0, 0))
+            for backend in TsIniPreProcessor.BACKENDS:
+                parser = TsIniParser(include_paths=[self.folder / 'sub'], pre_processor_backend=backend)
+                for parse in (parser.parse, parser.parse_model):
+                    with open(self.main) as source:
+                        with self.assertRaises((SyntaxError, UnexpectedInput), msg=(text, backend)) as context:
+                            parse(source, {'LAMBDA': True})
+                    self.assertEqual(self.sensors.resolve(), context.exception.source, (text, backend))
+        # An error in the file itself
+        self._write('sub/sensors.ini', _SENSORS)
+        self._write('main.ini', '   = 1\n#include "sensors.ini"\n')
+        with open(self.main) as source:
+            with self.assertRaises(UnexpectedInput) as context:
+                TsIniParser(include_paths=[self.folder / 'sub']).parse(source)
+        self.assertIsNone(context.exception.source)
+
+    def test_included_token(self):
+        pre_processor = TsIniPreProcessor(False, include_paths=[self.folder / 'sub'], include_cache=IncludeCache())
+        with open(self.main) as source:
+            lines = list(pre_processor.pre_process_stream(source))
+        self.assertEqual([None, None, self.sensors.resolve(), None],
+                         [getattr(line, 'source', None) for line in lines])
+        copy = pickle.loads(pickle.dumps(lines[2]))
+        self.assertIsInstance(copy, IncludedToken)
+        self.assertEqual((lines[2], lines[2].line, lines[2].end_pos, lines[2].source),
+                         (copy, copy.line, copy.end_pos, copy.source))
+
+    def test_parse_cache(self):
+        # A changed include invalidates the parse cache entries of the files that include it
+        cache = ParseCache(self.folder / 'cache')
+        parser = TsIniParser(include_paths=[self.folder / 'sub'])
+        def channels():
+            with open(self.main) as source:
+                return list(cache.load(parser, source)['OutputChannels'].keys())
+        self.assertEqual(['a', 'afr', 'b'], channels())
+        self.assertEqual(['a', 'afr', 'b'], channels())
+        self._write('sub/sensors.ini', '   egt = scalar, U08, 2, "", 1, 0\n')
+        os.utime(self.sensors, ns=(0, 0))
+        self.assertEqual(['a', 'egt'], channels())
+
+
+if __name__ == '__main__':
+    unittest.main()
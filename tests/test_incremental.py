@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import unittest
+from pathlib import Path
+from ts_ini_parser import *
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+
+class test_incremental(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), 'r', encoding='latin-1') as file:
+            cls.text = file.read()
+
+    def setUp(self):
+        self.parser = TsIniParser()
+        self.subject = parse_incremental(self.parser, self.text)
+
+    def _replace(self, subject, old, new, after=None):
+        start = subject.text.index(old, subject.text.index(after) if after else 0)
+        return subject.edit(start, start + len(old), new)
+
+    def test_edit_page(self):
+        constants = self.subject['Constants']
+        table = self.subject['TableEditor']['boostTbl']
+
+        edited = self._replace(self.subject, '"RPM",      100.0', '"rev/min",      100.0', 'rpmBinsBoost')
+
+        new_constants = edited['Constants']
+        self.assertEqual('rev/min', new_constants[7]['rpmBinsBoost'].units)
+        self.assertIsNot(constants[7], new_constants[7])
+        self.assertIs(constants[6], new_constants[6])
+        # Tables using the edited page are wired to the new variables,
+        # others are untouched
+        self.assertIs(new_constants[7]['rpmBinsBoost'], edited['TableEditor']['boostTbl'].table_xbin.variable)
+        self.assertIs(self.subject['TableEditor']['veTable1Tbl'], edited['TableEditor']['veTable1Tbl'])
+        # The original is unchanged
+        self.assertEqual('RPM', constants[7]['rpmBinsBoost'].units)
+        self.assertIs(constants[7]['rpmBinsBoost'], table.table_xbin.variable)
+
+    def test_edit_table(self):
+        table_editor = self.subject['TableEditor']
+
+        edited = self._replace(self.subject, '"Boost Duty / Target"', '"Boost"', 'table = boostTbl')
+
+        self.assertEqual('Boost', edited['TableEditor']['boostTbl'].title)
+        self.assertEqual(list(table_editor), list(edited['TableEditor']))
+        self.assertIs(table_editor['boostDCLupTbl'], edited['TableEditor']['boostDCLupTbl'])
+        self.assertIs(edited['Constants'][7]['boostTable'], edited['TableEditor']['boostTbl'].zbins.variable)
+
+    def test_edit_section(self):
+        edited = self._replace(self.subject, 'nCylinders', 'numCylinders', '[PcVariables]')
+        self.assertEqual(len(self.subject['PcVariables']), len(edited['PcVariables']))
+        self.assertIsNot(self.subject['PcVariables'], edited['PcVariables'])
+
+    def test_unloaded_stays_unloaded(self):
+        self.subject['Constants']
+        edited = self._replace(self.subject, 'table = boostTbl,    boostMap,  "Boost Duty',
+                               'table = boostTable1,    boostMap,  "Boost Duty')
+        self.assertEqual(['Constants'], edited.loaded_sections)
+        self.assertIn('boostTable1', edited['TableEditor'])
+
+    def test_positions_shift(self):
+        output_channels = self.subject.section_index['OutputChannels'][0]
+        edited = self._replace(self.subject, 'page = 7\n', 'page = 7\n; A new comment\n')
+        shifted = edited.section_index['OutputChannels'][0]
+        self.assertEqual(output_channels.lines[0].line + 1, shifted.lines[0].line)
+        self.assertEqual(output_channels.start_pos + 16, shifted.start_pos)
+        self.assertEqual('[OutputChannels]', edited.text[shifted.start_pos:shifted.lines[0].end_pos].strip())
+
+    def test_comment_only(self):
+        constants = self.subject['Constants']
+        edited = self._replace(self.subject, 'page = 7\n', 'page = 7 ; A comment\n')
+        self.assertIs(constants, edited['Constants'])
+
+    def test_new_section(self):
+        edited = self._replace(self.subject, '[Constants]', '[NewSection]\nkey = value\n\n[Constants]')
+        self.assertEqual(len(self.subject) + 1, len(edited))
+        self.assertEqual(15, len(edited['Constants']))
+
+    def test_unbalanced_if(self):
+        # The #if pairs with an #endif in another section, so the edited
+        # section can't be preprocessed on its own: the whole file is
+        # indexed again
+        text = '[MegaTune]\n   signature = "a"\n#if LAMBDA\n   b = 1\n#else\n   c = 1\n\n' \
+               '[OutputChannels]\n   a = 1\n#endif\n\n'
+        for backend in ('lark', 'scanner'):
+            subject = parse_incremental(TsIniParser(pre_processor_backend=backend), text)
+            edited = self._replace(subject, '"a"', '"b"')
+            self.assertEqual(['MegaTune', 'OutputChannels'], list(edited))
+            self.assertIn('"b"', edited.text)
+
+    def test_matches_full_parse(self):
+        self.subject.load_all()
+        edited = self._replace(self.subject, 'U08,    64,', 'U08,    65,', 'rpmBinsBoost')
+        edited = self._replace(edited, 'gridHeight  = 3.0', 'gridHeight  = 4.0', 'table = boostTbl')
+        expected = DataClassTransformer().transform(TsIniParser().parse(io.StringIO(edited.text)))
+        self.assertEqual(list(expected['Constants'][7]), list(edited['Constants'][7]))
+        self.assertEqual(65, edited['Constants'][7]['rpmBinsBoost'].offset)
+        self.assertEqual(expected['TableEditor']['boostTbl'].grid_height, edited['TableEditor']['boostTbl'].grid_height)
+        self.assertIs(edited['Constants'][7]['rpmBinsBoost'], edited['TableEditor']['boostTbl'].table_xbin.variable)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import json
+import unittest
+from pathlib import Path
+from ts_ini_parser import TsIniParser, DataClassTransformer, ParseStats
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+_INI_TEXT = '''[MegaTune]
+#if LAMBDA
+#if WIDEBAND
+   signature = "wideband"
+#else
+   signature = "lambda"
+#endif
+#endif
+
+'''
+
+
+class test_instrumentation(unittest.TestCase):
+
+    def setUp(self):
+        with open(get_test_ini_path(Path('Test_Files') / 'speeduino.ini'), 'r', encoding='latin-1') as file:
+            self.text = file.read()
+
+    def test_tree(self):
+        stats = ParseStats()
+        parser = TsIniParser()
+        DataClassTransformer(stats=stats).transform(parser.parse(io.StringIO(self.text), stats=stats))
+        self.assertEqual(['pre_process', 'parse', 'transform'], list(stats.stages))
+        transform = stats.stages['transform']
+        self.assertGreater(transform.rules['kvp_page_scalar_line'].calls, 100)
+        self.assertEqual(1, transform.rules['start'].calls)
+        self.assertGreater(stats.stages['parse'].tokens['_EOL'], 1000)
+        self.assertEqual(20, stats.define_expansions['DIGITAL_PIN'])
+        self.assertEqual(1, stats.max_conditional_depth)
+
+    def test_parse_model(self):
+        stats = ParseStats()
+        TsIniParser().parse_model(io.StringIO(self.text), stats=stats)
+        self.assertEqual(['pre_process', 'parse_model'], list(stats.stages))
+        self.assertEqual(1, stats.stages['parse_model'].rules['start'].calls)
+        self.assertEqual(20, stats.define_expansions['DIGITAL_PIN'])
+
+    def test_conditionals(self):
+        stats = ParseStats()
+        for streaming in (False, True):
+            TsIniParser(streaming=streaming).parse(io.StringIO(_INI_TEXT), {'LAMBDA': True}, stats=stats)
+        self.assertEqual({1: 2, 2: 2}, dict(stats.conditional_depths))
+        self.assertEqual(2, stats.max_conditional_depth)
+        self.assertEqual(4, stats.stages['pre_process'].tokens['_ENDIF_TAG'])
+
+    def test_output(self):
+        stats = ParseStats()
+        TsIniParser().parse(io.StringIO(_INI_TEXT), stats=stats)
+        as_json = json.loads(stats.to_json())
+        self.assertEqual(stats.stages['parse'].rules['start'].calls, as_json['stages']['parse']['rules']['start']['calls'])
+        self.assertEqual({'1': 1, '2': 1}, as_json['conditional_depths'])
+        folded = stats.folded_stacks()
+        self.assertIn('pre_process;start', [line.rsplit(' ', 1)[0] for line in folded])
+        for line in folded:
+            self.assertRegex(line, r'^\w+;\w+ \d+$')
+
+    def test_off(self):
+        # Without stats the shared (unwrapped) callbacks are used
+        parser = TsIniParser()
+        self.assertEqual(parser.parse(io.StringIO(_INI_TEXT)), parser.parse(io.StringIO(_INI_TEXT), stats=ParseStats()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import unittest
+from pathlib import Path
+from unittest import mock
+from ts_ini_parser import *
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+
+class test_lazy_ini_file(unittest.TestCase):
+
+    def setUp(self):
+        with open(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), 'r', encoding='latin-1') as file:
+            self.parser = TsIniParser()
+            self.subject = parse_lazy(self.parser, file)
+
+    def test_nothing_loaded(self):
+        self.assertIsInstance(self.subject, TsIniFile)
+        self.assertEqual(22, len(self.subject))
+        self.assertIn('Constants', self.subject)
+        self.assertEqual([], self.subject.loaded_sections)
+
+    def test_section_on_demand(self):
+        section = self.subject['Constants']
+        self.assertIsInstance(section, ConstantsSection)
+        self.assertEqual(15, len(section))
+        self.assertEqual(['Constants'], self.subject.loaded_sections)
+        self.assertIs(section, self.subject['Constants'])
+
+    def test_section_index(self):
+        constants = self.subject.section_index['Constants'][0]
+        self.assertLess(constants.start_pos, constants.end_pos)
+        self.assertEqual('[Constants]', constants.lines[0].strip())
+        self.assertEqual(182, constants.lines[0].line)
+
+    def test_variablerefs_replacedinline(self):
+        # The #defines live in other sections
+        self.assertEqual(len(self.subject['PcVariables']['algorithmNames'].unknown_values), 8)
+        self.assertEqual(len(self.subject['Constants'][13]['outputPin0'].unknown_values), 256)
+
+    def test_interline_references(self):
+        table = self.subject['TableEditor']['boostTbl']
+        # Bins reference OutputChannels too
+        self.assertCountEqual(['TableEditor', 'Constants', 'OutputChannels'], self.subject.loaded_sections)
+        self.assertIs(self.subject['Constants'][7]['rpmBinsBoost'], table.table_xbin.variable)
+        self.assertIs(self.subject['PcVariables']['wueAFR'],
+                      self.subject['CurveEditor']['warmup_afr_curve'].lines[0].ybin.variable)
+
+    def test_load_all(self):
+        constants = self.subject['Constants']
+        self.subject.load_all()
+        self.assertEqual(22, len(self.subject.loaded_sections))
+        self.assertIs(constants, self.subject['Constants'])
+        self.assertIs(constants[7]['boostTable'], self.subject['TableEditor']['boostTbl'].zbins.variable)
+        self.assertEqual('iniSpecVersion', self.subject['TunerStudio'][0].name)
+
+    def test_file_header(self):
+        self.assertIsInstance(self.subject.file_header, list)
+
+    def test_parses_section_only(self):
+        # The header & #defines are parsed once: then a section is a parse
+        # of its own lines
+        self.subject['UserDefined']
+        with mock.patch.object(self.parser, 'parse_pre_processed', wraps=self.parser.parse_pre_processed) as parse:
+            self.subject['Menu']
+        self.assertEqual(1, parse.call_count)
+        menu = self.subject.section_index['Menu'][0]
+        self.assertEqual(menu.lines, parse.call_args[0][0])
+
+    def test_scanner_index(self):
+        # The lark backend is kept for parsing, the scanner indexes
+        text = '#define LIST = "a", "b"\n[Test]\n   #define OTHER = $LIST, "c"\n[MegaTune]\n   signature = "x"\n\n'
+        with mock.patch.object(self.parser, 'pre_process_stream', wraps=self.parser.pre_process_stream) as stream:
+            subject = parse_lazy(self.parser, io.StringIO(text))
+        self.assertEqual('scanner', stream.call_args[1]['backend'])
+        self.assertEqual('lark', self.parser.pre_processor_backend)
+        self.assertEqual(1, len(subject['MegaTune']))
+        with self.assertRaises(ValueError):
+            self.parser.pre_process_stream(io.StringIO(text), backend='other')
+
+
+if __name__ == '__main__':
+    unittest.main()
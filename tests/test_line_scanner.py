@@ -0,0 +1,135 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import time
+import unittest
+from logging import getLogger, StreamHandler, DEBUG
+from ts_ini_parser import TsIniParser, DataClassTransformer, ParseStats
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
+try:
+    from test_utils import get_test_ini_path, model_state
+except:
+    from .test_utils import get_test_ini_path, model_state
+
+_DEFINE_SETS = ({}, {'CAN_COMMANDS': True, 'LAMBDA': True, 'CELSIUS': True, 'INI_VERSION_2': True})
+
+
+def _run(pre_processor, source, defines):
+    # Everything the backends must agree on: the lines, their positions,
+    # the symbols or the error
+    try:
+        stream = pre_processor.pre_process_stream(source, defines)
+        lines = [(token.value, token.line, token.column, token.start_pos,
+                  token.end_line, token.end_column, token.end_pos) for token in stream]
+        return lines, dict(stream.symbols), stream.tested_symbols
+    except SyntaxError as error:
+        return error.msg, error.lineno, error.offset, error.text
+
+
+class test_line_scanner(unittest.TestCase):
+
+    def _assert_same(self, text, defines=None):
+        for ignore_hash_error in (False, True):
+            expected = _run(TsIniPreProcessor(ignore_hash_error), io.StringIO(text), defines)
+            actual = _run(TsIniPreProcessor(ignore_hash_error, backend='scanner'), io.StringIO(text), defines)
+            self.assertEqual(expected, actual, text)
+
+    def test_corpus(self):
+        log = getLogger(self.__class__.__name__)
+        log.addHandler(StreamHandler())
+        log.setLevel(DEBUG)
+
+        seconds = {'lark': 0.0, 'scanner': 0.0}
+        for ini_file in sorted(get_test_ini_path('Test_Files').glob('*.ini')):
+            text = ini_file.read_text(encoding='latin-1')
+            for ignore_hash_error in (False, True):
+                for defines in _DEFINE_SETS:
+                    results = {}
+                    for backend in seconds:
+                        pre_processor = TsIniPreProcessor(ignore_hash_error, backend=backend)
+                        start = time.perf_counter()
+                        results[backend] = _run(pre_processor, text, defines)
+                        seconds[backend] += time.perf_counter() - start
+                    self.assertEqual(results['lark'], results['scanner'], (ini_file.name, defines))
+        log.info(f"Preprocessed the corpus in {seconds['lark']:.2f}s (lark), {seconds['scanner']:.2f}s (scanner): "
+                 f"{seconds['lark'] / seconds['scanner']:.1f}x faster")
+
+    def test_lines(self):
+        self._assert_same('a = 1\n'
+                          '  b = "x;y" ; comment\n'
+                          'c = "a" "b"  // comment\n'
+                          'd = a/b\t\n'
+                          '#define X = "a;b"\n'
+                          '#  define Y = 1 ; comment\n'
+                          '# comment\n#!comment\n#SET X\n#Include x\n'
+                          '\n   \n'
+                          'e = 1\r\n')
+
+    def test_directives(self):
+        text = ('#ifX\n a\n#elif ! Y ; comment\n b\n#else c\n d\n#endif e\n'
+                '#ifdef Y f\n#set Z\n#else\n#unset X\n#endif\n'
+                '#if Z\n g\n#endif\n'
+                '#error top level\n#exit\n'
+                '#if X\n#if !Y\n#error nested\n#endif\n#endif\n')
+        for defines in ({}, {'X': True}, {'Y': True}, {'X': True, 'Y': True}):
+            self._assert_same(text, defines)
+            self._assert_same(text.replace('\n', '\r\n'), defines)
+
+    def test_malformed(self):
+        for text in ('', '; comment\n', 'a', 'a = "b\n', '#endif\n', '#if X\n#else\n#else\n#endif\n', '#if X\n',
+                     '#define\n', '#\n', '#if\n', '#ifdef !X\n#endif\n'):
+            for backend in TsIniPreProcessor.BACKENDS:
+                with self.assertRaises(Exception, msg=(text, backend)):
+                    list(TsIniPreProcessor(False, backend=backend).pre_process_stream(text))
+
+    def test_pre_process(self):
+        # The trees differ: the grammar's keeps the NEWLINE tokens & the
+        # #if bodies (ppif_body), the scanner's is the kept lines, as
+        # pre_process_stream() yields them. Same lines, same parse.
+        text = ('[A]\n#ifX\n a = 1\n#elif ! Y ; comment\n b = 2\n#else\n d = 3\n#endif\n'
+                '#ifdef Y\n#set Z\n#else\n#unset X\n#endif\n'
+                '#if Z\n g = 4\n#endif\n h = 5\n\n')
+        for defines in ({}, {'X': True}, {'Y': True}, {'X': True, 'Y': True}):
+            trees = {}
+            tested_symbols = {}
+            for backend in TsIniPreProcessor.BACKENDS:
+                pre_processor = TsIniPreProcessor(False, backend=backend)
+                trees[backend] = pre_processor.pre_process(text, defines=defines)
+                tested_symbols[backend] = pre_processor.tested_symbols
+                self.assertEqual('start', trees[backend].data)
+            self.assertEqual(tested_symbols['lark'], tested_symbols['scanner'])
+            scanned = trees['scanner'].children
+            self.assertEqual([(token.value, token.line, token.column) for token in
+                              TsIniPreProcessor(False, backend='scanner').pre_process_stream(text, defines)],
+                             [(token.value, token.line, token.column) for token in scanned])
+            self.assertEqual([(token.value, token.line, token.column) for token in
+                              trees['lark'].scan_values(lambda value: getattr(value, 'type', None) == 'LINE')],
+                             [(token.value.rstrip('\n'), token.line, token.column) for token in scanned])
+
+            parser = TsIniParser()
+            self.assertEqual(model_state(DataClassTransformer().transform(parser.parse_pre_processed(trees['lark']))),
+                             model_state(DataClassTransformer().transform(parser.parse_pre_processed(trees['scanner']))))
+
+    def test_parse(self):
+        ini_file = get_test_ini_path('Test_Files') / 'speeduino.ini'
+        expected = model_state(TsIniParser().parse_model(ini_file.read_bytes()))
+        for streaming in (False, True):
+            parser = TsIniParser(streaming=streaming, pre_processor_backend='scanner')
+            self.assertEqual(expected, model_state(DataClassTransformer().transform(parser.parse(ini_file.read_bytes()))))
+            self.assertEqual(expected, model_state(parser.parse_model(ini_file.read_bytes())))
+
+    def test_stats(self):
+        stats = ParseStats()
+        pre_processor = TsIniPreProcessor(False, backend='scanner')
+        list(pre_processor.pre_process_stream('#if X\n#if Y\na\n#endif\n#endif\n', {'X': True}, stats=stats))
+        self.assertEqual({1: 1, 2: 1}, dict(stats.conditional_depths))
+        self.assertEqual(2, stats.stage('pre_process').tokens['_ENDIF_TAG'])
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, TsIniPreProcessor, False, backend='regex')
+
+
+if __name__ == '__main__':
+    unittest.main()
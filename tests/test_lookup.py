@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import bisect
+import unittest
+from pathlib import Path
+from ts_ini_parser import *
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _reference(bins, point):
+    # One point at a time: the lower bin index & the fraction to the next
+    point = min(max(point, bins[0]), bins[-1])
+    lower = min(max(bisect.bisect_right(bins, point) - 1, 0), len(bins) - 2)
+    return lower, (point - bins[lower]) / (bins[lower + 1] - bins[lower])
+
+
+def _reference_table(x_bins, y_bins, z_values, x, y):
+    column, x_fraction = _reference(x_bins, x)
+    row, y_fraction = _reference(y_bins, y)
+    lower = z_values[row][column] * (1 - x_fraction) + z_values[row][column + 1] * x_fraction
+    upper = z_values[row + 1][column] * (1 - x_fraction) + z_values[row + 1][column + 1] * x_fraction
+    return lower * (1 - y_fraction) + upper * y_fraction
+
+
+@unittest.skipUnless(numpy, 'Needs NumPy')
+class test_lookup(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ini_file = TsIniParser().parse_model((get_test_ini_path(Path("Test_Files") / "speeduino.ini")).read_bytes())
+        codec = TuneCodec(cls.ini_file)
+        rows, columns = numpy.mgrid[0:16, 0:16]
+        values = {'rpmBins': numpy.arange(500, 8001, 500), 'fuelLoadBins': numpy.arange(10, 161, 10),
+                  'veTable': 20 + rows * 10 + columns * 3,
+                  'taeBins': [0, 20, 50, 100], 'taeRates': [10, 40, 70, 90]}
+        pages = codec.encode(values, {page_num: bytearray(page.size) for page_num, page in codec.pages.items()})
+        cls.values = codec.decode(pages)
+        cls.table = cls.ini_file['TableEditor']['veTable1Tbl']
+        cls.curve = cls.ini_file['CurveEditor']['time_accel_tpsdot_curve']
+
+    def test_table(self):
+        lookup = TableLookup(self.table, self.values)
+        x_bins, y_bins = list(self.values['rpmBins']), list(self.values['fuelLoadBins'])
+        z_values = self.values['veTable'].tolist()
+        # At the bins, between them & clamped outside them
+        self.assertEqual(20, lookup(500, 10))
+        self.assertEqual(20 + 150 + 45, lookup(8000, 160))
+        self.assertAlmostEqual(20 + 5 + 1.5, lookup(750, 15))
+        self.assertEqual(20, lookup(0, -10))
+        self.assertEqual(lookup(8000, 160), lookup(20000, 255))
+
+        generator = numpy.random.default_rng(1)
+        rpm = generator.uniform(0, 9000, 1000)
+        load = generator.uniform(0, 200, 1000)
+        expected = [_reference_table(x_bins, y_bins, z_values, x, y) for x, y in zip(rpm, load)]
+        numpy.testing.assert_allclose(expected, lookup(rpm, load))
+        # Broadcast
+        self.assertEqual((3, 1000), lookup(rpm, numpy.array([[20], [60], [100]])).shape)
+
+    def test_curve(self):
+        lookup = CurveLookup(self.curve, self.values)
+        numpy.testing.assert_allclose([10, 10, 25, 40, 60, 90, 90], lookup([-5, 0, 10, 20, 40, 100, 255]))
+        self.assertAlmostEqual(80, lookup(75))
+
+        # Long axes are binary searched
+        for count in (4, 200):
+            bins = numpy.linspace(0, 1000, count)
+            rates = numpy.sqrt(bins)
+            lookup = CurveLookup(self.curve, dict(self.values, taeBins=bins, taeRates=rates))
+            points = numpy.linspace(-10, 1100, 1000)
+            numpy.testing.assert_allclose(numpy.interp(points, bins, rates), lookup(points))
+
+    def test_axes(self):
+        values = dict(self.values)
+        # Descending axes are flipped
+        values['rpmBins'] = self.values['rpmBins'][::-1]
+        values['veTable'] = self.values['veTable'][:, ::-1]
+        descending = TableLookup(self.table, values)
+        ascending = TableLookup(self.table, self.values)
+        points = numpy.linspace(0, 9000, 50)
+        numpy.testing.assert_allclose(ascending(points, 42), descending(points, 42))
+
+        # Repeated bins are a step
+        values = dict(self.values, taeBins=numpy.array([0, 20, 20, 100]))
+        numpy.testing.assert_allclose([25, 70, 80], CurveLookup(self.curve, values)([10, 20, 60]))
+
+        values['rpmBins'] = numpy.array([500, 1000, 800] + [900] * 13)
+        self.assertRaises(ValueError, TableLookup, self.table, values)
+        # Bins longer than the table are cut short
+        values = dict(self.values, veTable=numpy.ones((4, 4)))
+        self.assertEqual(1, TableLookup(self.table, values)(1000, 30))
+        values = dict(self.values, veTable=numpy.ones((4, 20)))
+        self.assertRaises(ValueError, TableLookup, self.table, values)
+        self.assertRaises(KeyError, TableLookup, self.table, {})
+
+    def test_nan(self):
+        lookup = TableLookup(self.table, self.values)
+        self.assertTrue(numpy.isnan(lookup(numpy.nan, 50)))
+
+
+if __name__ == '__main__':
+    unittest.main()
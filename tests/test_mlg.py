@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from ts_ini_parser import *
+try:
+    from test_utils import parse_file, get_test_ini_path
+except:
+    from .test_utils import parse_file, get_test_ini_path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# (type, name, units, scale, transform)
+_FIELDS = [
+    (7, 'Time', 's', 1.0, 0.0),
+    (2, 'RPM', 'rpm', 1.0, 0.0),
+    (0, 'IAT', 'C', 1.0, -40.0),
+    (3, 'Advance 1', 'deg', 0.5, 0.0),
+    (0, 'NoSuchLabel', '', 1.0, 0.0),
+]
+_FORMATS = {0: 'B', 2: 'H', 3: 'h', 7: 'f'}
+
+
+def write_mlg(path, rows, markers=None):
+    # A version 2 binary datalog. markers: {row: message} written before the row
+    markers = markers or {}
+    fields = b''.join(struct.pack('>B34s10sbffb34s', type_code, name.encode(), units.encode(), 0,
+                                  scale, transform, 0, b'')
+                      for type_code, name, units, scale, transform in _FIELDS)
+    record = '>' + ''.join(_FORMATS[field[0]] for field in _FIELDS)
+    header_size = 24
+    header = struct.pack('>6shiiihh', b'MLVLG\0', 2, 0, 0, header_size + len(fields),
+                         struct.calcsize(record), len(_FIELDS))
+    blocks = []
+    for index, row in enumerate(rows):
+        if index in markers:
+            blocks.append(struct.pack('>BBH50s', 1, 0, index, markers[index].encode()))
+        blocks.append(struct.pack('>BBH', 0, index % 256, index) + struct.pack(record, *row) + b'\0')
+    Path(path).write_bytes(header + fields + b''.join(blocks))
+
+
+@unittest.skipUnless(numpy, 'Needs NumPy')
+class test_mlg(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'log.mlg'
+        self.rows = [(index * 0.1, 1000 + index, 60 + index % 20, -index, index % 2) for index in range(1000)]
+        write_mlg(self.path, self.rows, {0: 'Start', 500: 'Key on'})
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_header(self):
+        with MlgReader(self.path) as log:
+            self.assertEqual(2, log.format_version)
+            self.assertEqual(['Time', 'RPM', 'IAT', 'Advance 1', 'NoSuchLabel'], log.names)
+            self.assertEqual('rpm', log.field('RPM').units)
+            self.assertAlmostEqual(0.5, log.field('Advance 1').scale)
+            self.assertEqual(1000, len(log))
+            self.assertEqual([MlgMarker(0, 0, 'Start'), MlgMarker(500, 500, 'Key on')], log.markers)
+            # Scanned once
+            with mock.patch.object(log, '_runs', side_effect=AssertionError('rescanned')):
+                self.assertEqual(1000, len(log))
+                self.assertEqual(2, len(log.markers))
+
+    def test_read(self):
+        with MlgReader(self.path) as log:
+            columns = log.read(['RPM', 'IAT', 'Advance 1'])
+        self.assertEqual(['RPM', 'IAT', 'Advance 1'], list(columns))
+        numpy.testing.assert_array_equal([row[1] for row in self.rows], columns['RPM'])
+        numpy.testing.assert_array_equal([row[2] - 40 for row in self.rows], columns['IAT'])
+        numpy.testing.assert_array_equal([row[3] * 0.5 for row in self.rows], columns['Advance 1'])
+
+    def test_iter_chunks(self):
+        with MlgReader(self.path) as log:
+            chunks = list(log.iter_chunks(['RPM'], rows=300, scaled=False))
+        # Split at the marker & every 300 rows
+        self.assertEqual([300, 200, 300, 200], [len(chunk['RPM']) for chunk in chunks])
+        self.assertEqual(numpy.dtype('>u2'), chunks[0]['RPM'].dtype)
+        numpy.testing.assert_array_equal([row[1] for row in self.rows], numpy.concatenate([chunk['RPM'] for chunk in chunks]))
+
+    def test_truncated(self):
+        # A partly written last row is ignored
+        data = self.path.read_bytes()
+        self.path.write_bytes(data[:-3])
+        with MlgReader(self.path) as log:
+            self.assertEqual(999, len(log))
+
+    def test_not_mlg(self):
+        self.path.write_bytes(b'Time,RPM\n')
+        with self.assertRaises(ValueError):
+            MlgReader(self.path)
+
+    def test_check(self):
+        tree = parse_file(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), TsIniParser())
+        ini_file = DataClassTransformer().transform(tree)
+        with MlgReader(self.path) as log:
+            channels = log.channels(ini_file)
+            self.assertEqual('rpm', channels['RPM'])
+            self.assertEqual('iat', channels['IAT'])
+            self.assertNotIn('NoSuchLabel', channels)
+            problems = log.check(ini_file)
+        self.assertEqual(['Advance 1: scaled by (0.0, 0.5), the channel by (0.0, 1.0)',
+                          'NoSuchLabel: no such channel'], problems)
+
+
+if __name__ == '__main__':
+    unittest.main()
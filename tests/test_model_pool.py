@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import unittest
+from ts_ini_parser import TsIniParser, DataClassTransformer, ModelPool, BitSize, Variable
+try:
+    from test_utils import get_test_ini_path, model_state
+except:
+    from .test_utils import get_test_ini_path, model_state
+
+_INI = '''[Constants]
+page = 1
+   reqFuel = scalar, U08, 0, "ms", 0.1, 0, 0, 25.5, 1
+   nCylinders = bits, U08, 1, [0:3], "1", "2", "3", "4"
+   veBins = array, U08, 2, [4], "RPM", 100, 0, 0, 25500, 0
+   mapBins = array, U08, 6, [4], "kPa", 1, 0, 0, 255, 0
+   veTable = array, U08, 10, [4x4], "%", 1, 0, 0, 255, 0
+page = 2
+   idleRpm = scalar, U08, 0, "RPM", 10, 0, 0, 2550, 0
+   nInjectors = bits, U08, 1, [0:3], "1", "2", "3", "4"
+
+[OutputChannels]
+   rpm = scalar, U16, 0, "RPM", 1, 0
+   map = scalar, U08, 2, "kPa", 1, 0
+
+[TableEditor]
+   table = veTbl, veMap, "VE Table", 1
+      xBins = veBins, rpm
+      yBins = mapBins, map
+      zBins = veTable
+
+'''
+
+
+class test_model_pool(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = TsIniParser()
+
+    def test_same_model(self):
+        text = (get_test_ini_path('Test_Files') / 'speeduino.ini').read_bytes()
+        expected = model_state(self.parser.parse_model(text))
+        pool = ModelPool()
+        for _ in range(2):
+            self.assertEqual(expected, model_state(self.parser.parse_model(text, pool=pool)))
+            self.assertEqual(expected, model_state(DataClassTransformer(pool=pool).transform(self.parser.parse(text))))
+        self.assertTrue(pool.hits['page'])
+
+    def test_shared(self):
+        pool = ModelPool()
+        first = self.parser.parse_model(_INI, pool=pool)
+        # Page 2 differs
+        second = self.parser.parse_model(_INI.replace('"RPM", 10,', '"RPM", 20,'), pool=pool)
+
+        self.assertIs(first['Constants'][1], second['Constants'][1])
+        self.assertIsNot(first['Constants'][2], second['Constants'][2])
+        self.assertEqual({'string', 'value', 'page'}, set(pool.hits))
+        idle_rpm = (first['Constants'][2]['idleRpm'], second['Constants'][2]['idleRpm'])
+        self.assertIs(idle_rpm[0].name, idle_rpm[1].name)
+        self.assertIs(idle_rpm[0].units, idle_rpm[1].units)
+        self.assertIs(idle_rpm[0].high, idle_rpm[1].high)
+        self.assertIsNot(idle_rpm[0].scale, idle_rpm[1].scale)
+        self.assertIs(first['Constants'][1]['nCylinders'].bit_size, second['Constants'][2]['nInjectors'].bit_size)
+
+        # Tables are wired to each file's variables, so they aren't shared
+        tables = (first['TableEditor']['veTbl'], second['TableEditor']['veTbl'])
+        self.assertIsNot(tables[0].table_xbin, tables[1].table_xbin)
+        for ini_file, table in zip((first, second), tables):
+            self.assertIs(ini_file.lookup('veBins'), table.table_xbin.variable)
+            self.assertIs(ini_file['OutputChannels']['rpm'], table.table_xbin.outputchannel_ref)
+
+    def test_values(self):
+        pool = ModelPool()
+        bit_size = pool.value(BitSize(0, 3))
+        self.assertIs(bit_size, pool.value(BitSize(0, 3)))
+        self.assertIsNot(bit_size, pool.value(BitSize(0, 4)))
+        values = pool.value(['a', ('number_field', 1.0)])
+        self.assertIs(values, pool.value(['a', ('number_field', 1.0)]))
+        self.assertIs(values[1], pool.value(('number_field', 1.0)))
+        # Equal, but not the same value
+        self.assertIsNot(values[1], pool.value(('number_field', 1)))
+        # Model objects aren't values
+        variables = [Variable('a')]
+        self.assertIs(variables, pool.value(variables))
+        self.assertIsNot(variables, pool.value([Variable('a')]))
+        self.assertTrue(len(pool))
+        pool.clear()
+        self.assertEqual(0, len(pool))
+
+
+if __name__ == '__main__':
+    unittest.main()
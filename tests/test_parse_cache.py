@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import tempfile
+import unittest
+from unittest import mock
+from ts_ini_parser import TsIniParser, ParseCache, TsIniFile
+from ts_ini_parser import parse_cache
+
+_INI_TEXT = """[MegaTune]
+   signature = "test"
+#if LAMBDA
+   afr = 1
+#else
+   afr = 2
+#endif
+
+[Constants]
+   pageSize = 10
+page = 1
+   rpm = scalar, U08, 0, "rpm", 100, 0, 0, 25500, 0
+
+"""
+
+
+class test_parse_cache(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._temp_dir.name
+        self.parser = TsIniParser()
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def load(self, cache, text=_INI_TEXT, defines=None):
+        with mock.patch.object(self.parser, 'parse_pre_processed', wraps=self.parser.parse_pre_processed) as parse:
+            result = cache.load(self.parser, io.StringIO(text), defines)
+            return result, parse.call_count
+
+    def test_warm_load_skips_parse(self):
+        cache = ParseCache(self.cache_dir)
+        cold, cold_parses = self.load(cache)
+        warm, warm_parses = self.load(cache)
+        self.assertEqual(1, cold_parses)
+        self.assertEqual(0, warm_parses)
+        self.assertIsInstance(warm, TsIniFile)
+        self.assertEqual(cold['Constants'][1]['rpm'].offset, warm['Constants'][1]['rpm'].offset)
+
+    def test_untested_symbol_hits(self):
+        cache = ParseCache(self.cache_dir)
+        self.load(cache)
+        self.parser.define('NOT_IN_FILE', True)
+        _, parses = self.load(cache)
+        self.assertEqual(0, parses)
+
+    def test_tested_symbol_misses(self):
+        cache = ParseCache(self.cache_dir)
+        without_lambda, _ = self.load(cache)
+        self.parser.define('LAMBDA', True)
+        with_lambda, parses = self.load(cache)
+        self.assertEqual(1, parses)
+        self.assertEqual('2', without_lambda['MegaTune'][1].values[0][1])
+        self.assertEqual('1', with_lambda['MegaTune'][1].values[0][1])
+
+    def test_set_symbol_hits(self):
+        # The file #sets a symbol it tests: the key is still the symbols the
+        # file was parsed with
+        text = '#set LAMBDA\n' + _INI_TEXT
+        cache = ParseCache(self.cache_dir)
+        parses = [self.load(cache, text)[1] for _ in range(3)]
+        self.assertEqual([1, 0, 0], parses)
+        self.assertNotIn('LAMBDA', self.parser.symbols)
+
+    def test_defines(self):
+        cache = ParseCache(self.cache_dir)
+        with_lambda, _ = self.load(cache, defines={'LAMBDA': True})
+        without_lambda, parses = self.load(cache)
+        self.assertEqual(1, parses)
+        _, parses = self.load(cache, defines={'LAMBDA': True, 'NOT_IN_FILE': True})
+        self.assertEqual(0, parses)
+        self.assertEqual('1', with_lambda['MegaTune'][1].values[0][1])
+        self.assertEqual('2', without_lambda['MegaTune'][1].values[0][1])
+
+    def test_concurrent_parse(self):
+        # Another parse finishing last (e.g. on another thread) mustn't
+        # change what this file is recorded as testing
+        parse_pre_processed = self.parser.parse_pre_processed
+
+        def then_parse_other(*args, **kwargs):
+            tree = parse_pre_processed(*args, **kwargs)
+            parse_pre_processed(self.parser.pre_process_stream(io.StringIO('[MegaTune]\n   signature = "other"\n\n')))
+            return tree
+
+        cache = ParseCache(self.cache_dir)
+        with mock.patch.object(self.parser, 'parse_pre_processed', side_effect=then_parse_other):
+            cache.load(self.parser, io.StringIO(_INI_TEXT))
+        _, parses = self.load(cache, defines={'LAMBDA': True})
+        self.assertEqual(1, parses)
+
+    def test_content_change_misses(self):
+        cache = ParseCache(self.cache_dir)
+        self.load(cache)
+        _, parses = self.load(cache, _INI_TEXT.replace('"test"', '"test2"'))
+        self.assertEqual(1, parses)
+
+    def test_version_change_invalidates(self):
+        self.load(ParseCache(self.cache_dir))
+        with mock.patch.object(parse_cache, '__version__', '999'):
+            _, parses = self.load(ParseCache(self.cache_dir))
+        self.assertEqual(1, parses)
+
+    def test_tree(self):
+        cache = ParseCache(self.cache_dir, keep_tree=True)
+        self.load(cache)
+        with mock.patch.object(self.parser, 'parse_pre_processed', wraps=self.parser.parse_pre_processed) as parse:
+            tree = cache.load_tree(self.parser, io.StringIO(_INI_TEXT))
+            self.assertEqual(0, parse.call_count)
+        self.assertEqual('start', tree.data)
+
+    def test_lru_eviction(self):
+        cache = ParseCache(self.cache_dir)
+        self.load(cache)
+        one_entry = cache.size()
+
+        cache = ParseCache(self.cache_dir, max_size=one_entry + one_entry // 2)
+        self.load(cache, _INI_TEXT.replace('"test"', '"test2"'))
+        self.assertLessEqual(cache.size(), one_entry + one_entry // 2)
+
+        # The newest entry survived, the oldest did not
+        _, parses = self.load(cache, _INI_TEXT.replace('"test"', '"test2"'))
+        self.assertEqual(0, parses)
+        _, parses = self.load(cache)
+        self.assertEqual(1, parses)
+
+
+if __name__ == '__main__':
+    unittest.main()
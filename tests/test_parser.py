@@ -11,7 +11,7 @@ except:
     from .test_utils import parse_file, get_test_ini_path
 from pathlib import Path
 
-from lark import logger
+from lark import logger, Token
 logger.setLevel(DEBUG)
 
 
@@ -25,6 +25,17 @@ class test_parser(unittest.TestCase):
         self.assertEqual(2, len(tree.children))
         self.assertEqual(22, len(tree.children[1].children))
 
+    def test_streaming(self):
+        ini_file = get_test_ini_path(Path("Test_Files") / "speeduino.ini")
+        tree = parse_file(ini_file, TsIniParser())
+        streamed_tree = parse_file(ini_file, TsIniParser(streaming=True))
+        self.assertEqual(tree, streamed_tree)
+
+        def positions(subject):
+            return [(token.line, token.column, token.start_pos)
+                    for token in subject.scan_values(lambda v: isinstance(v, Token))]
+        self.assertEqual(positions(tree), positions(streamed_tree))
+
     def test_allfiles_noexceptions(self):
         # Test all known INI files
         parser = TsIniParser(ignore_hash_error=True)
@@ -3,7 +3,10 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import unittest
+import io
+import mmap
 from ts_ini_parser import TsIniParser
+from ts_ini_parser.ts_ini_preprocessor import TsIniPreProcessor
 try:
     from test_utils import parse_file, get_test_ini_path
 except:
@@ -19,3 +22,60 @@ class test_parser(unittest.TestCase):
         ini_file = get_test_ini_path(Path("Test_Files") / "megasquirt-I_B&G_2.0-3.0.ini")
         test_func = lambda: parse_file(ini_file, parser)
         self.assertRaises(SyntaxError, test_func)
+
+    def test_hasherror_throws_streaming(self):
+        parser = TsIniParser(streaming=True)
+        parser.define('AIR_FLOW_METER', True)
+        ini_file = get_test_ini_path(Path("Test_Files") / "megasquirt-I_B&G_2.0-3.0.ini")
+        test_func = lambda: parse_file(ini_file, parser)
+        self.assertRaises(SyntaxError, test_func)
+
+    def test_stream_skips_inactive_lines(self):
+        source = io.StringIO("a = 1\n#if FOO\nb = 2\n#elif BAR\nc = 3\n#else\nd = 4\n#endif\ne = 5\n")
+        pre_processor = TsIniPreProcessor(ignore_hash_error=False)
+        pre_processor.define('BAR', True)
+        lines = [token.value for token in pre_processor.pre_process_stream(source)]
+        self.assertEqual(['a = 1\n', 'c = 3\n', 'e = 5\n'], lines)
+
+    def test_nested_hasherror(self):
+        source = "#if OUTER\n#if INNER\n#error inner\n#endif\n#endif\n"
+        pre_processor = TsIniPreProcessor(ignore_hash_error=False)
+        pre_processor.define('INNER', True)
+        # The outer block isn't selected
+        self.assertIsNotNone(pre_processor.pre_process(io.StringIO(source)))
+
+        pre_processor.define('OUTER', True)
+        with self.assertRaises(SyntaxError) as context:
+            pre_processor.pre_process(io.StringIO(source))
+        self.assertEqual(3, context.exception.lineno)
+
+    def test_input_blocks(self):
+        # Blocks of lines lex to the same tokens, at the same positions, as
+        # a line at a time: including blank line runs across block ends
+        source = "a = 1\n\n\n#if FOO\nb = 2\n#else\n  c = 3 ; comment\n#endif\n\n  \ne = 5\n" * 20
+
+        def tokens(pre_processor, source):
+            return [(token.value, token.start_pos, token.end_pos, token.line, token.column)
+                    for token in pre_processor.pre_process_stream(source)]
+
+        expected = tokens(TsIniPreProcessor(ignore_hash_error=False, block_size=0), io.StringIO(source))
+        self.assertEqual(60, len(expected))
+        for block_size in (1, 7, 64, 1024 * 1024):
+            pre_processor = TsIniPreProcessor(ignore_hash_error=False, block_size=block_size)
+            self.assertEqual(expected, tokens(pre_processor, io.StringIO(source)), block_size)
+            self.assertEqual(expected, tokens(pre_processor, source), block_size)
+            self.assertEqual(expected, tokens(pre_processor, source.replace('\n', '\r\n').encode('latin-1')),
+                             block_size)
+
+    def test_bytes_input(self):
+        ini_file = get_test_ini_path(Path("Test_Files") / "speeduino.ini")
+        parser = TsIniParser()
+        with open(ini_file, 'r', encoding='latin-1') as file:
+            expected = parser.pre_process(file)
+        self.assertEqual(expected, parser.pre_process(ini_file.read_bytes()))
+        with open(ini_file, 'rb') as file:
+            self.assertEqual(expected, parser.pre_process(file))
+        with open(ini_file, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            self.assertEqual(expected, parser.pre_process(mapped))
+            # Read from the start every time
+            self.assertEqual(expected, parser.pre_process(mapped))
@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from ts_ini_parser import *
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+_INI_TEXT = '''[MegaTune]
+#if LAMBDA
+   signature = "lambda"
+#else
+   signature = "afr"
+#endif
+#set LATE
+
+[Menu]
+#if LATE
+   late = 1
+#else
+   late = 2
+#endif
+#unset LAMBDA
+#if LAMBDA
+   pages = 1
+#else
+   pages = 2
+#endif
+
+'''
+
+
+def _lines(tree):
+    return [str(token) for token in tree.scan_values(lambda value: isinstance(value, str))]
+
+
+class test_thread_safety(unittest.TestCase):
+
+    def test_defines(self):
+        parser = TsIniParser()
+        parser.define('LAMBDA', True)
+        lambda_tree = parser.parse(io.StringIO(_INI_TEXT))
+        afr_tree = parser.parse(io.StringIO(_INI_TEXT), defines={})
+        self.assertIn('"lambda"', _lines(lambda_tree))
+        self.assertIn('"afr"', _lines(afr_tree))
+        # The file's #set & #unset don't leak into the parser
+        self.assertEqual({'LAMBDA': True}, dict(parser.symbols))
+        self.assertEqual(lambda_tree, parser.parse(io.StringIO(_INI_TEXT)))
+
+    def test_interleaved_streams(self):
+        # Two streaming preprocessor runs, advanced in turn on one thread
+        parser = TsIniParser()
+        lambda_lines = parser.pre_process_stream(io.StringIO(_INI_TEXT), {'LAMBDA': True})
+        afr_lines = parser.pre_process_stream(io.StringIO(_INI_TEXT), {})
+        lines = {'lambda': [], 'afr': []}
+        for lambda_line, afr_line in zip(lambda_lines, afr_lines):
+            lines['lambda'].append(lambda_line.strip())
+            lines['afr'].append(afr_line.strip())
+        self.assertIn('signature = "lambda"', lines['lambda'])
+        self.assertIn('signature = "afr"', lines['afr'])
+        self.assertEqual({'LATE': True}, dict(lambda_lines.symbols))
+        self.assertEqual({'LAMBDA', 'LATE'}, lambda_lines.tested_symbols)
+
+    def test_stress(self):
+        # One parser shared by a thread pool: every result must match the
+        # same parse run on its own.
+        define_sets = [{}, {'LAMBDA': True}, {'LATE': True}, {'LAMBDA': True, 'LATE': True}]
+        for streaming in (False, True):
+            parser = TsIniParser(streaming=streaming)
+            expected = [parser.parse(io.StringIO(_INI_TEXT), defines) for defines in define_sets]
+            jobs = [index % len(define_sets) for index in range(400)]
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                trees = list(pool.map(lambda index: parser.parse(io.StringIO(_INI_TEXT), define_sets[index]), jobs))
+            for index, tree in zip(jobs, trees):
+                self.assertEqual(expected[index], tree)
+
+    def test_stress_corpus(self):
+        parser = TsIniParser(ignore_hash_error=True)
+        paths = [get_test_ini_path(Path('Test_Files') / name) for name in ('speeduino.ini', 'rusefi.ini')]
+        texts = [path.read_text(encoding='latin-1') for path in paths]
+        define_sets = [{}, {'LAMBDA': True, 'ALPHA_N': True}]
+        jobs = [(text, defines) for text in texts for defines in define_sets]
+        expected = [_lines(parser.parse(io.StringIO(text), defines)) for text, defines in jobs]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda job: _lines(parser.parse(io.StringIO(job[0]), job[1])), jobs * 2))
+        self.assertEqual(expected * 2, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
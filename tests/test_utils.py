@@ -10,3 +10,20 @@ def parse_file(filepath, parser):
 
 def get_test_ini_path(relative_path):
     return THIS_DIR / relative_path
+
+
+def model_state(value):
+    """A comparable form of a model object: the model classes compare by identity"""
+    if isinstance(value, (list, tuple)):
+        return [model_state(item) for item in value]
+    if isinstance(value, dict):
+        return {key: model_state(item) for key, item in value.items()}
+    if isinstance(value, (str, int, float, type(None))):
+        return value
+    names = [name for cls in type(value).__mro__ for name in getattr(cls, '__slots__', ())]
+    names += list(getattr(value, '__dict__', {}))
+    state = {name: model_state(getattr(value, name)) for name in names
+             if not name.startswith('__') and hasattr(value, name)}
+    if hasattr(value, 'items'):
+        state['items'] = model_state(dict(value.items()))
+    return (type(value).__name__, state)
@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from ts_ini_parser import *
+try:
+    from test_utils import get_test_ini_path
+except:
+    from .test_utils import get_test_ini_path
+
+
+class test_variants(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(get_test_ini_path(Path("Test_Files") / "speeduino.ini"), 'r', encoding='latin-1') as file:
+            cls.text = file.read()
+        cls.parser = TsIniParser()
+        cls.source = VariantSource(cls.parser, io.StringIO(cls.text))
+
+    def _pre_process(self, defines):
+        parser = TsIniParser()
+        for symbol in defines:
+            parser.define(symbol, True)
+        return list(parser.pre_process_stream(io.StringIO(self.text)))
+
+    def test_lines_match_preprocessor(self):
+        for defines in [(), ('LAMBDA',), ('CELSIUS', 'COMMS_COMPAT'), ('CAN_COMMANDS',)]:
+            expected = self._pre_process(defines)
+            actual = self.source.lines(defines)
+            self.assertEqual([(line.value, line.start_pos, line.line) for line in expected],
+                             [(line.value, line.start_pos, line.line) for line in actual])
+
+    def test_variants(self):
+        lambda_file, afr_file = parse_variants(self.parser, io.StringIO(self.text), [{'LAMBDA': True}, {}])
+        self.assertEqual('Lambda', lambda_file['PcVariables']['wueAFR'].units)
+        self.assertEqual('AFR', afr_file['PcVariables']['wueAFR'].units)
+        # Sections that don't depend on LAMBDA are shared
+        self.assertIs(lambda_file['Constants'], afr_file['Constants'])
+        # Wired to the variant's own variables
+        self.assertIs(lambda_file['PcVariables']['wueAFR'],
+                      lambda_file['CurveEditor']['warmup_afr_curve'].lines[0].ybin.variable)
+        self.assertIs(afr_file['PcVariables']['wueAFR'],
+                      afr_file['CurveEditor']['warmup_afr_curve'].lines[0].ybin.variable)
+
+    def test_same_lines_deduplicated(self):
+        # CAN_COMMANDS is #unset by the file itself
+        first = self.source.parse(['LAMBDA'])
+        self.assertIs(first, self.source.parse(['LAMBDA', 'CAN_COMMANDS']))
+        self.assertIsNot(first, self.source.parse(['LAMBDA', 'CELSIUS']))
+
+    def test_matches_parse(self):
+        self.parser.define('CELSIUS', True)
+        try:
+            expected = DataClassTransformer().transform(self.parser.parse(io.StringIO(self.text)))
+        finally:
+            self.parser.undefine('CELSIUS')
+        actual = self.source.parse({'CELSIUS': True})
+        self.assertEqual(list(expected), list(actual))
+        self.assertEqual(list(expected['Constants'][1]), list(actual['Constants'][1]))
+        self.assertEqual(len(expected.file_header), len(actual.file_header))
+
+    def test_hash_error(self):
+        source = VariantSource(self.parser, io.StringIO('#if A\n#error stop\n#endif\n[Section]\nkey = value\n'))
+        self.assertEqual(2, len(source.lines({})))
+        with self.assertRaises(SyntaxError):
+            source.lines({'A': True})
+
+    def test_include(self):
+        # #include is spliced in for each variant's symbols, like parse()
+        with tempfile.TemporaryDirectory() as folder:
+            Path(folder, 'sensors.ini').write_text('#if LAMBDA\n   lambda = scalar, U08, 2, "", 1, 0\n'
+                                                   '#else\n   afr = scalar, U08, 2, "", 1, 0\n#endif\n'
+                                                   '#set FROM_INCLUDE\n')
+            text = '[OutputChannels]\n   a = scalar, U08, 0, "", 1, 0\n#include "sensors.ini"\n' \
+                   '#if FROM_INCLUDE\n   b = scalar, U08, 1, "", 1, 0\n#endif\n\n'
+            parser = TsIniParser(include_paths=[folder])
+            variants = parse_variants(parser, io.StringIO(text), [{'LAMBDA': True}, {}])
+            for variant, defines in zip(variants, [{'LAMBDA': True}, {}]):
+                expected = DataClassTransformer().transform(parser.parse(io.StringIO(text), defines))
+                self.assertEqual(list(expected['OutputChannels']), list(variant['OutputChannels']))
+            self.assertEqual(['a', 'lambda', 'b'], list(variants[0]['OutputChannels']))
+            self.assertEqual(['a', 'afr', 'b'], list(variants[1]['OutputChannels']))
+            with self.assertRaises(SyntaxError):
+                VariantSource(parser, io.StringIO(text.replace('sensors', 'missing'))).lines({})
+
+
+if __name__ == '__main__':
+    unittest.main()
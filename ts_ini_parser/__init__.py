@@ -1,3 +1,58 @@
-from .ts_ini_parser import TsIniParser
-from .dataclasses.data_class_transformer import DataClassTransformer
+from importlib import import_module
+from .version import __version__
 from .dataclasses.ts_ini_file import *
+
+# Everything else is imported on first use, so that importing the package
+# doesn't pay for Lark, multiprocessing etc. until they are needed.
+_LAZY_EXPORTS = {
+    'TsIniParser': '.ts_ini_parser',
+    'DataClassTransformer': '.dataclasses.data_class_transformer',
+    'ParseCache': '.parse_cache',
+    'parse_many': '.batch',
+    'ParseResult': '.batch',
+    'parse_lazy': '.lazy_ini_file',
+    'LazyTsIniFile': '.lazy_ini_file',
+    'SectionRange': '.lazy_ini_file',
+    'parse_incremental': '.incremental',
+    'IncrementalTsIniFile': '.incremental',
+    'parse_variants': '.variants',
+    'VariantSource': '.variants',
+    'ExpressionCompiler': '.expressions',
+    'CompiledExpression': '.expressions',
+    'computed_channels': '.expressions',
+    'evaluate_channels': '.expressions',
+    'PageCodec': '.codec',
+    'TuneCodec': '.codec',
+    'FrameDecoder': '.codec',
+    'MlgReader': '.mlg',
+    'MlgField': '.mlg',
+    'MlgMarker': '.mlg',
+    'IncludeCache': '.includes',
+    'IncludeGraph': '.includes',
+    'IncludedToken': '.includes',
+    'INCLUDE_CACHE': '.includes',
+    'ParseStats': '.instrumentation',
+    'diff_ini': '.diff',
+    'IniDiff': '.diff',
+    'IniChange': '.diff',
+    'ContentHasher': '.diff',
+    'ModelPool': '.model_pool',
+    'TableLookup': '.lookup',
+    'CurveLookup': '.lookup',
+}
+
+__all__ = [name for name in globals() if not name.startswith('_') and name != 'import_module'] \
+    + list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
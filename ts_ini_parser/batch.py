@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping, Optional, Union
+from lark import Tree
+from .ts_ini_parser import TsIniParser
+from .dataclasses.ts_ini_file import TsIniFile
+
+# One parser per worker process, built by the pool initializer so the
+# grammars are only loaded once per process.
+_WORKER_PARSER: Optional[TsIniParser] = None
+
+
+@dataclass
+class ParseResult:
+    """The outcome of parsing one file in a batch
+
+    Exactly one of result & error is set.
+    """
+    path: Path
+    result: Union[TsIniFile, Tree, None] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _make_parser(defines: Mapping, ignore_hash_error: bool, include_paths: Optional[tuple] = None) -> TsIniParser:
+    parser = TsIniParser(ignore_hash_error=ignore_hash_error, include_paths=include_paths)
+    for symbol, value in defines.items():
+        parser.define(symbol, value)
+    return parser
+
+
+def _parse_one(parser: TsIniParser, path: Path, encoding: str, transform: bool) -> ParseResult:
+    try:
+        with open(path, 'r', encoding=encoding) as file:
+            return ParseResult(path, result=parser.parse_model(file) if transform else parser.parse(file))
+    except Exception as error:  # pylint: disable=broad-except
+        return ParseResult(path, error=f'{type(error).__name__}: {error}')
+
+
+def _init_worker(defines: Mapping, ignore_hash_error: bool, include_paths: Optional[tuple]):
+    global _WORKER_PARSER  # pylint: disable=global-statement
+    _WORKER_PARSER = _make_parser(defines, ignore_hash_error, include_paths)
+
+
+def _worker_parse(path: Path, encoding: str, transform: bool) -> ParseResult:
+    return _parse_one(_WORKER_PARSER, path, encoding, transform)
+
+
+def parse_many(paths: Iterable[Union[str, Path]],
+               defines: Optional[Mapping] = None,
+               workers: Optional[int] = None,
+               ignore_hash_error: bool = False,
+               transform: bool = True,
+               encoding: str = 'latin-1',
+               include_paths: Optional[Iterable[Union[str, Path]]] = None) -> Iterator[ParseResult]:
+    # pylint: disable=too-many-arguments
+    """Parse many INI files concurrently using a process pool
+
+    Results are yielded as each file finishes (so not necessarily in the
+    order of paths). A file that fails to parse yields a ParseResult with
+    the error set rather than stopping the batch.
+
+    defines: preprocessor symbols, as passed to TsIniParser.define().
+        Applied afresh to every file.
+    workers: number of processes. Defaults to the CPU count. 1 parses
+        in the calling process.
+    transform: build the TsIniFile model (TsIniParser.parse_model), or return
+        the Lark tree.
+    include_paths: as TsIniParser. Each worker process preprocesses an
+        #include file once.
+    """
+    paths = [Path(path) for path in paths]
+    include_paths = None if include_paths is None else tuple(Path(path) for path in include_paths)
+    defines = dict(defines or {})
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+
+    if workers == 1:
+        parser = _make_parser(defines, ignore_hash_error, include_paths)
+        for path in paths:
+            yield _parse_one(parser, path, encoding, transform)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker,
+                                   initargs=(defines, ignore_hash_error, include_paths))
+    try:
+        futures = {executor.submit(_worker_parse, path, encoding, transform): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                # E.g. a worker process died
+                yield ParseResult(futures[future], error=f'{type(error).__name__}: {error}')
+    finally:
+        # Don't keep parsing if the caller stopped iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,522 @@
+from collections import ChainMap
+from collections.abc import Mapping as MappingABC
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Union
+from .dataclasses.ts_ini_file import (TsIniFile, Page, OutputChannelsSection, Variable, ScalarVariable, Array1dVariable,
+                                      Array2dVariable, BitVariable, StringVariable)
+from .expressions import ExpressionCompiler, _ChannelValues, computed_channels, expression_text
+from .optional import import_numpy
+
+# DataType.c_typename -> NumPy type code, without the byte order
+_NUMPY_TYPES = {
+    'uint8_t': 'u1',
+    'int8_t': 'i1',
+    'uint16_t': 'u2',
+    'int16_t': 'i2',
+    'uint32_t': 'u4',
+    'int32_t': 'i4',
+    'float': 'f4',
+}
+
+
+def header_value(header_lines: Iterable, name: str, default=None):
+    """The values of a header line (e.g. [Constants] pageSize), as strings
+
+    A single value is returned as is, several as a list. Returns default
+    if there is no such line.
+    """
+    for line in header_lines:
+        if getattr(line, 'name', None) == name:
+            values = [value[1] if isinstance(value, tuple) else value for value in line.values]
+            return values[0] if len(values) == 1 else values
+    return default
+
+
+def _factor(value, default: float) -> Union[float, str]:
+    # A scale or translate: a number, or the text of an {expression}
+    if value is None:
+        return default
+    expression = expression_text(value)
+    if expression is not None:
+        return expression
+    return float(value[1] if isinstance(value, tuple) else value)
+
+
+def _first(value):
+    # The value for the first block, as a plain number if a scalar
+    if isinstance(value, list):
+        return value[0]
+    value = value[0]
+    return value.item() if getattr(value, 'ndim', None) == 0 else value
+
+
+class _Field(NamedTuple):
+    """How to decode & encode one variable"""
+    name: str
+    kind: str          # 'number', 'bits' or 'string'
+    field: str         # Field of the layout dtype
+    scale: Union[float, str]
+    translate: Union[float, str]
+    start_bit: int = 0
+    mask: int = 0
+    encoding: str = 'ascii'
+
+    @property
+    def scaled(self):
+        return self.scale != 1.0 or self.translate != 0.0
+
+    @property
+    def expression(self):
+        """If the scale or translate is an {expression}"""
+        return isinstance(self.scale, str) or isinstance(self.translate, str)
+
+
+class _Layout:
+    """A fixed size block of variables at known offsets, as a NumPy structured
+    dtype
+
+    Each variable is a field of the dtype: decoding is a view of the bytes,
+    for any number of consecutive blocks. Bit fields share a field for their
+    containing integer.
+    """
+
+    def __init__(self, variables: Iterable[Variable], size: Optional[int], endianness: str,
+                 compiler: Optional[ExpressionCompiler] = None, channels: Optional[Mapping[str, str]] = None):
+        # pylint: disable=too-many-arguments,too-many-locals
+        numpy = import_numpy()
+        byte_order = '<' if endianness == 'little' else '>'
+        names, formats, offsets = [], [], []
+        self.fields: Dict[str, _Field] = {}
+        end = 0
+
+        def add_field(field, dtype, offset):
+            if field not in names:
+                names.append(field)
+                formats.append(dtype)
+                offsets.append(offset)
+
+        last_offset = None
+        for variable in variables:
+            offset = getattr(variable, 'offset', None)
+            if expression_text(offset) == 'lastOffset':
+                # Overlays the previous variable
+                offset = last_offset
+            if not isinstance(offset, int):
+                continue
+            last_offset = offset
+            if isinstance(variable, StringVariable):
+                add_field(variable.name, f'S{variable.length}', offset)
+                self.fields[variable.name] = _Field(variable.name, 'string', variable.name, 1.0, 0.0,
+                                                    encoding=variable.encoding)
+                end = max(end, offset + variable.length)
+                continue
+            dtype = byte_order + _NUMPY_TYPES[variable.data_type.c_typename]
+            if isinstance(variable, BitVariable):
+                # BitSize.bit_length is the last bit: [start:end] in the INI file
+                start = variable.bit_size.start_bit
+                width = max(variable.bit_size.bit_length - start + 1, 1)
+                width = min(width, variable.data_type.width * 8 - start)
+                # The containing integer, as a bit pattern
+                dtype = f'{byte_order}u{variable.data_type.width}'
+                field = f'bits@{offset}:{dtype}'
+                add_field(field, dtype, offset)
+                self.fields[variable.name] = _Field(variable.name, 'bits', field, 1.0, 0.0, start, (1 << width) - 1)
+            elif isinstance(variable, (ScalarVariable, Array1dVariable, Array2dVariable)):
+                if isinstance(variable, Array1dVariable):
+                    dtype = (dtype, (variable.dim1d,))
+                elif isinstance(variable, Array2dVariable):
+                    # Stored row by row: [columns x rows] in the INI file
+                    dtype = (dtype, (variable.dim2d.ysize, variable.dim2d.xsize))
+                add_field(variable.name, dtype, offset)
+                self.fields[variable.name] = _Field(variable.name, 'number', variable.name,
+                                                    _factor(variable.scale, 1.0), _factor(variable.translate, 0.0))
+            else:
+                continue
+            end = max(end, offset + variable.size)
+
+        self.size = max(size or 0, end)
+        self.dtype = numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': self.size})
+        self._compiler = compiler
+        self._channels = channels or {}
+
+    def records(self, data, count: Optional[int] = None):
+        """View bytes (bytes, bytearray, memoryview, uint8 array...) as blocks
+
+        Writable when the buffer is.
+        """
+        numpy = import_numpy()
+        if isinstance(data, numpy.ndarray):
+            data = data.reshape(-1).view(numpy.uint8)
+        available = len(memoryview(data).cast('B')) // self.size
+        if count is None:
+            count = available
+        if available < count or count == 0:
+            raise ValueError(f'Expected {count or 1} blocks of {self.size} bytes, '
+                             f'got {len(memoryview(data).cast("B"))} bytes')
+        return numpy.frombuffer(data, self.dtype, count)
+
+    def raw(self, records, name: str):
+        field = self.fields[name]
+        values = records[field.field]
+        if field.kind == 'bits':
+            return (values >> field.start_bit) & field.mask
+        if field.kind == 'string':
+            return [value.rstrip(b'\0').decode(field.encoding, errors='replace') for value in values]
+        return values
+
+    def _factors(self, field: _Field, context: Mapping, raw) -> tuple:
+        """The scale & translate, evaluating {expressions}"""
+        def evaluate(factor):
+            if not isinstance(factor, str):
+                return factor
+            factor = self._evaluate(factor, context)
+            # A value per block: line up with the block axis of arrays
+            if getattr(factor, 'ndim', 0) == 1 and raw.ndim > 1:
+                factor = factor.reshape((-1,) + (1,) * (raw.ndim - 1))
+            return factor
+
+        return evaluate(field.scale), evaluate(field.translate)
+
+    def _compile(self, expression: str):
+        if self._compiler is None:
+            self._compiler = ExpressionCompiler()
+        return self._compiler.compile(expression, vectorized=True)
+
+    def _evaluate(self, expression: str, context: Mapping):
+        return self._compile(expression)(context)
+
+    def context(self, values: Mapping, records, constants: Optional[Mapping]) -> Mapping:
+        # What {expressions} can reference: the values, the blocks, the
+        # constants & the computed channels evaluated from those
+        compiled = {name: self._compile(expression) for name, expression in self._channels.items()}
+        return _ChannelValues(ChainMap(values, _BlockValues(self, records), constants or {}), compiled)
+
+    def decode(self, records, names: Optional[Iterable[str]] = None,
+               constants: Optional[Mapping] = None) -> Dict[str, Any]:
+        """Scaled values: (raw + translate) * scale, a value per block
+
+        Unscaled numbers are views of the buffer. Scales & translates that
+        are {expressions} are evaluated with the numeric values decoded here,
+        then the constants.
+        """
+        values = {}
+        deferred = []
+        for name in (self.fields if names is None else names):
+            field = self.fields[name]
+            if field.expression:
+                deferred.append(field)
+            elif field.scaled:
+                values[name] = (self.raw(records, name) + field.translate) * field.scale
+            else:
+                values[name] = self.raw(records, name)
+        if deferred:
+            context = self.context(values, records, constants)
+            # An expression can evaluate to inf or nan (e.g. a scale of
+            # 0.1 / stoich when stoich is 0)
+            numpy = import_numpy()
+            with numpy.errstate(all='ignore'):
+                for field in deferred:
+                    raw = self.raw(records, field.name)
+                    scale, translate = self._factors(field, context, raw)
+                    values[field.name] = numpy.add(raw, translate, dtype=numpy.float64) * scale
+        return values
+
+    def encode(self, records, values: Mapping[str, Any], constants: Optional[Mapping] = None):
+        """Write scaled values into the blocks: the inverse of decode()
+
+        Numbers are rounded & clamped to the range of their type.
+        """
+        numpy = import_numpy()
+        context = None
+        for name, value in values.items():
+            field = self.fields[name]
+            target = records[field.field]
+            if field.kind == 'string':
+                target[...] = value.encode(field.encoding) if isinstance(value, str) \
+                    else [item.encode(field.encoding) for item in value]
+                continue
+            if not field.scaled and target.dtype.kind == 'f':
+                # As is: no round trip through float64
+                target[...] = value
+                continue
+            scale, translate = field.scale, field.translate
+            if field.expression:
+                if context is None:
+                    context = self.context(values, records, constants)
+                scale, translate = self._factors(field, context, target)
+            with numpy.errstate(all='ignore'):
+                raw = numpy.asarray(value, dtype=numpy.float64) / scale - translate
+                if target.dtype.kind != 'f':
+                    info = numpy.iinfo(target.dtype)
+                    raw = numpy.clip(numpy.rint(raw), info.min, info.max).astype(target.dtype)
+            if field.kind == 'bits':
+                mask = target.dtype.type(field.mask << field.start_bit)
+                raw = (target & ~mask) | ((raw << field.start_bit) & mask)
+            target[...] = raw
+
+
+class _BlockValues(MappingABC):
+    """The values of the blocks' numbers with constant scales, decoded on
+    access: what scales & translates that are {expressions} can reference"""
+
+    def __init__(self, layout: _Layout, records):
+        self._layout = layout
+        self._records = records
+
+    def __getitem__(self, name):
+        field = self._layout.fields[name]
+        if field.expression or field.kind == 'string':
+            raise KeyError(name)
+        raw = self._layout.raw(self._records, name)
+        return (raw + field.translate) * field.scale if field.scaled else raw
+
+    def __iter__(self):
+        return iter(self._layout.fields)
+
+    def __len__(self):
+        return len(self._layout.fields)
+
+
+class PageCodec:
+    """Decodes & encodes the raw bytes of a [Constants] page
+
+    The page layout is compiled once into a NumPy structured dtype, so
+    decoding is a view of the bytes. E.g.
+        codec = PageCodec(ini_file['Constants'][2], endianness='little')
+        ve_table = codec.decode(page_bytes)['veTable']   # 2D array
+
+    decode_many() decodes any number of concatenated pages (e.g. the same
+    page from thousands of stored tunes) in one call.
+    """
+
+    def __init__(self, page: Page, size: Optional[int] = None, endianness: str = 'big',
+                 compiler: Optional[ExpressionCompiler] = None, channels: Optional[Mapping[str, str]] = None):
+        """
+        page: the page's variables
+        size: the page size (header pageSize). Defaults to the end of the last
+            variable.
+        endianness: 'big' or 'little' (header endianness)
+        compiler: compiles scales & translates that are {expressions}
+        channels: computed channel expressions those can reference (see
+            computed_channels())
+        """
+        # pylint: disable=too-many-arguments
+        self.page_num = page.page_num
+        self._layout = _Layout(page.values(), size, endianness, compiler, channels)
+
+    @property
+    def size(self) -> int:
+        """Bytes per page"""
+        return self._layout.size
+
+    @property
+    def dtype(self):
+        """The page layout, as a NumPy structured dtype"""
+        return self._layout.dtype
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._layout.fields)
+
+    @property
+    def expression_scaled(self) -> List[str]:
+        """The variables whose scale or translate is an {expression}"""
+        return [name for name, field in self._layout.fields.items() if field.expression]
+
+    def raw(self, data) -> Dict[str, Any]:
+        """The unscaled values: views of data for arrays"""
+        records = self._layout.records(data, 1)
+        return {name: _first(self._layout.raw(records, name)) for name in self._layout.fields}
+
+    def decode(self, data, constants: Optional[Mapping] = None,
+               names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """The scaled values of a page: {name: value}
+
+        Scalars are numbers, arrays NumPy arrays (views of data when
+        unscaled) & strings str. Bit fields decode to the index of their
+        option.
+        constants: values of other constants, for scales that are
+            expressions referencing them
+        names: only decode these variables
+        """
+        records = self._layout.records(data, 1)
+        return {name: _first(value) for name, value in self._layout.decode(records, names, constants).items()}
+
+    def decode_many(self, data, constants: Optional[Mapping] = None,
+                    names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Decode concatenated pages (see decode()): {name: column}, with a
+        leading axis for the page
+
+        Strings decode to a list. Constants can be columns too.
+        """
+        return self._layout.decode(self._layout.records(data), names, constants)
+
+    def encode(self, values: Mapping[str, Any], data=None, constants: Optional[Mapping] = None):
+        """Write scaled values (see decode()) into page bytes
+
+        data: the page(s) to update, in place if writable. Defaults to a page
+            of zeros. Variables that aren't in values are unchanged.
+        Returns the updated buffer.
+        """
+        if data is None:
+            data = bytearray(self.size)
+        elif isinstance(data, bytes) or (isinstance(data, memoryview) and data.readonly):
+            data = bytearray(data)
+        self._layout.encode(self._layout.records(data), values, constants)
+        return data
+
+
+class TuneCodec:
+    """A PageCodec for every [Constants] page of an INI file
+
+    Page sizes & byte order come from the [Constants] header. Scales that
+    are expressions can reference constants on any page & the computed
+    [OutputChannels] (e.g. a units conversion factor).
+    """
+
+    def __init__(self, ini_file: TsIniFile, compiler: Optional[ExpressionCompiler] = None):
+        constants = ini_file['Constants']
+        endianness = header_value(constants.constant_header_lines, 'endianness', 'big')
+        sizes = header_value(constants.constant_header_lines, 'pageSize', [])
+        if not isinstance(sizes, list):
+            sizes = [sizes]
+        compiler = compiler or ExpressionCompiler()
+        channels = computed_channels(ini_file)
+        self.pages: Dict[int, PageCodec] = {}
+        for index, page in enumerate(constants.values()):
+            size = int(sizes[index]) if index < len(sizes) else None
+            self.pages[page.page_num] = PageCodec(page, size, endianness, compiler, channels)
+
+    def __getitem__(self, page_num: int) -> PageCodec:
+        return self.pages[page_num]
+
+    def decode(self, pages: Mapping[int, Any], constants: Optional[Mapping] = None) -> Dict[str, Any]:
+        """Decode a tune: {page number: page bytes} -> {name: value}
+
+        constants: values the tune doesn't hold that scales can reference,
+            e.g. [PcVariables]
+        """
+        return self._decode(pages, constants, PageCodec.decode)
+
+    def decode_many(self, pages: Mapping[int, Any], constants: Optional[Mapping] = None) -> Dict[str, Any]:
+        """Decode many tunes in one go: {page number: that page of every
+        tune, concatenated} -> {name: column}"""
+        return self._decode(pages, constants, PageCodec.decode_many)
+
+    def _decode(self, pages: Mapping[int, Any], constants: Optional[Mapping], decode) -> Dict[str, Any]:
+        values = {}
+        deferred = []
+        for page_num, data in pages.items():
+            codec = self.pages[page_num]
+            scaled_by_expression = codec.expression_scaled
+            values.update(decode(codec, data, names=[name for name in codec.names
+                                                     if name not in scaled_by_expression]))
+            if scaled_by_expression:
+                deferred.append((codec, data, scaled_by_expression))
+
+        # Now every constant scale value is known
+        context = ChainMap(values, constants or {})
+        for codec, data, names in deferred:
+            values.update(decode(codec, data, context, names))
+        return values
+
+    def encode(self, values: Mapping[str, Any], pages: Mapping[int, Any],
+               constants: Optional[Mapping] = None) -> Dict[int, Any]:
+        """Write scaled values into a tune's pages: the inverse of decode()
+
+        pages: {page number: page bytes}, updated in place where writable
+        Returns {page number: updated buffer}
+        """
+        context = ChainMap(values, self.decode(pages, constants), constants or {})
+        updated = dict(pages)
+        for page_num, codec in self.pages.items():
+            page_values = {name: values[name] for name in codec.names if name in values}
+            if page_values:
+                updated[page_num] = codec.encode(page_values, pages[page_num], context)
+        return updated
+
+
+class FrameDecoder:
+    """Decodes realtime data frames: the [OutputChannels] block (ochBlockSize
+    bytes, as returned by ochGetCommand)
+
+    The channel list is compiled once into a NumPy structured dtype plus
+    bit field masks, so N concatenated frames (e.g. a capture at 100Hz)
+    decode to a column per channel in one vectorized call:
+        decoder = FrameDecoder(ini_file)
+        columns = decoder.decode_many(frames, names=['rpm', 'coolant'])
+
+    Computed channels (name = { expression }) are evaluated over the
+    columns they need.
+    """
+
+    def __init__(self, ini_file: TsIniFile, compiler: Optional[ExpressionCompiler] = None,
+                 size: Optional[int] = None):
+        """
+        compiler: compiles the computed channels & scales that are
+            {expressions}
+        size: bytes per frame. Defaults to ochBlockSize, or the end of the
+            last channel.
+        """
+        channels: OutputChannelsSection = ini_file['OutputChannels']
+        if size is None:
+            block_size = header_value(channels.outputchannel_header_lines, 'ochBlockSize')
+            size = int(block_size) if block_size is not None else None
+        endianness = 'big'
+        if 'Constants' in ini_file:
+            endianness = header_value(ini_file['Constants'].constant_header_lines, 'endianness', endianness)
+        self._computed = computed_channels(ini_file)
+        self._layout = _Layout(channels.values(), size, endianness, compiler or ExpressionCompiler(), self._computed)
+
+    @property
+    def size(self) -> int:
+        """Bytes per frame"""
+        return self._layout.size
+
+    @property
+    def dtype(self):
+        """The frame layout, as a NumPy structured dtype"""
+        return self._layout.dtype
+
+    @property
+    def names(self) -> List[str]:
+        """The channels in the frame"""
+        return list(self._layout.fields)
+
+    @property
+    def computed_names(self) -> List[str]:
+        """The computed channels"""
+        return list(self._computed)
+
+    def decode(self, data, names: Optional[Iterable[str]] = None,
+               constants: Optional[Mapping] = None) -> Dict[str, Any]:
+        """Decode a single frame: {name: value}"""
+        return {name: _first(value)
+                for name, value in self._decode(self._layout.records(data, 1), names, constants).items()}
+
+    def decode_many(self, data, names: Optional[Iterable[str]] = None,
+                    constants: Optional[Mapping] = None) -> Dict[str, Any]:
+        """Decode concatenated frames: {name: column}, a value per frame
+
+        names: the channels to decode, computed or not. Defaults to the
+            channels in the frame.
+        constants: values that computed channels & scales reference that
+            aren't channels, e.g. [Constants] (see TuneCodec.decode())
+        """
+        return self._decode(self._layout.records(data), names, constants)
+
+    def _decode(self, records, names: Optional[Iterable[str]], constants: Optional[Mapping]) -> Dict[str, Any]:
+        if names is None:
+            return self._layout.decode(records, constants=constants)
+        names = list(names)
+        in_frame = [name for name in names if name in self._layout.fields]
+        values = self._layout.decode(records, in_frame, constants)
+        computed = [name for name in names if name not in self._layout.fields]
+        if computed:
+            context = self._layout.context(values, records, constants)
+            numpy = import_numpy()
+            with numpy.errstate(all='ignore'):
+                for name in computed:
+                    if name not in self._computed:
+                        raise KeyError(name)
+                    values[name] = context[name]
+        return {name: values[name] for name in names}
@@ -1,20 +1,54 @@
 
+import time
+from typing import Optional
 from lark.visitors import Transformer, Discard, v_args
 from .type_factory import dataclass_factory
+from .ts_ini_file import Axis, AxisBin, BitSize, Curve, KeyValuePair, MatrixDimensions, Page, Table, Variable
+from ..instrumentation import ParseStats
+from ..model_pool import ModelPool
 
 
 class DataClassTransformer(Transformer):
 
-    def __init__(self):
+    def __init__(self, stats: Optional[ParseStats] = None, pool: Optional[ModelPool] = None):
+        """
+        stats: record the rule calls & time (the 'transform' stage) and the
+            #define expansions in this ParseStats. Off by default.
+        pool: share strings, value objects & identical pages with the other
+            files transformed with this ModelPool. Off by default.
+        """
         super().__init__()
         self._factory = dataclass_factory
         self._symbols = {}
+        self._stats = stats
+        self._pool = pool
+
+    def transform(self, tree):
+        if self._stats is not None and '_call_userfunc' not in vars(self):
+            # Shadow the method for this instance only
+            self._call_userfunc = self._timed_userfunc(self._stats.stage('transform'))
+        return super().transform(tree)
+
+    def _timed_userfunc(self, stage):
+        call_userfunc = super()._call_userfunc
+        clock = time.perf_counter
+
+        def timed_userfunc(tree, new_children=None):
+            # The children are already transformed: this is the rule's own time
+            start = clock()
+            try:
+                return call_userfunc(tree, new_children)
+            finally:
+                stage.record(str(tree.data), clock() - start)
+        return timed_userfunc
 
     # ================== Generic rule processing =====================
 
     # Hoist all tokens into their parent node
     def __default_token__(self, token):
         if isinstance(token.value, str):
+            if self._pool is not None:
+                return self._pool.string(token.value.strip('"'))
             return token.value.strip('"')
         return token.value
 
@@ -116,6 +150,8 @@ class DataClassTransformer(Transformer):
     xsize = hoist_only_child
     ysize = hoist_only_child
     curve_gauge = hoist_only_child
+    encoding = hoist_only_child
+    length = hoist_only_child
 
     @staticmethod
     def to_child(children):
@@ -140,7 +176,18 @@ class DataClassTransformer(Transformer):
         return (data, children)
 
     def _to_type(self, data, children):
-        return self._factory(data, children)
+        if self._pool is None:
+            return self._factory(data, children)
+        return self._pooled(self._factory(data, children))
+
+    def _pooled(self, value):
+        if isinstance(value, Page):
+            return self._pool.page(value)
+        if isinstance(value, (BitSize, MatrixDimensions, Axis)):
+            return self._pool.value(value)
+        if isinstance(value, (Variable, KeyValuePair, Table, Curve, AxisBin)):
+            return self._pool.fields(value)
+        return value
 
     # ================== #define, $symbol handling =====================
 
@@ -175,6 +222,8 @@ class DataClassTransformer(Transformer):
 
             for child in children:
                 if is_variable_ref(child):
+                    if self._stats is not None:
+                        self._stats.define_expansions[child[1]] += 1
                     # Need to use yield from in case the variable contains multiple
                     # entries. We don't want a list in place of the variable, we want
                     # the list items inline. E.g.
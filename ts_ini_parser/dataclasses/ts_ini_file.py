@@ -1,9 +1,46 @@
-from dataclasses import InitVar, dataclass, field
+from dataclasses import InitVar, dataclass, field, fields
 from abc import abstractmethod
-from typing import Dict, Any, Iterable, List, Mapping, Optional
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Tuple
 from collections import UserDict, UserList
 
 
+def _slotted(cls):
+    """Give a dataclass __slots__ instead of a per-instance __dict__
+
+    A single INI file produces tens of thousands of model objects, so this
+    matters. Same as @dataclass(slots=True), which needs Python 3.10.
+
+    Each class only declares the slots its bases don't have. Mixins that
+    are combined with another slotted base must be declared with empty
+    __slots__ (see _ScalarCore), otherwise the instance layouts conflict.
+    Slotted classes can't use the zero argument form of super().
+    """
+    inherited = {slot for base in cls.__mro__[1:] for slot in getattr(base, '__slots__', ())}
+    cls_dict = dict(cls.__dict__)
+    if '__slots__' not in cls_dict:
+        slots = tuple(item.name for item in fields(cls) if item.name not in inherited)
+        cls_dict['__slots__'] = slots
+        # Field defaults are class attributes, which would clash with the slots.
+        # The dataclass __init__ has its own copy.
+        for name in slots:
+            cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+_SLOT_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+def _slot_names(cls: type) -> Tuple[str, ...]:
+    """The field names of a _slotted class (its own & its bases'), base first"""
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = _SLOT_NAMES[cls] = tuple(name for klass in reversed(cls.__mro__)
+                                         for name in getattr(klass, '__slots__', ()) if not name.startswith('__'))
+    return names
+
+
 @dataclass(eq=False)
 class _DictBase(UserDict):
     dict_data: InitVar[Mapping]
@@ -35,6 +72,7 @@ class Section(_SectionBase, UserList):
         UserList.__init__(self, lines)
 
 
+@_slotted
 @dataclass(eq=False)
 class KeyValuePair():
     name: str
@@ -45,6 +83,7 @@ class KeyValuePair():
         return self.name
 
 
+@_slotted
 @dataclass(eq=False)
 class Variable:
     name: str
@@ -54,6 +93,7 @@ class Variable:
         return self.name
 
 
+@_slotted
 @dataclass
 class DataType:
     type_name: str
@@ -72,6 +112,7 @@ _data_types = {
 }
 
 
+@_slotted
 @dataclass(eq=False)
 class _TypedVariable(Variable):
     type_name: InitVar[str]
@@ -86,12 +127,14 @@ class _TypedVariable(Variable):
         """Size of the variable in bytes"""
 
 
+@_slotted
 @dataclass(eq=False)
 class BitSize:
     start_bit: int
     bit_length: int
 
 
+@_slotted
 @dataclass(eq=False)
 class BitVariable(_TypedVariable):
     bit_size: BitSize
@@ -103,9 +146,12 @@ class BitVariable(_TypedVariable):
         return self.data_type.width
 
 
+@_slotted
 @dataclass(eq=False)
 class _ScalarCore:
     # pylint: disable=too-many-instance-attributes
+    # A mixin: the classes using it declare the slots
+    __slots__ = ()
     units: Optional[str] = None
     scale: Optional[float] = None
     translate: Optional[float] = None
@@ -116,6 +162,7 @@ class _ScalarCore:
     unknown_values: Optional[List[Any]] = None
 
 
+@_slotted
 @dataclass(eq=False)
 class ScalarVariable(_ScalarCore, _TypedVariable):
 
@@ -124,6 +171,7 @@ class ScalarVariable(_ScalarCore, _TypedVariable):
         return self.data_type.width
 
 
+@_slotted
 @dataclass(eq=False)
 class _Array1dCore(_TypedVariable):
     dim1d: int
@@ -133,17 +181,20 @@ class _Array1dCore(_TypedVariable):
         return self.dim1d * self.data_type.width
 
 
+@_slotted
 @dataclass(eq=False)
 class Array1dVariable(_ScalarCore, _Array1dCore):
     pass
 
 
+@_slotted
 @dataclass(eq=False)
 class MatrixDimensions:
     xsize: int
     ysize: int
 
 
+@_slotted
 @dataclass(eq=False)
 class _Array2dCore(_TypedVariable):
     dim2d: MatrixDimensions
@@ -153,11 +204,13 @@ class _Array2dCore(_TypedVariable):
         return self.dim2d.xsize * self.dim2d.ysize * self.data_type.width
 
 
+@_slotted
 @dataclass(eq=False)
 class Array2dVariable(_ScalarCore, _Array2dCore):
     pass
 
 
+@_slotted
 @dataclass(eq=False)
 class StringVariable(Variable):
     length: int
@@ -189,12 +242,14 @@ class OutputChannelsSection(DictSection[Variable]):
     outputchannel_header_lines: list
 
 
+@_slotted
 @dataclass(eq=False)
 class AxisBin:
     variable: str
     outputchannel_ref: Optional[str] = None
 
 
+@_slotted
 @dataclass(eq=False)
 class Table:
     # pylint: disable=too-many-instance-attributes
@@ -217,6 +272,7 @@ class Table:
         return self.table_id
 
 
+@_slotted
 @dataclass
 class Axis:
     min: int
@@ -224,6 +280,7 @@ class Axis:
     step: int
 
 
+@_slotted
 @dataclass(eq=False)
 class CurveLine:
     xbin: AxisBin
@@ -234,6 +291,7 @@ class CurveLine:
     yaxis: Axis
 
 
+@_slotted
 @dataclass(eq=False)
 class Curve:
     # pylint: disable=too-many-instance-attributes
@@ -284,41 +342,98 @@ class Curve:
                                         yaxis=composite[5]))
 
 
+# The sections TsIniFile.lookup() & find() search, in priority order
+_INDEXED_SECTIONS = ('Constants', 'PcVariables', 'OutputChannels')
+# The sections table & curve bin variables are found in
+_VARIABLE_SECTIONS = ('Constants', 'PcVariables')
+
+
 @dataclass(eq=False)
 class TsIniFile(_DictBase[_SectionBase]):
     file_header: List
 
+    # {section name: (section, {entry name: [entries]})}, built on first use.
+    # See _section_index()
+    _indexes = None
+
     def __post_init__(self, dict_data: Dict[Any, _SectionBase]):
         super().__post_init__(dict_data)
         self._wire_constants()
 
-    def _wire_constants(self):
-        if 'TableEditor' in self:
-            for table in self['TableEditor'].values():
-                self._wire_table(table)
-        if 'CurveEditor' in self:
-            for curve in self['CurveEditor'].values():
-                self._wire_curve(curve)
-
-    def _find_constant_nothrow(self, name, expected_type):
-        for page in self['Constants'].values():
-            constant = page.get(name)
-            if constant and isinstance(constant, expected_type):
-                return constant
+    def __getstate__(self):
+        # The indexes are quicker to rebuild than to pickle
+        state = dict(self.__dict__)
+        state.pop('_indexes', None)
+        return state
+
+    def lookup(self, name: str):
+        """The Constants, PcVariables or OutputChannels entry with the name
+
+        Constants (in page order) take priority over PcVariables, which take
+        priority over OutputChannels. Raises KeyError if there is no such
+        entry.
+        """
+        for section in _INDEXED_SECTIONS:
+            entries = self._section_index(section).get(name)
+            if entries:
+                return entries[0]
+        raise KeyError(name)
+
+    def find(self, name: str, expected_type: type = object):
+        """Like lookup(), but only matches entries of the expected type
+
+        Returns None if there is no such entry.
+        """
+        return self._find(name, expected_type, _INDEXED_SECTIONS)
+
+    def reindex(self):
+        """Rebuild the indexes lookup() & find() use
+
+        Only needed after changing the entries of an indexed section (e.g.
+        adding a variable to a page). Replacing a section is detected.
+        """
+        self._indexes = None
+
+    def _find(self, name, expected_type, sections):
+        for section in sections:
+            for entry in self._section_index(section).get(name, ()):
+                if isinstance(entry, expected_type):
+                    return entry
         return None
 
-    def _find_pcvariable_nothrow(self, name, expected_type):
-        if 'PcVariables' in self:
-            variable = self['PcVariables'].get(name)
-            return variable if isinstance(variable, expected_type) else None
-        return None
+    def _section_index(self, name):
+        # Indexed one section at a time, so a lookup only needs the sections
+        # it searches (see LazyTsIniFile)
+        if name not in self:
+            return {}
+        section = self[name]
+        if self._indexes is None:
+            self._indexes = {}
+        indexed, index = self._indexes.get(name, (None, None))
+        if indexed is not section:
+            entries = (entry for page in section.values() for entry in page.values()) \
+                if name == 'Constants' else section.values()
+            index = {}
+            for entry in entries:
+                index.setdefault(entry.name, []).append(entry)
+            self._indexes[name] = (section, index)
+        return index
+
+    def _wire_constants(self):
+        for name in ('TableEditor', 'CurveEditor'):
+            if name in self:
+                self._wire_section(self[name])
 
-    def _find_named_variable_nothrow(self, name, expected_type):
-        constant = self._find_constant_nothrow(name, expected_type)
-        return constant if constant else self._find_pcvariable_nothrow(name, expected_type)
+    def _wire_section(self, section: _SectionBase):
+        if section.name == 'TableEditor':
+            for table in section.values():
+                self._wire_table(table)
+        elif section.name == 'CurveEditor':
+            for curve in section.values():
+                self._wire_curve(curve)
 
     def _find_named_variable(self, name, expected_type):
-        constant = self._find_named_variable_nothrow(name, expected_type)
+        constant = self._find(name, expected_type, _VARIABLE_SECTIONS)
         if not constant:
             raise KeyError(name)
         return constant
@@ -326,8 +441,12 @@ class TsIniFile(_DictBase[_SectionBase]):
     def _set_bin_variable(self, bin_field: AxisBin, var_type: type):
         if isinstance(bin_field.variable, str):
             bin_field.variable = self._find_named_variable(bin_field.variable, var_type)  # noqa: E501
-        # TODO
-        # Wire in output channel (once the OutputChannels section is properly parsed)
+        if isinstance(bin_field.outputchannel_ref, str):
+            # Not every INI file defines every channel it references: leave
+            # those as the name
+            channel = self._find(bin_field.outputchannel_ref, object, ('OutputChannels',))
+            if channel is not None:
+                bin_field.outputchannel_ref = channel
 
     def _wire_curve(self, curve: Curve):
         def wire_curve_bin(line: CurveLine):
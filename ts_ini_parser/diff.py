@@ -0,0 +1,371 @@
+import hashlib
+from collections import UserList
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from .dataclasses.ts_ini_file import (TsIniFile, Page, ConstantsSection, OutputChannelsSection, DictSection,
+                                      Variable, DataType, _data_types, _slot_names)
+
+# The sections variables can move between (a page of Constants counts as
+# its own location)
+_VARIABLE_SECTIONS = ('Constants', 'PcVariables')
+# Fields whose change alters a variable's type or layout
+_TYPE_FIELDS = frozenset(('type', 'data_type', 'dim1d', 'dim2d', 'bit_size', 'length', 'encoding'))
+_SCALE_FIELDS = frozenset(('scale', 'translate'))
+# F32's DataType.type_name is U08: name data types by what they are
+_TYPE_NAMES = {(data_type.c_typename, data_type.width): name for name, data_type in _data_types.items()}
+# The types _plain() returns as they are
+_ATOMS = frozenset((str, int, float, bool, type(None)))
+
+
+def _plain(value) -> Any:
+    # pylint: disable=too-many-return-statements
+    # A hashable, comparable form of a field value. References to
+    # variables (e.g. table bins) are reduced to the variable's name &
+    # numbers to the number (not the ('number_field', 1.0) pair).
+    cls = type(value)
+    if cls in _ATOMS:
+        return value
+    if cls is list or cls is tuple:
+        if len(value) == 2 and value[0] == 'number_field':
+            return value[1]
+        # Mostly lists of strings & numbers
+        for item in value:
+            if type(item) not in _ATOMS:
+                return tuple(_plain(item) for item in value)
+        return tuple(value)
+    if isinstance(value, str):
+        # e.g. a lark Token
+        return str(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_plain(item) for item in value)
+    if isinstance(value, Variable):
+        return value.name
+    if isinstance(value, DataType):
+        return _TYPE_NAMES.get((value.c_typename, value.width), value.type_name)
+    names = _slot_names(type(value))
+    if names:
+        return (type(value).__name__,) + tuple(_plain(getattr(value, name, None)) for name in names)
+    if isinstance(value, Mapping):
+        return tuple((key, _plain(item)) for key, item in value.items())
+    return value
+
+
+def entry_fields(entry) -> Dict[str, Any]:
+    """The comparable fields of a section entry (a variable, table etc.)
+
+    'type' is the model class name. Values are plain: tuples rather
+    than lists, data type names (e.g. 'S16') & variable names rather
+    than model objects.
+    """
+    names = _slot_names(type(entry))
+    if not names:
+        return {'value': _plain(entry)}
+    fields = {'type': type(entry).__name__}
+    for name in names:
+        fields[name] = _plain(getattr(entry, name, None))
+    return fields
+
+
+def _digest(value) -> bytes:
+    # repr() of a _plain() value is canonical: equal digests mean equal
+    # content (unlike hash(): hash(-1) == hash(-2))
+    return hashlib.blake2b(repr(value).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class ContentHasher:
+    """Content digests of TsIniFile objects, computed bottom up
+
+    A file's digest combines its sections', a section's its pages' or
+    entries' & so on, so two equal digests mean identical subtrees.
+    Digests are remembered per object: reuse a hasher to diff one file
+    against several others without hashing it again. Don't change the
+    models in between.
+    """
+
+    def __init__(self):
+        # {id: (object, digest)}: holding the object keeps the id unique
+        self._digests: Dict[int, Tuple[Any, bytes]] = {}
+
+    def __call__(self, value) -> bytes:
+        if isinstance(value, (str, tuple)):
+            return _digest(_plain(value))
+        cached = self._digests.get(id(value))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        digest = _digest(self._content(value))
+        self._digests[id(value)] = (value, digest)
+        return digest
+
+    def _content(self, value) -> Any:
+        # pylint: disable=too-many-return-statements
+        # The value in plain form, with the digests of its parts
+        names = _slot_names(type(value))
+        if names:
+            # An entry: the commonest case
+            return (type(value).__name__,) + tuple(_plain(getattr(value, name, None)) for name in names)
+        if isinstance(value, TsIniFile):
+            return ('TsIniFile', _plain(value.file_header),
+                    tuple((name, self(section)) for name, section in value.items()))
+        if isinstance(value, Page):
+            return ('Page', value.page_num, self._items(value))
+        if isinstance(value, ConstantsSection):
+            return (value.name, _plain(value.constant_header_lines), self._items(value))
+        if isinstance(value, OutputChannelsSection):
+            return (value.name, _plain(value.outputchannel_header_lines), self._items(value))
+        if isinstance(value, DictSection):
+            return (value.name, self._items(value))
+        if isinstance(value, (list, UserList)):
+            return (getattr(value, 'name', None), tuple(self(item) for item in value))
+        return _plain(value)
+
+    def _items(self, mapping: Mapping) -> tuple:
+        return tuple((key, self(item)) for key, item in mapping.items())
+
+    def clear(self):
+        self._digests.clear()
+
+
+@dataclass
+class IniChange:
+    """One added, removed, moved or changed section entry
+
+    kind: 'added', 'removed', 'moved' (to another Constants page or
+        between Constants & PcVariables) or 'changed'
+    section: the entry's section (the new one, if moved)
+    name: the entry's key: variable name, table id etc. Entries of list
+        sections (e.g. Menu) that have no name are named by their value.
+    old, new: the entry in each file (None if added/removed)
+    fields: {field: (old value, new value)} for each changed field (see
+        entry_fields). A move adds 'page' or 'section'.
+    """
+    kind: str
+    section: str
+    name: str
+    old: Any = None
+    new: Any = None
+    fields: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+
+    def __str__(self):
+        marker = {'added': '+', 'removed': '-', 'moved': '>', 'changed': '~'}[self.kind]
+        details = ', '.join(f'{name}: {old!r} -> {new!r}' for name, (old, new) in self.fields.items())
+        return f'{marker} [{self.section}] {self.name}' + (f' ({details})' if details else '')
+
+
+@dataclass
+class IniDiff:
+    """The differences between two TsIniFile objects (see diff_ini)"""
+    changes: List[IniChange] = field(default_factory=list)
+    added_sections: List[str] = field(default_factory=list)
+    removed_sections: List[str] = field(default_factory=list)
+    # The sections in both files whose content differs
+    changed_sections: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.changes or self.added_sections or self.removed_sections or self.changed_sections)
+
+    def __str__(self):
+        lines = [f'+ [{name}]' for name in self.added_sections] + [f'- [{name}]' for name in self.removed_sections]
+        return '\n'.join(lines + [str(change) for change in self.changes])
+
+    def of_kind(self, kind: str) -> List[IniChange]:
+        return [change for change in self.changes if change.kind == kind]
+
+    @property
+    def added(self) -> List[IniChange]:
+        return self.of_kind('added')
+
+    @property
+    def removed(self) -> List[IniChange]:
+        return self.of_kind('removed')
+
+    @property
+    def moved(self) -> List[IniChange]:
+        return self.of_kind('moved')
+
+    @property
+    def changed(self) -> List[IniChange]:
+        return self.of_kind('changed')
+
+    def section(self, name: str) -> List[IniChange]:
+        return [change for change in self.changes if change.section == name]
+
+    @property
+    def offset_shifts(self) -> Dict[Tuple[str, str], int]:
+        """{(section, name): new offset - old offset} of the variables whose offset changed"""
+        shifts = {}
+        for change in self.changes:
+            old, new = change.fields.get('offset', (None, None))
+            if isinstance(old, int) and isinstance(new, int):
+                shifts[(change.section, change.name)] = new - old
+        return shifts
+
+    @property
+    def type_changes(self) -> List[IniChange]:
+        """Changes of type, data type or shape (dimensions, bits, length)"""
+        return [change for change in self.changes if _TYPE_FIELDS.intersection(change.fields)]
+
+    @property
+    def scale_changes(self) -> List[IniChange]:
+        """Changes of scale or translate"""
+        return [change for change in self.changes if _SCALE_FIELDS.intersection(change.fields)]
+
+
+def _changed_fields(old, new) -> Dict[str, Tuple[Any, Any]]:
+    old_fields = entry_fields(old)
+    new_fields = entry_fields(new)
+    return {name: (old_fields.get(name), new_fields.get(name))
+            for name in dict.fromkeys(list(old_fields) + list(new_fields))
+            if old_fields.get(name) != new_fields.get(name)}
+
+
+def _entry_name(entry) -> str:
+    key = getattr(entry, 'key', None)
+    if key is not None:
+        return str(key)
+    return str(_plain(entry))
+
+
+def _header_lines(section) -> list:
+    if isinstance(section, ConstantsSection):
+        return section.constant_header_lines
+    if isinstance(section, OutputChannelsSection):
+        return section.outputchannel_header_lines
+    return []
+
+
+def _variable_locations(ini_file: TsIniFile) -> Dict[tuple, Mapping]:
+    # {(section, page number or None): {name: variable}}
+    locations = {}
+    if 'Constants' in ini_file:
+        for page in ini_file['Constants'].values():
+            locations[('Constants', page.page_num)] = page
+    if 'PcVariables' in ini_file:
+        locations[('PcVariables', None)] = ini_file['PcVariables']
+    return locations
+
+
+def _diff_variables(old: TsIniFile, new: TsIniFile, hasher: ContentHasher, diff: IniDiff):
+    # pylint: disable=too-many-locals
+    old_locations = _variable_locations(old)
+    new_locations = _variable_locations(new)
+    # Identical pages can't hold a changed or moved variable
+    same = {location for location, entries in old_locations.items()
+            if location in new_locations and hasher(entries) == hasher(new_locations[location])}
+
+    def index(locations) -> Dict[str, tuple]:
+        found = {}
+        for location, entries in locations.items():
+            if location not in same:
+                for name, entry in entries.items():
+                    found.setdefault(name, (location, entry))
+        return found
+
+    old_index = index(old_locations)
+    new_index = index(new_locations)
+    for name, (location, entry) in old_index.items():
+        if name not in new_index:
+            diff.changes.append(IniChange('removed', location[0], name, old=entry))
+    for name, (location, entry) in new_index.items():
+        if name not in old_index:
+            diff.changes.append(IniChange('added', location[0], name, new=entry))
+            continue
+        old_location, old_entry = old_index[name]
+        if old_location == location and hasher(old_entry) == hasher(entry):
+            continue
+        fields = _changed_fields(old_entry, entry)
+        if old_location == location:
+            diff.changes.append(IniChange('changed', location[0], name, old_entry, entry, fields))
+            continue
+        if old_location[0] == location[0]:
+            fields['page'] = (old_location[1], location[1])
+        else:
+            fields['section'] = (old_location[0], location[0])
+        diff.changes.append(IniChange('moved', location[0], name, old_entry, entry, fields))
+
+
+def _diff_keyed(name: str, old: Mapping, new: Mapping, hasher: ContentHasher, diff: IniDiff):
+    for key, entry in old.items():
+        if key not in new:
+            diff.changes.append(IniChange('removed', name, str(key), old=entry))
+    for key, entry in new.items():
+        if key not in old:
+            diff.changes.append(IniChange('added', name, str(key), new=entry))
+        elif hasher(old[key]) != hasher(entry):
+            diff.changes.append(IniChange('changed', name, str(key), old[key], entry,
+                                          _changed_fields(old[key], entry)))
+
+
+def _common_ends(old: List[bytes], new: List[bytes]) -> Tuple[int, int]:
+    # The lengths of the common head & tail
+    shortest = min(len(old), len(new))
+    head = 0
+    while head < shortest and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < shortest - head and old[-tail - 1] == new[-tail - 1]:
+        tail += 1
+    return head, tail
+
+
+def _diff_sequence(name: str, old: Iterable, new: Iterable, hasher: ContentHasher, diff: IniDiff):
+    # pylint: disable=too-many-locals
+    # Entries of list sections needn't have unique names: match them up by
+    # their digests
+    old = list(old)
+    new = list(new)
+    old_digests = [hasher(entry) for entry in old]
+    new_digests = [hasher(entry) for entry in new]
+    # SequenceMatcher is quadratic in the worst case: only give it the
+    # entries between the common head & tail
+    head, tail = _common_ends(old_digests, new_digests)
+    matcher = SequenceMatcher(None, old_digests[head:len(old) - tail], new_digests[head:len(new) - tail],
+                              autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        removed = old[head + old_start:head + old_end]
+        added = new[head + new_start:head + new_end]
+        # Replaced entries with the same name changed
+        while removed and added and _entry_name(removed[0]) == _entry_name(added[0]) \
+                and getattr(removed[0], 'key', None) is not None:
+            old_entry, new_entry = removed.pop(0), added.pop(0)
+            diff.changes.append(IniChange('changed', name, _entry_name(new_entry), old_entry, new_entry,
+                                          _changed_fields(old_entry, new_entry)))
+        diff.changes.extend(IniChange('removed', name, _entry_name(entry), old=entry) for entry in removed)
+        diff.changes.extend(IniChange('added', name, _entry_name(entry), new=entry) for entry in added)
+
+
+def diff_ini(old: TsIniFile, new: TsIniFile, hasher: Optional[ContentHasher] = None) -> IniDiff:
+    """The differences between two TsIniFile objects, e.g. two firmware revisions
+
+    Sections, pages & entries are compared by content digest (see
+    ContentHasher) so identical subtrees are skipped without looking
+    inside them. Variables are matched by name across the Constants
+    pages & PcVariables, so a variable that moves page is reported as
+    moved (with any other changes in IniChange.fields), not as removed &
+    added. See IniDiff.offset_shifts, type_changes & scale_changes.
+
+    hasher: reuse one to diff a file against several others
+    """
+    hasher = ContentHasher() if hasher is None else hasher
+    diff = IniDiff()
+    if hasher(old) == hasher(new):
+        return diff
+    diff.added_sections = [name for name in new.keys() if name not in old]
+    diff.removed_sections = [name for name in old.keys() if name not in new]
+    diff.changed_sections = [name for name in new.keys() if name in old and hasher(old[name]) != hasher(new[name])]
+
+    if any(name in diff.changed_sections for name in _VARIABLE_SECTIONS):
+        _diff_variables(old, new, hasher, diff)
+    for name in diff.changed_sections:
+        _diff_sequence(name, _header_lines(old[name]), _header_lines(new[name]), hasher, diff)
+        if name in _VARIABLE_SECTIONS:
+            continue
+        if isinstance(old[name], DictSection) and isinstance(new[name], DictSection):
+            _diff_keyed(name, old[name], new[name], hasher, diff)
+        else:
+            _diff_sequence(name, old[name], new[name], hasher, diff)
+    return diff
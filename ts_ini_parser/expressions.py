@@ -0,0 +1,393 @@
+import math
+from collections.abc import Mapping as MappingABC
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Mapping, Optional
+from lark import Transformer, Tree
+from lark.exceptions import VisitError
+from .grammar_cache import open_grammar
+from .optional import import_numpy
+
+_GRAMMAR = Path(__file__).parent / 'grammars' / 'ts_expression.lark'
+
+# Functions available to every expression, plus arrayValue(). TunerStudio
+# has more (some stateful, e.g. lastValue()): pass those to
+# ExpressionCompiler.
+_SCALAR_FUNCTIONS = {
+    'abs': abs,
+    'sqrt': math.sqrt,
+    'log': math.log,
+    'exp': math.exp,
+    'pow': math.pow,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'atan': math.atan,
+    'round': round,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'isNaN': math.isnan,
+}
+
+_NUMPY_FUNCTIONS = {
+    'abs': 'abs',
+    'sqrt': 'sqrt',
+    'log': 'log',
+    'exp': 'exp',
+    'pow': 'power',
+    'sin': 'sin',
+    'cos': 'cos',
+    'tan': 'tan',
+    'atan': 'arctan',
+    'round': 'round',
+    'floor': 'floor',
+    'ceil': 'ceil',
+    'isNaN': 'isnan',
+}
+
+
+def _scalar_runtime():
+    return {
+        '_mod': math.fmod,
+        '_lshift': lambda left, right: int(left) << int(right),
+        '_rshift': lambda left, right: int(left) >> int(right),
+        '_bitand': lambda left, right: int(left) & int(right),
+        '_bitor': lambda left, right: int(left) | int(right),
+        '_bitxor': lambda left, right: int(left) ^ int(right),
+        '_invert': lambda value: ~int(value),
+        '_index': lambda array, index: array[int(index)],
+    }
+
+
+def _numpy_runtime():
+    numpy = import_numpy()
+
+    def to_int(value):
+        return numpy.asarray(value).astype(numpy.int64)
+
+    return {
+        '_div': numpy.true_divide,
+        '_mod': numpy.fmod,
+        '_lshift': lambda left, right: numpy.left_shift(to_int(left), to_int(right)),
+        '_rshift': lambda left, right: numpy.right_shift(to_int(left), to_int(right)),
+        '_bitand': lambda left, right: numpy.bitwise_and(to_int(left), to_int(right)),
+        '_bitor': lambda left, right: numpy.bitwise_or(to_int(left), to_int(right)),
+        '_bitxor': lambda left, right: numpy.bitwise_xor(to_int(left), to_int(right)),
+        '_invert': lambda value: numpy.invert(to_int(value)),
+        '_index': lambda array, index: numpy.asarray(array)[to_int(index)],
+        '_and': numpy.logical_and,
+        '_or': numpy.logical_or,
+        '_not': numpy.logical_not,
+        '_where': numpy.where,
+    }
+
+
+class _CodeGenerator(Transformer):
+    # pylint: disable=no-self-use,too-many-public-methods
+    """Transformer for the expression grammar: converts an expression to Python source
+
+    Operators whose semantics differ from Python's (e.g. bit operators on
+    floats, Java's % sign) call runtime functions (_mod etc.). In
+    vectorized mode, the logical & ternary operators become NumPy calls
+    so they apply element wise. Identifiers are looked up in _v,
+    functions in _f.
+    """
+
+    def __init__(self, vectorized: bool):
+        super().__init__()
+        self._vectorized = vectorized
+        self.identifiers = set()
+        self.functions = set()
+
+    def _binary(self, children, functions):
+        left, operator, right = children
+        function = functions.get(operator.value)
+        if function is None:
+            return f'({left} {operator.value} {right})'
+        return f'{function}({left}, {right})'
+
+    def multiplicative_expression(self, children):
+        # NumPy division, so division by zero gives inf/nan for plain
+        # numbers too
+        return self._binary(children, {'%': '_mod', '/': '_div'} if self._vectorized else {'%': '_mod'})
+
+    def additive_expression(self, children):
+        return self._binary(children, {})
+
+    def shift_expression(self, children):
+        return self._binary(children, {'<<': '_lshift', '>>': '_rshift'})
+
+    def relational_expression(self, children):
+        return self._binary(children, {})
+
+    def equality_expression(self, children):
+        return self._binary(children, {})
+
+    def bit_expression(self, children):
+        return self._binary(children, {'&': '_bitand', '|': '_bitor', '^': '_bitxor'})
+
+    def logical_expression(self, children):
+        left, operator, right = children
+        if self._vectorized:
+            return f"{'_and' if operator == '&&' else '_or'}({left}, {right})"
+        return f"(bool({left}) {'and' if operator == '&&' else 'or'} bool({right}))"
+
+    def ternary_expression(self, children):
+        condition, if_true, if_false = children
+        if self._vectorized:
+            return f'_where({condition}, {if_true}, {if_false})'
+        return f'({if_true} if {condition} else {if_false})'
+
+    def unary_op_expression(self, children):
+        operator, operand = children
+        if operator in ('-', '+'):
+            return f'({operator}{operand})'
+        if operator == '~':
+            return f'_invert({operand})'
+        if operator == '!':
+            return f'_not({operand})' if self._vectorized else f'(not {operand})'
+        raise ValueError(f'Unsupported operator: {operator}')
+
+    def nested_expression(self, children):
+        return children[0]
+
+    def identifier(self, children):
+        self.identifiers.add(children[0].value)
+        return _Identifier(children[0].value)
+
+    def fncall_index_expression(self, children):
+        function = children[0]
+        if not isinstance(function, _Identifier):
+            raise ValueError(f'Unsupported function call: {function}')
+        self.identifiers.discard(function.name)
+        self.functions.add(function.name)
+        arguments = ', '.join(self._arguments(children[1:]))
+        return f'_f[{function.name!r}]({arguments})'
+
+    def _arguments(self, children):
+        for child in children:
+            if isinstance(child, Tree):  # argument_expression_list
+                yield from self._arguments(child.children)
+            else:
+                yield child
+
+    def argument_expression_list(self, children):
+        return Tree('argument_expression_list', children)
+
+    def array_index_expression(self, children):
+        return f'_index({children[0]}, {children[1]})'
+
+    def struct_access_expression(self, children):
+        base, member = children
+        if isinstance(base, _Identifier) and base.name == 'array':
+            # array.name references the array constant name, e.g.
+            # arrayValue(array.boardFuelOutputs, pinLayout)
+            self.identifiers.discard(base.name)
+            return member
+        self.identifiers.discard(member.name)
+        return f'getattr({base}, {member.name!r})'
+
+    def _unsupported(self, children):
+        raise ValueError('Increment & decrement operators are not supported')
+
+    postfix_inc_expression = _unsupported
+    postfix_dec_expression = _unsupported
+    prefix_inc_expression = _unsupported
+    prefix_dec_expression = _unsupported
+
+    def decimal_int_constant(self, children):
+        return repr(int(children[0]))
+
+    def hex_constant(self, children):
+        return repr(int(children[0], 16))
+
+    def binary_constant(self, children):
+        return repr(int(children[0][2:], 2))
+
+    def floating_constant(self, children):
+        return repr(float(children[0].rstrip('f')))
+
+    def char_constant(self, children):
+        return children[0].value
+
+    def string_literal(self, children):
+        return children[0].value
+
+
+class _Identifier(str):
+    """The code for an identifier: a lookup of its value"""
+
+    def __new__(cls, name):
+        identifier = super().__new__(cls, f'_v[{name!r}]')
+        identifier.name = name
+        return identifier
+
+
+class CompiledExpression:
+    """An INI file expression compiled to a Python function
+
+    Call with a mapping of the identifiers it uses to their values (see
+    identifiers). In vectorized mode, the values can be NumPy arrays (e.g.
+    a column of datalog values per channel) and the result is an array.
+    """
+    __slots__ = ('expression', 'identifiers', 'functions', 'vectorized', '_function', '_numpy')
+
+    def __init__(self, expression: str, identifiers: FrozenSet[str], functions: FrozenSet[str],
+                 vectorized: bool, function: Callable):
+        # pylint: disable=too-many-arguments
+        self.expression = expression
+        self.identifiers = identifiers
+        self.functions = functions
+        self.vectorized = vectorized
+        self._function = function
+        self._numpy = None
+        if vectorized:
+            self._numpy = import_numpy()
+
+    def __call__(self, values: Mapping[str, Any]):
+        if self._numpy is None:
+            return self._function(values)
+        # Division by zero etc. produce inf/nan, as they do in TunerStudio
+        with self._numpy.errstate(all='ignore'):
+            return self._function(values)
+
+    def __repr__(self):
+        return f'CompiledExpression({self.expression!r}, vectorized={self.vectorized})'
+
+
+class ExpressionCompiler:
+    """Compiles INI file expressions (the contents of {...}) to Python functions
+
+    Each distinct expression is parsed & compiled once: compile() returns
+    the cached result for an expression it has seen before. E.g.
+        compiler = ExpressionCompiler()
+        coolant = compiler.compile('(coolantRaw - 40) * 1.8 + 32')
+        coolant({'coolantRaw': 120})
+        coolant = compiler.compile('(coolantRaw - 40) * 1.8 + 32', vectorized=True)
+        coolant({'coolantRaw': numpy.array([100, 120, 140])})
+
+    Vectorized mode needs NumPy.
+    """
+
+    def __init__(self, functions: Optional[Mapping[str, Callable]] = None):
+        """
+        functions: functions expressions can call, in addition to the math
+            functions (abs, sqrt etc.). Vectorized expressions call them
+            with arrays.
+        """
+        self._parser = None
+        self._functions = dict(functions or {})
+        self._cache: Dict[tuple, CompiledExpression] = {}
+        self._runtimes = {}
+
+    def _runtime(self, vectorized: bool):
+        runtime = self._runtimes.get(vectorized)
+        if runtime is None:
+            if vectorized:
+                runtime = _numpy_runtime()
+                numpy = import_numpy()
+                functions = {name: getattr(numpy, function) for name, function in _NUMPY_FUNCTIONS.items()}
+            else:
+                runtime = _scalar_runtime()
+                functions = dict(_SCALAR_FUNCTIONS)
+            functions['arrayValue'] = runtime['_index']
+            functions.update(self._functions)
+            runtime['_f'] = functions
+            runtime['__builtins__'] = {'bool': bool, 'getattr': getattr}
+            runtime = self._runtimes[vectorized] = runtime
+        return runtime
+
+    def parse(self, expression: str) -> Tree:
+        """Parse an expression into a Lark tree"""
+        if self._parser is None:
+            self._parser = open_grammar(_GRAMMAR, start='conditional_expression')
+        return self._parser.parse(expression)
+
+    def compile(self, expression: str, vectorized: bool = False) -> CompiledExpression:
+        expression = expression.strip()
+        key = (expression, vectorized)
+        compiled = self._cache.get(key)
+        if compiled is None:
+            generator = _CodeGenerator(vectorized)
+            try:
+                code = generator.transform(self.parse(expression))
+            except VisitError as error:
+                raise error.orig_exc from error
+            # pylint: disable=eval-used
+            function = eval(f'lambda _v: {code}', self._runtime(vectorized))
+            compiled = self._cache[key] = CompiledExpression(expression,
+                                                             frozenset(generator.identifiers),
+                                                             frozenset(generator.functions),
+                                                             vectorized, function)
+        return compiled
+
+
+def expression_text(value) -> Optional[str]:
+    """The expression if a model value (e.g. ScalarVariable.scale) is an inline {expression}"""
+    if isinstance(value, tuple) and len(value) == 2 and value[0] == 'inline_expression':
+        return value[1]
+    return None
+
+
+def computed_channels(ini_file) -> Dict[str, str]:
+    """The expressions of the computed [OutputChannels] (name = { expression })"""
+    channels = {}
+    for name, channel in ini_file.get('OutputChannels', {}).items():
+        values = getattr(channel, 'values', None)
+        expression = expression_text(values[0]) if values else None
+        if expression is not None:
+            channels[name] = expression
+    return channels
+
+
+class _ChannelValues(MappingABC):
+    """The known channel values, plus computed channels evaluated on first access"""
+
+    def __init__(self, values: Mapping, expressions: Mapping[str, CompiledExpression]):
+        self._values = values
+        self._expressions = expressions
+        self.computed = {}
+        self._evaluating = set()
+
+    def __getitem__(self, name):
+        if name in self.computed:
+            return self.computed[name]
+        expression = self._expressions.get(name)
+        if expression is None:
+            return self._values[name]
+        if name in self._evaluating:
+            raise ValueError(f'Computed channel {name} has a circular dependency')
+        self._evaluating.add(name)
+        try:
+            value = self.computed[name] = expression(self)
+        finally:
+            self._evaluating.discard(name)
+        return value
+
+    def __iter__(self):
+        yield from self._values
+        yield from (name for name in self._expressions if name not in self._values)
+
+    def __len__(self):
+        return len(set(self._values) | set(self._expressions))
+
+
+def evaluate_channels(expressions: Mapping[str, str],
+                      values: Mapping[str, Any],
+                      names: Optional[Iterable[str]] = None,
+                      compiler: Optional[ExpressionCompiler] = None,
+                      vectorized: bool = True) -> Dict[str, Any]:
+    """Evaluate computed channels over arrays of channel values
+
+    Each expression is evaluated once over the whole arrays, not per row.
+    Computed channels can reference each other, in any order.
+
+    expressions: computed channel name -> expression (see computed_channels())
+    values: channel (or constant) name -> NumPy array (or scalar)
+    names: the computed channels to evaluate. Defaults to all.
+    vectorized: False to evaluate a single row of scalar values, without
+        NumPy.
+    """
+    compiler = compiler or ExpressionCompiler()
+    compiled = {name: compiler.compile(expression, vectorized) for name, expression in expressions.items()}
+    channel_values = _ChannelValues(values, compiled)
+    return {name: channel_values[name] for name in (expressions if names is None else names)}
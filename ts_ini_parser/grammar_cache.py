@@ -0,0 +1,74 @@
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+from lark import Lark, __version__ as lark_version
+
+# Environment variable: the folder to cache the parse tables in. Set it to
+# an empty string to turn caching off.
+CACHE_DIR_VARIABLE = 'TS_INI_PARSER_CACHE_DIR'
+
+
+def cache_dir() -> Optional[Path]:
+    """The per-user folder the grammar parse tables are cached in
+
+    $TS_INI_PARSER_CACHE_DIR, else the platform user cache folder
+    (%LOCALAPPDATA% or $XDG_CACHE_HOME, defaulting to ~/.cache). None if
+    caching is turned off.
+    """
+    folder = os.environ.get(CACHE_DIR_VARIABLE)
+    if folder is not None:
+        return Path(folder).expanduser() if folder else None
+    root = os.environ.get('LOCALAPPDATA') if sys.platform == 'win32' else os.environ.get('XDG_CACHE_HOME')
+    return Path(root or Path.home() / '.cache') / 'ts_ini_parser' / 'grammars'
+
+
+def cache_path(grammar: Path, **options) -> Optional[Path]:
+    """The cache file for a grammar & the Lark options it is built with
+
+    The name includes a hash of the grammar text, the options & the Lark and
+    Python versions, so a stale cache is never picked up (Lark also checks
+    the same things when loading it).
+    """
+    folder = cache_dir()
+    if folder is None:
+        return None
+    key = [grammar.read_text(encoding='utf-8'), lark_version, str(sys.version_info[:2])]
+    key.extend(f'{name}={value!r}' for name, value in sorted(options.items()) if name != 'transformer')
+    digest = hashlib.sha256('\0'.join(key).encode('utf-8')).hexdigest()[:32]
+    return folder / f'{grammar.stem}-{digest}.lark.cache'
+
+
+def open_grammar(grammar: Path, **options) -> Lark:
+    """Lark.open() a grammar as a LALR parser, caching the parse tables
+
+    Building the tables is most of the cost of creating a parser, so they are
+    built once per grammar version & stored in cache_dir(). Falls back to
+    building the tables if the cache can't be written.
+    """
+    options['parser'] = 'lalr'
+    path = cache_path(grammar, **options)
+    if path is None:
+        return Lark.open(grammar, **options)
+    if path.exists():
+        return Lark.open(grammar, cache=str(path), **options)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        os.close(handle)
+        os.unlink(temp_path)
+    except OSError:
+        return Lark.open(grammar, **options)
+    # Lark writes the cache as it builds the parser: build into a temporary
+    # file & rename it, so concurrent processes never read a partial cache.
+    try:
+        parser = Lark.open(grammar, cache=temp_path, **options)
+        os.replace(temp_path, path)
+    except OSError:
+        parser = Lark.open(grammar, **options)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    return parser
@@ -0,0 +1,218 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set, Tuple, Union
+from lark import Token
+
+
+class IncludeGraph:
+    """Which files #include which
+
+    Only files that were parsed from a named file (rather than e.g. a
+    string) are recorded as including files. Each time a file is
+    preprocessed, its #includes replace those recorded before. Use
+    dependents() or roots() to find the files to reparse when an included
+    file changes.
+    """
+
+    def __init__(self):
+        self._includes: Dict[Path, Set[Path]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, including: Path, included: Path):
+        with self._lock:
+            self._includes.setdefault(including, set()).add(included)
+
+    def replace(self, including: Path, included: Iterable[Path]):
+        """Record the files including #includes directly, in place of those recorded before"""
+        included = set(included)
+        with self._lock:
+            if included:
+                self._includes[including] = included
+            else:
+                self._includes.pop(including, None)
+
+    def includes(self, path: Union[str, Path]) -> FrozenSet[Path]:
+        """The files that path #includes directly"""
+        path = _normalize(path)
+        with self._lock:
+            return frozenset(self._includes.get(path, ()))
+
+    def dependents(self, path: Union[str, Path]) -> Set[Path]:
+        """The files that #include path, directly or through other files"""
+        path = _normalize(path)
+        with self._lock:
+            included_by: Dict[Path, Set[Path]] = {}
+            for including, included in self._includes.items():
+                for child in included:
+                    included_by.setdefault(child, set()).add(including)
+        found: Set[Path] = set()
+        pending = [path]
+        while pending:
+            for parent in included_by.get(pending.pop(), ()):
+                if parent not in found:
+                    found.add(parent)
+                    pending.append(parent)
+        found.discard(path)
+        return found
+
+    def roots(self, path: Union[str, Path]) -> Set[Path]:
+        """The top level files (included by nothing) that depend on path"""
+        dependents = self.dependents(path)
+        with self._lock:
+            included = set().union(*self._includes.values()) if self._includes else set()
+        return {dependent for dependent in dependents if dependent not in included}
+
+    def clear(self):
+        with self._lock:
+            self._includes.clear()
+
+
+class IncludedToken(Token):
+    """A token from an #include file: source is the file's path
+
+    The included file's lines are spliced into the including file's, with
+    their own positions, so the path says which file they are in.
+    """
+    __slots__ = ('source',)
+
+    def __new__(cls, type_, value, start_pos=None, line=None, column=None, end_line=None, end_column=None,
+                end_pos=None, source: Optional[Path] = None):
+        # pylint: disable=too-many-arguments
+        token = super().__new__(cls, type_, value, start_pos, line, column, end_line, end_column, end_pos)
+        token.source = source
+        return token
+
+    @classmethod
+    def borrow(cls, token: Token, source: Path) -> 'IncludedToken':
+        """The token, from source"""
+        return cls(token.type, token.value, token.start_pos, token.line, token.column,
+                   token.end_line, token.end_column, token.end_pos, source)
+
+    def __reduce__(self):
+        return (self.__class__, (self.type, self.value, self.start_pos, self.line, self.column,
+                                 self.end_line, self.end_column, self.end_pos, self.source))
+
+
+class IncludedFile(NamedTuple):
+    """An included file, preprocessed"""
+    path: Path
+    lines: tuple            # IncludedTokens, positioned within the included file
+    symbols: FrozenSet[str]  # The symbols defined at the end of the file
+    tested_symbols: FrozenSet[str]
+    includes: FrozenSet[Path]  # The files it includes, directly or not
+
+
+class IncludeCache:
+    """Preprocessed #include files, shared by every parser in the process
+
+    An included file is preprocessed once for each set of symbols that are
+    defined where it is included. Entries are keyed on the file's path,
+    modification time & size, so a changed file is preprocessed again. The
+    files it #includes in turn are checked the same way when an entry is
+    looked up.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.graph = IncludeGraph()
+        # {key: (entry, {nested include: its stamp when the entry was put})}
+        self._entries: 'OrderedDict[tuple, Tuple[IncludedFile, Dict[Path, Optional[tuple]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: Path, symbols: Iterable[str], *options) -> tuple:
+        stat = path.stat()
+        return (path, stat.st_mtime_ns, stat.st_size, frozenset(symbols)) + options
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[tuple]:
+        # The modification time & size of a file (None if it is gone)
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, key: tuple) -> Optional[IncludedFile]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            entry, stamps = cached
+            if any(self._stamp(path) != stamp for path, stamp in stamps.items()):
+                # A file it #includes has changed since
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: IncludedFile):
+        stamps = {path: self._stamp(path) for path in entry.includes}
+        with self._lock:
+            self._entries[key] = (entry, stamps)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.graph.clear()
+
+
+# The per-process cache
+INCLUDE_CACHE = IncludeCache()
+
+
+def note_source(error: Exception, source: Optional[Path]):
+    """Record the #include file an error is in as error.source (None: the
+    file being parsed). The innermost file is kept."""
+    if getattr(error, 'source', None) is None:
+        error.source = source
+        if source is not None and hasattr(error, 'add_note'):
+            error.add_note(f'In #include file {source}')
+
+
+def _normalize(path: Union[str, Path]) -> Path:
+    return Path(path).resolve()
+
+
+def _include_name(text: str) -> str:
+    # The rest of the line follows the name: e.g. a comment
+    text = text.strip()
+    if text[:1] in ('"', '<'):
+        end = text.find('>' if text[0] == '<' else '"', 1)
+        return text[1:end if end > 0 else None]
+    return text.split()[0] if text else text
+
+
+def find_include(name: str, search_paths: Iterable[Union[str, Path]],
+                 including: Optional[Union[str, Path]] = None) -> Optional[Path]:
+    """The file an #include refers to, or None if there is no such file
+
+    name: the #include argument, with or without quotes
+    Searches the including file's folder (if known), then search_paths.
+    """
+    name = _include_name(name)
+    folders = [Path(including).parent] if including else []
+    folders.extend(Path(folder) for folder in search_paths)
+    for folder in folders:
+        candidate = folder / name
+        if candidate.is_file():
+            return _normalize(candidate)
+    return None
+
+
+def source_path(parse_source) -> Optional[Path]:
+    """The path of the file a parse source was read from, if known"""
+    name = getattr(parse_source, 'name', None)
+    if isinstance(name, (str, Path)) and Path(name).is_file():
+        return _normalize(name)
+    return None
+
+
+__all__: Tuple[str, ...] = ('IncludeGraph', 'IncludedToken', 'IncludedFile', 'IncludeCache', 'INCLUDE_CACHE',
+                            'find_include', 'note_source', 'source_path')
@@ -0,0 +1,311 @@
+import copy
+import io
+import re
+from typing import List, Mapping, Optional, Tuple
+from lark import Token
+from lark.exceptions import LarkError
+from .ts_ini_parser import TsIniParser
+from .lazy_ini_file import LazyTsIniFile, SectionRange, _index_sections, _section_name, _HASHDEF_LINE, _UNLOADED
+from .dataclasses.ts_ini_file import AxisBin, Curve, Table
+
+# Directives whose effect reaches beyond the section they are in
+_SYMBOL_DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*(?:set|unset)\b.*$', re.IGNORECASE | re.MULTILINE)
+
+# The line that starts each block within a section: reparsing a block is
+# cheaper than reparsing the whole section.
+_BLOCK_HEADERS = {
+    'Constants': re.compile(r'[ \t]*page[ \t]*=', re.IGNORECASE),
+    'TableEditor': re.compile(r'[ \t]*table[ \t]*=', re.IGNORECASE),
+    'CurveEditor': re.compile(r'[ \t]*curve[ \t]*=', re.IGNORECASE),
+}
+
+# Sections that table & curve bins reference
+_REFERENCED_SECTIONS = ('Constants', 'PcVariables', 'OutputChannels')
+_REFERENCING_SECTIONS = ('TableEditor', 'CurveEditor')
+
+
+def _shift_token(token: Token, pos_delta: int, line_delta: int) -> Token:
+    return Token(token.type, token.value,
+                 token.start_pos + pos_delta, token.line + line_delta, token.column,
+                 token.end_line + line_delta, token.end_column, token.end_pos + pos_delta)
+
+
+def _shift_section(section: SectionRange, pos_delta: int, line_delta: int) -> SectionRange:
+    if not pos_delta and not line_delta:
+        return section
+    lines = [_shift_token(line, pos_delta, line_delta) for line in section.lines]
+    return SectionRange(section.name, section.start_pos + pos_delta, section.end_pos + pos_delta,
+                        lines, [line for line in lines if _HASHDEF_LINE.match(line)], section.symbols)
+
+
+def _line_start(token: Token) -> int:
+    return token.start_pos - (token.column - 1)
+
+
+def _block_starts(name: str, lines: List[Token]) -> Optional[List[int]]:
+    header = _BLOCK_HEADERS.get(name)
+    if header is None:
+        return None
+    return [index for index, line in enumerate(lines) if header.match(line)]
+
+
+def _changed_lines(old: List[Token], new: List[Token]) -> Tuple[int, int, int]:
+    """The lines that differ between old & new, ignoring position
+
+    Returns (first, old_end, new_end): old[first:old_end] was replaced by
+    new[first:new_end]
+    """
+    first = 0
+    limit = min(len(old), len(new))
+    while first < limit and old[first].value == new[first].value:
+        first += 1
+    suffix = 0
+    while suffix < limit - first and old[-1 - suffix].value == new[-1 - suffix].value:
+        suffix += 1
+    return first, len(old) - suffix, len(new) - suffix
+
+
+def _block_of(starts: List[int], first: int, end: int) -> Optional[int]:
+    """The index of the block holding lines [first, end), if they are all in one block"""
+    if not starts or first < starts[0]:
+        return None
+    block = max(index for index, start in enumerate(starts) if start <= first)
+    block_end = starts[block + 1] if block + 1 < len(starts) else None
+    if block_end is not None and end > block_end:
+        return None
+    return block
+
+
+def _name(reference):
+    """The name of a wired (or not yet wired) bin reference"""
+    return reference if reference is None or isinstance(reference, str) else reference.name
+
+
+def _bin_names(axis_bin: AxisBin):
+    return (_name(axis_bin.variable), _name(axis_bin.outputchannel_ref))
+
+
+def _unwired_bin(axis_bin: AxisBin) -> AxisBin:
+    unwired = copy.copy(axis_bin)
+    unwired.variable = _name(axis_bin.variable)
+    unwired.outputchannel_ref = _name(axis_bin.outputchannel_ref)
+    return unwired
+
+
+def _bins(item):
+    if isinstance(item, Table):
+        return [item.table_xbin, item.table_ybin, item.zbins]
+    if isinstance(item, Curve):
+        return [axis_bin for line in item.lines for axis_bin in (line.xbin, line.ybin)]
+    return []
+
+
+def _replace_items(section, replacements: Mapping, renamed: Optional[Tuple] = None):
+    """A shallow copy of section with some items replaced, preserving order
+
+    renamed: (old_key, new_key) if the replaced item's key changed
+    """
+    replaced = copy.copy(section)
+    old_key, new_key = renamed or (None, None)
+    replaced.data = {}
+    for key, value in section.data.items():
+        if key == old_key:
+            replaced.data[new_key] = replacements[new_key]
+        else:
+            replaced.data[key] = replacements.get(key, value)
+    return replaced
+
+
+class IncrementalTsIniFile(LazyTsIniFile):
+    """A LazyTsIniFile that can be cheaply updated as its source text is edited
+
+    Created by parse_incremental(). edit() returns a new IncrementalTsIniFile
+    for the edited text, reusing everything the edit can't have changed:
+    only the edited section (or just the edited page, table or curve) is
+    preprocessed & parsed again. The previous file is left untouched.
+    """
+    # pylint: disable=too-many-ancestors
+
+    def __init__(self, parser: TsIniParser, text: str, header_lines: List[Token], sections: List[SectionRange]):
+        super().__init__(parser, header_lines, sections)
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def _span(self, index: int) -> Tuple[int, int]:
+        """The source text range of a section: up to the start of the next section"""
+        start = _line_start(self._sections[index].lines[0])
+        end = _line_start(self._sections[index + 1].lines[0]) if index + 1 < len(self._sections) else len(self._text)
+        return start, end
+
+    def _section_containing(self, start: int, end: int) -> Optional[int]:
+        for index in range(len(self._sections)):
+            span_start, span_end = self._span(index)
+            if span_start <= start and end <= span_end:
+                return index
+        return None
+
+    def edit(self, start: int, end: int, replacement: str) -> 'IncrementalTsIniFile':
+        """Replace text[start:end] with replacement
+
+        Returns the updated file. If the edit could change how the rest of
+        the file is preprocessed (e.g. it adds a section, or an #if/#set
+        spanning sections) the whole file is indexed again instead.
+        """
+        if not 0 <= start <= end <= len(self._text):
+            raise IndexError(f'Edit range {start}:{end} is outside the text')
+        new_text = self._text[:start] + replacement + self._text[end:]
+        edited = self._edit_section(new_text, start, end, replacement)
+        return edited if edited is not None else parse_incremental(self._parser, new_text)
+
+    def _edit_section(self, new_text: str, start: int, end: int, replacement: str):
+        # pylint: disable=too-many-locals
+        index = self._section_containing(start, end)
+        if index is None:
+            return None
+        old = self._sections[index]
+        span_start, span_end = self._span(index)
+        pos_delta = len(replacement) - (end - start)
+        old_span = self._text[span_start:span_end]
+        new_span = new_text[span_start:span_end + pos_delta]
+        if _SYMBOL_DIRECTIVE.findall(old_span) != _SYMBOL_DIRECTIVE.findall(new_span):
+            return None
+
+        try:
+            lines = [_shift_token(line, span_start, old.lines[0].line - 1)
+                     for line in self._parser.pre_process_stream(io.StringIO(new_span), old.symbols)]
+        except (LarkError, SyntaxError):
+            # E.g. the edit unbalanced an #if/#endif: it may pair with
+            # directives in other sections. (The scanner backend raises
+            # SyntaxError.)
+            return None
+        if not lines or _section_name(lines[0]) != old.name \
+                or any(_section_name(line) is not None for line in lines[1:]):
+            return None
+
+        new = SectionRange(old.name, lines[0].start_pos, lines[-1].end_pos,
+                           lines, [line for line in lines if _HASHDEF_LINE.match(line)], old.symbols)
+        line_delta = new_span.count('\n') - old_span.count('\n')
+        sections = self._sections[:index] + [new] \
+            + [_shift_section(section, pos_delta, line_delta) for section in self._sections[index + 1:]]
+
+        edited = IncrementalTsIniFile(self._parser, new_text, self._header_lines, sections)
+        edited._file_header = self._file_header  # pylint: disable=protected-access
+        # The #defines before the edited section are unchanged
+        edited._defines = self._defines[:index + 1]  # pylint: disable=protected-access
+        edited.data = dict(self.data)
+        defines_changed = [line.value for line in old.hashdef_lines] != [line.value for line in new.hashdef_lines]
+        edited._update_section(index, old, new, defines_changed)  # pylint: disable=protected-access
+        return edited
+
+    def _update_section(self, index: int, old: SectionRange, new: SectionRange, defines_changed: bool):
+        """Bring the loaded sections up to date after a section changed"""
+        name = new.name
+        if defines_changed:
+            # Later sections may reference the #defines. Sections wired to
+            # the unloaded sections are unloaded too, to be wired afresh.
+            for section in self._sections[index + 1:]:
+                self.data[section.name] = _UNLOADED
+            if any(self.data[section] is _UNLOADED for section in _REFERENCED_SECTIONS if section in self.data):
+                for section in _REFERENCING_SECTIONS:
+                    if section in self.data:
+                        self.data[section] = _UNLOADED
+
+        previous = self.data[name]
+        if previous is _UNLOADED:
+            return
+        first, old_end, new_end = _changed_lines(old.lines, new.lines)
+        if first == old_end and first == new_end:
+            # Only comments, whitespace or excluded lines changed
+            return
+
+        if sum(1 for section in self._sections if section.name == name) == 1:
+            old_starts = _block_starts(name, old.lines)
+            new_starts = _block_starts(name, new.lines)
+            if old_starts is not None and len(old_starts) == len(new_starts) == len(previous.data):
+                block = _block_of(old_starts, first, old_end)
+                if block is not None and block == _block_of(new_starts, first, new_end):
+                    self._reload_block(index, previous, block, new_starts)
+                    return
+
+        # Reload the whole section
+        self.data[name] = _UNLOADED
+        if name in _REFERENCED_SECTIONS:
+            self._load_section(name)
+            self._rewire(None)
+        else:
+            self._load_section(name)
+
+    def _reload_block(self, index: int, previous, block: int, starts: List[int]):
+        """Parse one page, table or curve & splice it into a copy of its section"""
+        section = self._sections[index]
+        block_end = starts[block + 1] if block + 1 < len(starts) else len(section.lines)
+        # Every #define the block may reference, the section header line &
+        # the block itself. The #defines go first: not every section allows
+        # them before its first block.
+        block_lines = [line for line in section.lines[:starts[block]] if _HASHDEF_LINE.match(line)] \
+            + [section.lines[0]] + section.lines[starts[block]:block_end]
+        block_section = SectionRange(section.name, section.start_pos, section.end_pos, block_lines, [])
+        _, parsed = self._parse(self._sections[:index] + [block_section], section.name)
+        new_item = next(iter(parsed[section.name].values()))
+
+        old_key = list(previous.data)[block]
+        old_item = previous.data[old_key]
+        self.data[section.name] = _replace_items(previous, {new_item.key: new_item}, (old_key, new_item.key))
+
+        if section.name == 'Constants':
+            self._rewire({variable.name for page in (old_item, new_item) for variable in page.values()})
+        elif section.name == 'TableEditor':
+            self._wire_table(new_item)
+        elif section.name == 'CurveEditor':
+            self._wire_curve(new_item)
+
+    def _rewire(self, names):
+        """Wire tables & curves that reference the named variables again
+
+        names: None to rewire everything. The tables & curves are copied,
+        since they may be shared with the file this one was edited from.
+        """
+        for section_name in _REFERENCING_SECTIONS:
+            section = self.data.get(section_name, _UNLOADED)
+            if section is _UNLOADED:
+                continue
+            replacements = {}
+            for key, item in section.data.items():
+                if names is None or any(name in names for axis_bin in _bins(item) for name in _bin_names(axis_bin)):
+                    replacements[key] = self._rewired(item)
+            if replacements:
+                self.data[section_name] = _replace_items(section, replacements)
+
+    def _rewired(self, item):
+        rewired = copy.copy(item)
+        if isinstance(item, Table):
+            rewired.table_xbin = _unwired_bin(item.table_xbin)
+            rewired.table_ybin = _unwired_bin(item.table_ybin)
+            rewired.zbins = _unwired_bin(item.zbins)
+            self._wire_table(rewired)
+        else:
+            rewired.lines = []
+            for line in item.lines:
+                line = copy.copy(line)
+                line.xbin = _unwired_bin(line.xbin)
+                line.ybin = _unwired_bin(line.ybin)
+                rewired.lines.append(line)
+            self._wire_curve(rewired)
+        return rewired
+
+
+def parse_incremental(parser: TsIniParser, text: str) -> IncrementalTsIniFile:
+    """Index an INI file for lazy loading & incremental editing
+
+    E.g.
+        ini_file = parse_incremental(parser, text)
+        ini_file['Constants']
+        ini_file = ini_file.edit(start, end, 'new text')
+        ini_file['Constants']  # Only the edited page is parsed again
+    """
+    lines = parser.pre_process_stream(io.StringIO(text), backend='scanner')
+    header_lines, sections = _index_sections(lines, lines.symbols)
+    return IncrementalTsIniFile(parser, text, header_lines, sections)
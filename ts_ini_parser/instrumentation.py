@@ -0,0 +1,120 @@
+import json
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, TextIO
+
+
+class RuleStats:
+    # pylint: disable=too-few-public-methods
+    """Call count & cumulative time of one grammar rule's callback"""
+    __slots__ = ('calls', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {'calls': self.calls, 'seconds': self.seconds}
+
+
+class StageStats:
+    """The rule callbacks & the lexed tokens of one pipeline stage
+
+    rules: {rule name: RuleStats}. A callback's time excludes its
+        children's callbacks, which ran before it.
+    tokens: {terminal type: count}
+    """
+
+    def __init__(self):
+        self.rules: Dict[str, RuleStats] = {}
+        self.tokens: Counter = Counter()
+
+    def record(self, name: str, seconds: float):
+        stats = self.rules.get(name)
+        if stats is None:
+            stats = self.rules[name] = RuleStats()
+        stats.calls += 1
+        stats.seconds += seconds
+
+    def timed(self, name: str, callback: Callable) -> Callable:
+        """Wrap a rule callback to record its calls & time"""
+        name = str(name)
+        record = self.record
+        clock = time.perf_counter
+
+        def timed_callback(*args):
+            start = clock()
+            try:
+                return callback(*args)
+            finally:
+                record(name, clock() - start)
+        return timed_callback
+
+    def counted(self, tokens: Iterator) -> Iterator:
+        """Pass tokens through, counting them by type"""
+        counts = self.tokens
+        for token in tokens:
+            counts[token.type] += 1
+            yield token
+
+    def to_dict(self) -> dict:
+        return {'rules': {name: stats.to_dict() for name, stats in self.rules.items()},
+                'tokens': dict(self.tokens)}
+
+
+class ParseStats:
+    """Opt-in instrumentation of the preprocessor, parser & transformer
+
+    Pass one to the parse methods (e.g. TsIniParser.parse(..., stats=stats))
+    or DataClassTransformer(stats=stats). Nothing is recorded, and nearly
+    nothing is spent, without one.
+
+    stages: {stage: StageStats}. The stages are 'pre_process', 'parse',
+        'transform' (DataClassTransformer) & 'parse_model'
+        (TsIniParser.parse_model(), whose rule callbacks are the
+        DataClassTransformer ones).
+    define_expansions: {symbol: count} of the #define references expanded
+    conditional_depths: {depth: count} of the #if blocks opened at each
+        nesting depth (1 = not nested)
+
+    The time of an #include rule includes preprocessing the included file.
+    Not thread safe: use one per parse (or per thread).
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.define_expansions: Counter = Counter()
+        self.conditional_depths: Counter = Counter()
+
+    def stage(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @property
+    def max_conditional_depth(self) -> int:
+        return max(self.conditional_depths, default=0)
+
+    def to_dict(self) -> dict:
+        return {'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+                'define_expansions': dict(self.define_expansions),
+                'conditional_depths': {str(depth): count for depth, count in sorted(self.conditional_depths.items())},
+                'max_conditional_depth': self.max_conditional_depth}
+
+    def to_json(self, **kwargs) -> str:
+        """kwargs: passed to json.dumps (e.g. indent)"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def folded_stacks(self) -> List[str]:
+        """The rule times as folded stacks (stage;rule microseconds)
+
+        The input format of flamegraph.pl, speedscope, inferno etc.
+        """
+        return [f'{stage};{rule} {round(stats.seconds * 1e6)}'
+                for stage, stage_stats in self.stages.items()
+                for rule, stats in stage_stats.rules.items()]
+
+    def write_folded(self, file: TextIO):
+        for line in self.folded_stacks():
+            file.write(line + '\n')
@@ -0,0 +1,210 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+from lark import Token
+from .ts_ini_parser import TsIniParser
+from .dataclasses.data_class_transformer import DataClassTransformer
+from .dataclasses.ts_ini_file import TsIniFile
+
+_HASHDEF_LINE = re.compile(r'#[ \t]*define', re.IGNORECASE)
+_UNLOADED = object()
+# Ends the lines parsed for the file header or a section's #defines alone:
+# the grammar needs at least one section
+_PLACEHOLDER = Token('LINE', '[LazyTsIniFile]\n', 0, 1, 1, 1, 17, 17)
+
+
+@dataclass(eq=False)
+class SectionRange:
+    """Where a [Section] lives in the preprocessed file"""
+    name: str
+    # Character offsets of the section in the source file
+    start_pos: int
+    end_pos: int
+    # The lines the preprocessor kept, with their source positions
+    lines: List[Token] = field(repr=False)
+    # The #define lines within the section
+    hashdef_lines: List[Token] = field(repr=False)
+    # The preprocessor symbols in effect at the start of the section
+    symbols: Optional[Mapping] = field(default=None, repr=False)
+
+
+def _section_name(line: Token):
+    if line[:1] not in '[ \t':
+        # Most lines: not a section header
+        return None
+    stripped = line.strip()
+    if stripped.startswith('['):
+        return stripped[1:stripped.find(']')].strip()
+    return None
+
+
+def _index_sections(lines, symbols: Mapping):
+    """Split the preprocessed lines into the file header and section ranges
+
+    symbols: the live preprocessor symbol table. Since lines are streamed,
+    it is snapshotted at the start of each section.
+    """
+    header = []
+    sections = []
+    for line in lines:
+        name = _section_name(line)
+        if name is not None:
+            sections.append(SectionRange(name, line.start_pos, line.end_pos, [], [], dict(symbols)))
+        if not sections:
+            header.append(line)
+            continue
+        section = sections[-1]
+        section.lines.append(line)
+        section.end_pos = line.end_pos
+        if line[:1] == '#' and _HASHDEF_LINE.match(line):
+            section.hashdef_lines.append(line)
+    return header, sections
+
+
+class LazyTsIniFile(TsIniFile):
+    """A TsIniFile that parses & transforms each section the first time it is accessed
+
+    Created by parse_lazy(). Apart from when the work happens, it behaves
+    like the TsIniFile DataClassTransformer produces: e.g. table & curve
+    bins are wired to the Constants, PcVariables & OutputChannels entries
+    they reference (loading those sections as required).
+    """
+    # pylint: disable=too-many-ancestors
+
+    def __init__(self, parser: TsIniParser, header_lines: List[Token], sections: List[SectionRange]):
+        # pylint: disable=super-init-not-called
+        # Deliberately bypass TsIniFile.__init__: nothing is parsed yet
+        self._parser = parser
+        self._header_lines = header_lines
+        self._sections = sections
+        self._file_header = _UNLOADED
+        # The #define symbols in effect at the start of each section,
+        # parsed as they are needed: _defines[i] is for self._sections[i]
+        self._defines: List[Dict] = []
+        self.data = {section.name: _UNLOADED for section in sections}
+
+    @property
+    def file_header(self):
+        if self._file_header is _UNLOADED:
+            self._parse_header()
+        return self._file_header
+
+    @property
+    def section_index(self) -> Dict[str, List[SectionRange]]:
+        """The source ranges of each section, by name"""
+        index = {}
+        for section in self._sections:
+            index.setdefault(section.name, []).append(section)
+        return index
+
+    @property
+    def loaded_sections(self):
+        return [name for name, value in self.data.items() if value is not _UNLOADED]
+
+    def load_all(self):
+        """Load every section not yet loaded, in a single parse"""
+        unloaded = [name for name, value in self.data.items() if value is _UNLOADED]
+        if not unloaded:
+            return
+        file_header, sections = self._parse(self._sections)
+        if self._file_header is _UNLOADED:
+            self._file_header = file_header
+        for name in unloaded:
+            self.data[name] = sections[name]
+        for name in unloaded:
+            self._wire_section(sections[name])
+
+    def __getitem__(self, key):
+        value = self.data[key]
+        if value is _UNLOADED:
+            value = self._load_section(key)
+        return value
+
+    def _load_section(self, name):
+        # Include every #define before the section: later lines may
+        # reference them. If the name is repeated, the last one wins (same
+        # as the eager transform).
+        last_index = max(index for index, section in enumerate(self._sections) if section.name == name)
+        file_header, sections = self._parse(self._sections[:last_index + 1], name)
+        if self._file_header is _UNLOADED:
+            self._file_header = file_header
+
+        section = sections[name]
+        self.data[name] = section
+        self._wire_section(section)
+        return section
+
+    @staticmethod
+    def _transformer(defines: Mapping) -> DataClassTransformer:
+        transformer = DataClassTransformer()
+        transformer._symbols = dict(defines)  # pylint: disable=protected-access
+        return transformer
+
+    def _parse_header(self):
+        # Parses the file header once, for itself & the #defines in it
+        tree = self._parser.parse_pre_processed(self._header_lines + [_PLACEHOLDER])
+        transformer = DataClassTransformer()
+        _, self._file_header = transformer.transform(tree.children[0])
+        self._defines = [transformer._symbols]  # pylint: disable=protected-access
+
+    def _defines_before(self, index: int) -> Dict:
+        """The #define symbols in effect at the start of self._sections[index]
+
+        Each section's #define lines are parsed once, on their own, the
+        first time a later section needs them.
+        """
+        if not self._defines:
+            self._parse_header()
+        while len(self._defines) <= index:
+            defines = self._defines[-1]
+            hashdef_lines = self._sections[len(self._defines) - 1].hashdef_lines
+            if hashdef_lines:
+                transformer = self._transformer(defines)
+                tree = self._parser.parse_pre_processed(hashdef_lines + [_PLACEHOLDER])
+                transformer.transform(tree.children[0])
+                transformer.transform(tree.children[1])
+                defines = transformer._symbols  # pylint: disable=protected-access
+            self._defines.append(defines)
+        return self._defines[index]
+
+    def _parse(self, sections: List[SectionRange], name=None):
+        """Parse the named sections, or every section if name is None
+
+        sections: a prefix of self._sections, except that the last may
+            stand in for a part of itself (see IncrementalTsIniFile)
+
+        Only the lines from the first named section on are parsed: the
+        file header & the #defines before it are cached.
+        """
+        if name is None:
+            lines = list(self._header_lines)
+            first = 0
+        else:
+            lines = []
+            first = next(index for index, section in enumerate(sections) if section.name == name)
+        for section in sections[first:]:
+            lines.extend(section.lines if section.name == name or name is None else section.hashdef_lines)
+
+        tree = self._parser.parse_pre_processed(lines)
+        transformer = DataClassTransformer() if name is None else self._transformer(self._defines_before(first))
+        # Transform the children individually to avoid building (and wiring)
+        # a partial TsIniFile. Order matters: #defines are recorded as they
+        # are transformed.
+        _, file_header = transformer.transform(tree.children[0])
+        _, parsed_sections = transformer.transform(tree.children[1])
+        return file_header if name is None else self.file_header, dict(parsed_sections)
+
+
+def parse_lazy(parser: TsIniParser, parse_source) -> LazyTsIniFile:
+    """Preprocess an INI file & index its sections; parse nothing else yet
+
+    Each section is parsed & transformed the first time it is accessed.
+    E.g.
+        ini_file = parse_lazy(parser, file)
+        ini_file['Constants']  # Only [Constants] is parsed
+    """
+    # The scanner keeps the same lines as the lark backend, in a fraction of
+    # the time
+    lines = parser.pre_process_stream(parse_source, backend='scanner')
+    header_lines, sections = _index_sections(lines, lines.symbols)
+    return LazyTsIniFile(parser, header_lines, sections)
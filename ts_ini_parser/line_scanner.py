@@ -0,0 +1,194 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+from lark import Token
+from .text_io_lexer import TextIoLexer, read_blocks
+from .instrumentation import StageStats
+
+# The content of a passthrough line ends at a comment, outside quotes
+_CONTENT = re.compile(r'(?:[^#;"/]+|/(?!/)|"[^"]*")*')
+# #define lines end at a comment, quoted or not
+_DEFINE_STOP = re.compile(r'[#;]|//')
+_DEFINE = re.compile(r'#[ \t]*define')
+# Directives are lower case, with nothing between the # & the keyword.
+# Longest first: the lexer takes the longest match.
+_DIRECTIVE = re.compile('#(include|ifndef|ifdef|endif|error|unset|elif|else|exit|set|if)')
+_SYMBOL = re.compile(r'[ \t]*([A-Za-z_][A-Za-z0-9_]*)')
+_EXPRESSION = re.compile(r'[ \t]*(!?)[ \t]*([A-Za-z_][A-Za-z0-9_]*)')
+_TAGS = {'if': '_PP_IF_TAG', 'ifdef': '_PP_IFDEF_TAG', 'ifndef': '_PP_IFNDEF_TAG', 'elif': '_ELIF_TAG',
+         'else': '_ELSE_TAG', 'endif': '_ENDIF_TAG', 'set': '_SET_TAG', 'unset': '_UNSET_TAG',
+         'error': '_ERROR_TAG', 'include': '_INCLUDE_TAG', 'exit': 'EXIT_TAG'}
+
+
+class LineScanner:
+    # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """A preprocessor backend that doesn't use the preprocessor grammar
+
+    Passthrough lines are the vast majority: the scanner finds the
+    directives with a single pass over each line & drives a
+    TsIniPreProcessor.PreProcessorTransformer through the same callbacks,
+    in the same (file) order, as the Lark parser would. So the kept lines
+    & the #set/#unset/#error/#exit/#include semantics are the same:
+    the transformer must have a sink.
+
+    The lines are split & their content trimmed exactly as the
+    preprocessor grammar's LINE terminal does. Malformed directives,
+    e.g. an #endif without an #if, raise SyntaxError rather than a Lark
+    exception.
+    """
+
+    def __init__(self, transformer, stats: Optional[StageStats] = None):
+        self._transformer = transformer
+        self._sink = transformer.sink
+        self._tokens = None if stats is None else stats.tokens
+        # Per open #if: whether its #else has been seen
+        self._else_seen: List[bool] = []
+        # The line being scanned
+        self._line = 0
+        self._line_pos = 0
+        self._line_length = 0
+        self._has_newline = False
+        # As the grammar, a file must have at least one line or directive
+        self._empty = True
+
+    def scan(self, parse_source, block_size: int = TextIoLexer.BLOCK_SIZE) -> Iterator[None]:
+        """Preprocess parse_source, yielding after each block of lines
+
+        parse_source: any input TextIoLexer accepts
+        """
+        block_pos = 0
+        for block in read_blocks(parse_source, block_size):
+            self._scan_block(block, block_pos)
+            block_pos += len(block)
+            yield
+        if self._else_seen:
+            self._raise('Unterminated #if', '', self._line_length)
+        if self._empty:
+            self._raise('No lines to preprocess', '')
+
+    def _scan_block(self, block: str, block_pos: int):
+        start = 0
+        while start < len(block):
+            end = block.find('\n', start)
+            self._has_newline = end != -1
+            if not self._has_newline:
+                end = len(block)
+            self._line += 1
+            self._line_pos = block_pos + start
+            self._line_length = end - start
+            self._scan_line(block[start:end], 0)
+            start = end + 1
+
+    def _scan_line(self, text: str, column: int):
+        # column: the 0 based column of text within the line. The rest of
+        # the line after a directive is scanned as a line too.
+        while True:
+            stripped = text.lstrip(' \t')
+            if not stripped:
+                return
+            column += len(text) - len(stripped)
+            if stripped[0] == '#':
+                rest = self._directive(stripped, column)
+                if rest is None:
+                    return
+                text, column = rest
+            elif stripped[0] == ';' or stripped.startswith('//'):
+                return
+            else:
+                self._emit(self._content(stripped, column), column)
+                return
+
+    def _content(self, text: str, column: int) -> str:
+        end = _CONTENT.match(text).end()
+        if text[end:end + 1] == '"':
+            self._raise('Unterminated string', text[end:], column + end)
+        return text[:end].rstrip(' \t')
+
+    def _emit(self, content: str, column: int):
+        if not self._has_newline:
+            self._raise('Expected a line end', content, column)
+        self._empty = False
+        if self._tokens is not None:
+            self._tokens['LINE'] += 1
+        if self._transformer.active:
+            end_pos = self._line_pos + self._line_length + 1
+            self._sink.append(Token('LINE', content + '\n', self._line_pos + column, self._line, column + 1,
+                                    self._line + 1, 1, end_pos))
+
+    def _token(self, type_: str, value: str, column: int) -> Token:
+        return Token(type_, value, self._line_pos + column, self._line, column + 1)
+
+    def _raise(self, message: str, text: str, column: int = 0):
+        raise SyntaxError(message, (self._transformer.parse_source, self._line, column + 1, text))
+
+    def _directive(self, text: str, column: int) -> Optional[Tuple[str, int]]:
+        # pylint: disable=too-many-branches
+        # Returns the rest of the line, which is scanned like a line
+        define = _DEFINE.match(text)
+        if define is not None:
+            body = text[define.end():]
+            stop = _DEFINE_STOP.search(body)
+            body = (body if stop is None else body[:stop.start()]).rstrip(' \t')
+            if body:
+                self._emit(text[:define.end()] + body, column)
+            elif define.end() == len('#define'):
+                self._raise('Expected a #define body', text, column)
+            # Otherwise a '# ...' comment
+            return None
+        if len(text) == 1:
+            self._raise('Expected a directive', text, column)
+        directive = _DIRECTIVE.match(text)
+        if directive is None:
+            # A comment: '# ...', '#!...', '#IF' etc.
+            return None
+
+        keyword = directive.group(1)
+        tag = self._token(_TAGS[keyword], directive.group(), column)
+        self._empty = False
+        if self._tokens is not None:
+            self._tokens[tag.type] += 1
+        if keyword in ('error', 'include'):
+            return self._text_directive(keyword, text, column)
+        self._check_nesting(keyword, text, column)
+        # The terminal callbacks, as the Lark parser calls them on shifting
+        # the tag
+        callback = getattr(self._transformer, tag.type, None)
+        if callback is not None:
+            callback(tag)
+        end = directive.end()
+        if keyword in ('else', 'endif', 'exit'):
+            return text[end:], column + end
+
+        match = (_EXPRESSION if keyword in ('if', 'elif') else _SYMBOL).match(text, end)
+        if match is None:
+            self._raise(f'Expected a symbol after #{keyword}', text, column)
+        symbol = self._token('CNAME', match.group(match.lastindex), column + match.start(match.lastindex))
+        if keyword in ('set', 'unset'):
+            getattr(self._transformer, keyword)([symbol])
+        elif keyword in ('ifdef', 'ifndef'):
+            self._transformer.symbol([symbol])
+        else:
+            negate = [self._token('BANG', '!', column + match.start(1))] if match.group(1) else []
+            self._transformer.expression(negate + [symbol])
+        return text[match.end():], column + match.end()
+
+    def _text_directive(self, keyword: str, text: str, column: int) -> None:
+        # #error & #include take the rest of the line
+        argument = text[len(keyword) + 1:].lstrip(' \t')
+        if not argument:
+            self._raise(f'Expected #{keyword} text', text, column)
+        column += len(text) - len(argument)
+        if keyword == 'error':
+            self._transformer.ERROR_MSG(self._token('ERROR_MSG', argument, column))
+        else:
+            self._transformer.include([self._token('FILE_PATH', argument, column)])
+
+    def _check_nesting(self, keyword: str, text: str, column: int):
+        if keyword in ('if', 'ifdef', 'ifndef'):
+            self._else_seen.append(False)
+        elif keyword in ('elif', 'else', 'endif'):
+            if not self._else_seen or (keyword != 'endif' and self._else_seen[-1]):
+                self._raise(f'Unexpected #{keyword}', text, column)
+            if keyword == 'endif':
+                self._else_seen.pop()
+            elif keyword == 'else':
+                self._else_seen[-1] = True
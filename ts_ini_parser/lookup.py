@@ -0,0 +1,158 @@
+from typing import Any, Mapping, Tuple
+from .dataclasses.ts_ini_file import AxisBin, Curve, Table
+from .optional import import_numpy
+
+
+def _bin_values(axis_bin: AxisBin, values: Mapping[str, Any]):
+    # The decoded values of the variable a bin is wired to (it stays a name
+    # if the INI file doesn't define it)
+    variable = axis_bin.variable
+    name = variable if isinstance(variable, str) else variable.name
+    return import_numpy().asarray(values[name], dtype='f8')
+
+
+def _ascending(bins, table, axis: int) -> Tuple[Any, Any]:
+    # ECU axes ascend. Descending ones are flipped (with the values along
+    # that axis), anything else is an error. A single bin is repeated, so
+    # there is always a bin either side of a point.
+    numpy = import_numpy()
+    if len(bins) == 1:
+        return numpy.repeat(bins, 2), numpy.repeat(table, 2, axis)
+    steps = numpy.diff(bins)
+    if (steps >= 0).all():
+        return bins, table
+    if (steps <= 0).all():
+        return bins[::-1], numpy.flip(table, axis)
+    raise ValueError(f'Axis bins are not in order: {bins}')
+
+
+class _Axis:
+    # pylint: disable=too-few-public-methods
+    """Ascending axis bins, ready for vectorized lookups"""
+
+    # Up to this many bins, finding each point's bins by comparing every
+    # point with every bin beats a binary search
+    SCAN_BINS = 64
+
+    def __init__(self, bins):
+        numpy = import_numpy()
+        self.bins = bins
+        widths = numpy.diff(bins)
+        # Repeated bins have no width, so are a step: a point on the bin
+        # takes the value of the last of them
+        self._inverse_widths = numpy.divide(1.0, widths, out=numpy.zeros_like(widths), where=widths > 0)
+
+    def bracket(self, points) -> Tuple[Any, Any]:
+        """For each point: the index of the bin below it & how far it is
+        to the next bin (0 to 1). Points outside the bins are clamped to
+        the first or last bin."""
+        numpy = import_numpy()
+        bins = self.bins
+        points = numpy.clip(points, bins[0], bins[-1])
+        if len(bins) <= self.SCAN_BINS:
+            # Counted in bytes (fewer to write), then made indices
+            lower = numpy.zeros(points.shape, dtype=numpy.uint8)
+            for edge in bins[1:-1]:
+                lower += points >= edge
+            lower = lower.astype(numpy.intp)
+        else:
+            lower = numpy.clip(numpy.searchsorted(bins, points, side='right') - 1, 0, len(bins) - 2)
+        return lower, (points - bins.take(lower)) * self._inverse_widths.take(lower)
+
+
+class TableLookup:
+    # pylint: disable=too-few-public-methods
+    """Evaluates a [TableEditor] table (a 3D map) at any number of points
+
+    The axes & values are taken once from a decoded tune (see
+    TuneCodec.decode()). Lookups are vectorized, with the ECU's
+    interpolation: bilinear between the 4 surrounding cells & clamped to
+    the edges of the table. E.g.
+        values = TuneCodec(ini_file).decode(pages)
+        ve = TableLookup(ini_file['TableEditor']['veTable1Tbl'], values)
+        ve(log['RPM'], log['MAP'])   # a VE value per row of the log
+
+    The arithmetic is floating point: firmware that interpolates in
+    integers can differ by a rounding step.
+    """
+
+    def __init__(self, table: Table, values: Mapping[str, Any]):
+        """
+        table: the table, wired to its bin variables (as TsIniFile does)
+        values: scaled constant values, {name: value}
+        """
+        numpy = import_numpy()
+        self.table_id = table.table_id
+        z_values = _bin_values(table.zbins, values)
+        if z_values.ndim != 2:
+            raise ValueError(f'{self.table_id}: expected 2D values, got shape {z_values.shape}')
+        # Rows are y, columns x (see PageCodec). Bin arrays can be longer
+        # than the table.
+        rows, columns = z_values.shape
+        x_bins = _bin_values(table.table_xbin, values)[:columns]
+        y_bins = _bin_values(table.table_ybin, values)[:rows]
+        if (len(y_bins), len(x_bins)) != z_values.shape:
+            raise ValueError(f'{self.table_id}: {len(x_bins)} x bins & {len(y_bins)} y bins '
+                             f'for a table of shape {z_values.shape}')
+        self.x_bins, z_values = _ascending(x_bins, z_values, 1)
+        self.y_bins, z_values = _ascending(y_bins, z_values, 0)
+        self.z_values = numpy.ascontiguousarray(z_values)
+        self._x_axis = _Axis(self.x_bins)
+        self._y_axis = _Axis(self.y_bins)
+
+    def __call__(self, x, y):
+        """The table value at each (x, y): numbers or arrays, broadcast
+        against each other. Returns an array of their broadcast shape (a
+        number for numbers)."""
+        numpy = import_numpy()
+        x, y = numpy.broadcast_arrays(numpy.asarray(x, dtype='f8'), numpy.asarray(y, dtype='f8'))
+        column, x_fraction = self._x_axis.bracket(x)
+        row, y_fraction = self._y_axis.bracket(y)
+        # The 4 surrounding cells, by index into the flattened values
+        z_values = self.z_values.reshape(-1)
+        lower_left = row * self.z_values.shape[1] + column
+        upper_left = lower_left + self.z_values.shape[1]
+        lower_row = z_values.take(lower_left)
+        lower_row += (z_values.take(lower_left + 1) - lower_row) * x_fraction
+        upper_row = z_values.take(upper_left)
+        upper_row += (z_values.take(upper_left + 1) - upper_row) * x_fraction
+        result = lower_row + (upper_row - lower_row) * y_fraction
+        return result[()] if result.ndim == 0 else result
+
+
+class CurveLookup:
+    # pylint: disable=too-few-public-methods
+    """Evaluates one line of a [CurveEditor] curve (a 2D map) at any number
+    of points
+
+    Like TableLookup: the bins are taken once from a decoded tune & the
+    lookups are vectorized, interpolating linearly between bins and
+    clamping to the first & last.
+    """
+
+    def __init__(self, curve: Curve, values: Mapping[str, Any], line: int = 0):
+        """
+        curve: the curve, wired to its bin variables (as TsIniFile does)
+        values: scaled constant values, {name: value}
+        line: which of the curve's lines (most have one)
+        """
+        numpy = import_numpy()
+        self.curve_id = curve.curve_id
+        curve_line = curve.lines[line]
+        x_bins = _bin_values(curve_line.xbin, values).reshape(-1)
+        y_values = _bin_values(curve_line.ybin, values).reshape(-1)
+        count = min(len(x_bins), len(y_values))
+        if count == 0:
+            raise ValueError(f'{self.curve_id}: no bins')
+        self.x_bins, y_values = _ascending(x_bins[:count], y_values[:count], 0)
+        self.y_values = numpy.ascontiguousarray(y_values)
+        self._x_axis = _Axis(self.x_bins)
+
+    def __call__(self, x):
+        """The curve value at each x: a number or an array"""
+        numpy = import_numpy()
+        x = numpy.asarray(x, dtype='f8')
+        lower, fraction = self._x_axis.bracket(x)
+        result = self.y_values.take(lower)
+        result += (self.y_values.take(lower + 1) - result) * fraction
+        return result[()] if result.ndim == 0 else result
@@ -0,0 +1,282 @@
+import math
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+from .dataclasses.ts_ini_file import TsIniFile, KeyValuePair, ScalarVariable
+from .codec import _factor
+from .expressions import computed_channels
+from .optional import import_numpy
+
+# TunerStudio binary datalog (.mlg) layout. All values are big endian.
+_MAGIC = b'MLVLG\0'
+# magic, format version, timestamp, info data start (int16 in version 1),
+# data begin index, record length, number of fields
+_HEADERS = {
+    1: struct.Struct('>6shihihh'),
+    2: struct.Struct('>6shiiihh'),
+}
+# type, name, units, display style, scale, transform, digits (+ category in
+# version 2)
+_FIELDS = {
+    1: struct.Struct('>B34s10sbffb'),
+    2: struct.Struct('>B34s10sbffb34s'),
+}
+# Field type code -> NumPy type code. 10-12 are bit fields.
+_FIELD_TYPES = {
+    0: 'u1', 1: 'i1', 2: 'u2', 3: 'i2', 4: 'u4', 5: 'i4', 6: 'i8', 7: 'f4',
+    10: 'u1', 11: 'u2', 12: 'u4',
+}
+_DATA_BLOCK = 0
+_MARKER_BLOCK = 1
+# Block type, counter, timestamp (10us units)
+_BLOCK_HEADER_SIZE = 4
+_MARKER_SIZE = _BLOCK_HEADER_SIZE + 50
+_CRC_SIZE = 1
+
+
+def _text(value: bytes) -> str:
+    return value.split(b'\0', 1)[0].decode('latin-1').strip()
+
+
+class MlgField(NamedTuple):
+    """A field (column) of a binary datalog"""
+    name: str
+    type_code: int
+    units: str
+    display_style: int
+    scale: float
+    transform: float
+    digits: int
+    category: str = ''
+
+    @property
+    def is_bits(self) -> bool:
+        return self.type_code >= 10
+
+    @property
+    def is_float(self) -> bool:
+        return self.type_code == 7
+
+
+class MlgMarker(NamedTuple):
+    """A marker block: a message logged between two rows"""
+    row: int
+    timestamp: int
+    message: str
+
+
+class MlgReader:  # pylint: disable=too-many-instance-attributes
+    """Reads a TunerStudio binary datalog (.mlg) without loading it
+
+    The file is memory mapped & the rows viewed in place through a NumPy
+    structured dtype, so memory use doesn't depend on the log size. Columns
+    are scaled (value = (raw + transform) * scale) a chunk of rows at a time:
+        with MlgReader('log.mlg') as log:
+            for chunk in log.iter_chunks(['RPM', 'MAP']):
+                ...
+
+    Only the selected fields are read from each row.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self._mmap.close()
+            raise
+        self._markers: Optional[List[MlgMarker]] = None
+        self._rows: Optional[int] = None
+
+    def _read_header(self):
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f'{self.path} is not a binary datalog')
+        self.format_version = struct.unpack_from('>h', self._mmap, len(_MAGIC))[0]
+        if self.format_version not in _HEADERS:
+            raise ValueError(f'{self.path}: unsupported datalog format version {self.format_version}')
+        header = _HEADERS[self.format_version]
+        _, _, self.timestamp, _, self._data_begin, self.record_length, field_count = \
+            header.unpack_from(self._mmap, 0)
+        field_struct = _FIELDS[self.format_version]
+        self.fields: List[MlgField] = []
+        offset = header.size
+        for _ in range(field_count):
+            values = field_struct.unpack_from(self._mmap, offset)
+            type_code, name, units, style, scale, transform, digits = values[:7]
+            category = _text(values[7]) if len(values) > 7 else ''
+            self.fields.append(MlgField(_text(name), type_code, _text(units), style, scale, transform, digits,
+                                        category))
+            offset += field_struct.size
+
+        self._block_size = _BLOCK_HEADER_SIZE + self.record_length + _CRC_SIZE
+        self.dtype = self._block_dtype()
+
+    def _block_dtype(self):
+        # A data block, including the header & CRC so rows can be strided over
+        names, formats, offsets = ['block_type'], ['u1'], [0]
+        field_offset = _BLOCK_HEADER_SIZE
+        for field in self.fields:
+            if field.type_code not in _FIELD_TYPES:
+                raise ValueError(f'{self.path}: field {field.name} has unknown type {field.type_code}')
+            names.append(field.name)
+            formats.append('>' + _FIELD_TYPES[field.type_code])
+            offsets.append(field_offset)
+            field_offset += int(formats[-1][-1])
+        if field_offset - _BLOCK_HEADER_SIZE != self.record_length:
+            raise ValueError(f'{self.path}: the fields are {field_offset - _BLOCK_HEADER_SIZE} bytes, '
+                             f'the record length is {self.record_length}')
+        return import_numpy().dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                                     'itemsize': self._block_size})
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def names(self) -> List[str]:
+        return [field.name for field in self.fields]
+
+    def field(self, name: str) -> MlgField:
+        for field in self.fields:
+            if field.name == name:
+                return field
+        raise KeyError(name)
+
+    @property
+    def markers(self) -> List[MlgMarker]:
+        """The marker blocks. Scans the whole file the first time."""
+        if self._markers is None:
+            self._scan()
+        return self._markers
+
+    def __len__(self):
+        """The number of rows. Scans the whole file the first time."""
+        if self._rows is None:
+            self._scan()
+        return self._rows
+
+    def _scan(self):
+        # Counts the rows & finds the markers
+        for _ in self._runs():
+            pass
+
+    def _runs(self, rows: int = 16384) -> Iterator[tuple]:
+        """(offset, row count) for each run of at most rows data blocks
+
+        Data blocks are the same size, so a run can be viewed as an array.
+        Marker blocks separate the runs. Once every run is read, the markers
+        & row count are kept.
+        """
+        numpy = import_numpy()
+        markers = []
+        row = 0
+        position = self._data_begin
+        end = len(self._mmap)
+        while True:
+            count = min((end - position) // self._block_size, rows)
+            if count > 0:
+                block_types = numpy.frombuffer(self._mmap, self.dtype, count, position)['block_type']
+                others = numpy.flatnonzero(block_types != _DATA_BLOCK)
+                data_count = int(others[0]) if len(others) else count
+                if data_count:
+                    yield position, data_count
+                    position += data_count * self._block_size
+                    row += data_count
+                    continue
+            if position + _MARKER_SIZE > end or self._mmap[position] != _MARKER_BLOCK:
+                # The end of the file, or a partly written block
+                break
+            _, _, timestamp, message = struct.unpack_from('>BBH50s', self._mmap, position)
+            markers.append(MlgMarker(row, timestamp, _text(message)))
+            position += _MARKER_SIZE
+        self._markers = markers
+        self._rows = row
+
+    def iter_chunks(self, names: Optional[Iterable[str]] = None, rows: int = 16384,
+                    scaled: bool = True) -> Iterator[Dict[str, object]]:
+        """The columns of the fields, up to rows rows at a time: {name: array}
+
+        names: the fields to read. Defaults to all.
+        scaled: False for the raw values
+        """
+        numpy = import_numpy()
+        fields = self.fields if names is None else [self.field(name) for name in names]
+        for position, count in self._runs(rows):
+            blocks = numpy.frombuffer(self._mmap, self.dtype, count, position)
+            chunk = {}
+            for field in fields:
+                raw = blocks[field.name]
+                if not scaled or field.is_bits:
+                    chunk[field.name] = raw.copy()
+                else:
+                    chunk[field.name] = (raw.astype(numpy.float64) + field.transform) * field.scale
+            yield chunk
+
+    def read(self, names: Optional[Iterable[str]] = None, scaled: bool = True) -> Dict[str, object]:
+        """The whole columns of the fields (see iter_chunks())"""
+        numpy = import_numpy()
+        names = self.names if names is None else list(names)
+        chunks = list(self.iter_chunks(names, scaled=scaled))
+        if not chunks:
+            return {name: numpy.empty(0) for name in names}
+        return {name: numpy.concatenate([chunk[name] for chunk in chunks]) for name in names}
+
+    def channels(self, ini_file: TsIniFile) -> Dict[str, str]:
+        """The [OutputChannels] channel each field logs: {field name: channel}
+
+        Fields are matched by their [Datalog] label, or else by channel
+        name. Fields without a channel are left out.
+        """
+        known = set(ini_file.get('OutputChannels', {})) | set(computed_channels(ini_file))
+        labels = {label: channel for channel, label, _ in _datalog_entries(ini_file)}
+        channels = {}
+        for field in self.fields:
+            channel = labels.get(field.name, field.name)
+            if channel in known:
+                channels[field.name] = channel
+        return channels
+
+    def check(self, ini_file: TsIniFile) -> List[str]:
+        """Check the field descriptors against the INI file
+
+        Returns the problems found: fields that aren't an [OutputChannels]
+        channel, fields whose type differs from their [Datalog] entry (int or
+        float) & integer fields scaled differently from their channel.
+        """
+        problems = []
+        channels = self.channels(ini_file)
+        output_channels = ini_file.get('OutputChannels', {})
+        types = {label: data_type for _, label, data_type in _datalog_entries(ini_file)}
+        for field in self.fields:
+            if field.name not in channels:
+                problems.append(f'{field.name}: no such channel')
+                continue
+            data_type = types.get(field.name)
+            if data_type == 'float' and not field.is_float or data_type == 'int' and field.is_float:
+                problems.append(f'{field.name}: logged as {_FIELD_TYPES[field.type_code]}, '
+                                f'the [Datalog] type is {data_type}')
+            channel = output_channels.get(channels[field.name])
+            if not field.is_float and isinstance(channel, ScalarVariable):
+                scale, translate = _factor(channel.scale, 1.0), _factor(channel.translate, 0.0)
+                if not isinstance(scale, str) and not math.isclose(field.scale, scale, rel_tol=1e-6) or \
+                        not isinstance(translate, str) and not math.isclose(field.transform, translate, abs_tol=1e-6):
+                    problems.append(f'{field.name}: scaled by ({field.transform}, {field.scale}), '
+                                    f'the channel by ({translate}, {scale})')
+        return problems
+
+
+def _datalog_entries(ini_file: TsIniFile) -> Iterator[tuple]:
+    # (channel, label, data type) for each [Datalog] entry
+    for line in ini_file.get('Datalog', []):
+        if isinstance(line, KeyValuePair) and line.name == 'entry' and len(line.values) >= 3:
+            channel, label, data_type = (value[1] if isinstance(value, tuple) else value
+                                         for value in line.values[:3])
+            yield channel, label, data_type
@@ -0,0 +1,123 @@
+from collections import Counter
+from typing import Any, Dict, List
+from .dataclasses.ts_ini_file import Axis, BitSize, MatrixDimensions, Page, _slot_names
+
+# Immutable in practice: nothing in the library changes them once built.
+# AxisBin isn't one of them: TsIniFile wires it to the file's own variables.
+_VALUE_TYPES = frozenset((tuple, list, BitSize, MatrixDimensions, Axis))
+_ATOMS = frozenset((str, int, float, bool, type(None)))
+
+
+def _content_key(value) -> Any:
+    # A hashable key that is only equal for values with the same content
+    # and types (1 == 1.0 == True, but they are different values). Raises
+    # TypeError unless the value is plain values & value objects all the
+    # way down.
+    cls = type(value)
+    if cls in _ATOMS or isinstance(value, (str, int, float)):
+        return (cls, value)
+    if cls is tuple or cls is list:
+        return (cls,) + tuple(_content_key(item) for item in value)
+    if cls in _VALUE_TYPES:
+        return (cls,) + tuple(_content_key(getattr(value, name)) for name in _slot_names(cls))
+    raise TypeError(f'{cls.__name__} has no content key')
+
+
+def _page_key(page: Page) -> Any:
+    # The variables' field values are pooled by the time the page is built,
+    # so equal values are the same object: compare them by identity. An
+    # unpooled value (e.g. a list that isn't shareable) only matches
+    # itself, so at worst an identical page isn't shared.
+    key = [page.page_num]
+    for name, variable in page.items():
+        key.append(name)
+        key.append(type(variable))
+        for field_name in _slot_names(type(variable)):
+            value = getattr(variable, field_name, None)
+            key.append((type(value), value) if type(value) in _ATOMS else id(value))
+    return tuple(key)
+
+
+class ModelPool:
+    """Shares identical model values between the INI files loaded with it
+
+    Pass one to DataClassTransformer or TsIniParser.parse_model() for every
+    file that will be kept resident, e.g. all the revisions of a firmware.
+    The files then share:
+
+      - strings (names, units, labels...);
+      - value objects: BitSize, MatrixDimensions, Axis and the tuples &
+        lists of plain values (e.g. unknown_values, ('number_field', 1.0));
+      - whole Constants pages, if every variable on the page is the same.
+
+    AxisBins (and so tables & curves) aren't shared: they are wired to the
+    file's own variables. A shared object belongs to several files, so
+    treat pooled models as read-only.
+    """
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._values: Dict[Any, Any] = {}
+        # {hash of the page key: [pages]}. The keys of whole pages are big,
+        # so they aren't kept.
+        self._pages: Dict[int, List[Page]] = {}
+        self.hits = Counter()
+
+    def __len__(self):
+        return len(self._strings) + len(self._values) + sum(len(pages) for pages in self._pages.values())
+
+    def string(self, value: str) -> str:
+        """The pooled copy of the string"""
+        pooled = self._strings.setdefault(value, value)
+        if pooled is not value:
+            self.hits['string'] += 1
+        return pooled
+
+    def value(self, value):
+        """The pooled copy of a value object, tuple or list. Anything else
+        (e.g. a list holding variables) is returned as it is."""
+        cls = type(value)
+        if cls is str:
+            return self.string(value)
+        if cls not in _VALUE_TYPES:
+            return value
+        try:
+            key = _content_key(value)
+        except TypeError:
+            return value
+        if (cls is tuple or cls is list) and any(type(item) in _VALUE_TYPES for item in value):
+            items = [self.value(item) for item in value]
+            if cls is tuple:
+                value = tuple(items)
+            else:
+                value[:] = items
+        pooled = self._values.setdefault(key, value)
+        if pooled is not value:
+            self.hits['value'] += 1
+        return pooled
+
+    def fields(self, entry):
+        """Pool the field values of a model object (e.g. a variable) in place"""
+        for name in _slot_names(type(entry)):
+            value = getattr(entry, name, None)
+            pooled = self.value(value)
+            if pooled is not value:
+                setattr(entry, name, pooled)
+        return entry
+
+    def page(self, page: Page) -> Page:
+        """The pooled page with the same variables, or this page"""
+        key = _page_key(page)
+        candidates = self._pages.setdefault(hash(key), [])
+        for candidate in candidates:
+            if _page_key(candidate) == key:
+                self.hits['page'] += 1
+                return candidate
+        candidates.append(page)
+        return page
+
+    def clear(self):
+        self._strings.clear()
+        self._values.clear()
+        self._pages.clear()
+        self.hits.clear()
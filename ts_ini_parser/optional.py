@@ -0,0 +1,12 @@
+def import_numpy():
+    """The numpy module, imported on first use
+
+    NumPy is an optional dependency: only the vectorized features (the
+    codecs, vectorized expressions, datalogs & lookups) need it, so it is
+    imported when they are used rather than with the package.
+    """
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise ImportError('This needs NumPy: pip install TsIniParser[numpy]') from error
+    return numpy
@@ -0,0 +1,219 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+from typing import Mapping, Optional
+import lark
+from lark import Tree
+from .version import __version__
+from .ts_ini_parser import TsIniParser
+from .dataclasses.data_class_transformer import DataClassTransformer
+from .dataclasses.ts_ini_file import TsIniFile
+
+_GRAMMAR_FOLDER = Path(__file__).parent / 'grammars'
+_MODEL_FOLDER = Path(__file__).parent / 'dataclasses'
+_INI_SUFFIX = '.ini.pickle'
+_TREE_SUFFIX = '.tree.pickle'
+_SYMBOLS_SUFFIX = '.symbols.json'
+
+
+def _environment_fingerprint() -> str:
+    """Anything that changes the parse output (or the pickle format)
+    must invalidate the cache"""
+    digest = hashlib.sha256()
+    digest.update(__version__.encode('utf-8'))
+    digest.update(lark.__version__.encode('utf-8'))
+    digest.update(str(sys.version_info[:2]).encode('utf-8'))
+    for grammar in sorted(_GRAMMAR_FOLDER.glob('*.lark')):
+        digest.update(grammar.read_bytes())
+    # The pickled model classes & the transform that builds them: the
+    # whole dataclasses package
+    for source in sorted(_MODEL_FOLDER.rglob('*.py')):
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Opt-in on-disk cache of parsed INI files
+
+    Entries are keyed on:
+      * The INI file content
+      * The preprocessor symbols the file tests (#if, #ifdef etc.) that
+        are defined: in defines, if passed, or else the parser's. Defining a symbol the file never tests will not cause
+        a cache miss.
+      * The path, modification time & size of each file it #includes
+      * The library version, Lark version, grammars & model classes
+
+    Once the cache is larger than max_size bytes, the least recently used
+    entries are deleted.
+
+    E.g.
+        cache = ParseCache('~/.cache/ts_ini_parser')
+        parser = TsIniParser()
+        parser.define('LAMBDA', True)
+        with open('speeduino.ini', 'r') as file:
+            ini_file = cache.load(parser, file)
+    """
+
+    def __init__(self, cache_dir, max_size: int = 256 * 1024 * 1024, keep_tree: bool = False):
+        """
+        cache_dir: folder to store cache entries in. Created if needed.
+        max_size: maximum size of the cache folder in bytes
+        keep_tree: also cache the Lark tree (see load_tree())
+        """
+        self._cache_dir = Path(cache_dir).expanduser()
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+        self._keep_tree = keep_tree
+        self._fingerprint = _environment_fingerprint()
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir
+
+    def load(self, parser: TsIniParser, parse_source, defines: Optional[Mapping] = None) -> TsIniFile:
+        """Equivalent of DataClassTransformer().transform(parser.parse(parse_source, defines))"""
+        return self._load(parser, parse_source, _INI_SUFFIX, defines)
+
+    def load_tree(self, parser: TsIniParser, parse_source, defines: Optional[Mapping] = None) -> Tree:
+        """Equivalent of parser.parse(parse_source, defines)
+
+        Only cached if the cache was created with keep_tree=True
+        """
+        return self._load(parser, parse_source, _TREE_SUFFIX, defines)
+
+    def clear(self):
+        for entry in self._entries():
+            entry.unlink()
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes"""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _load(self, parser: TsIniParser, parse_source, suffix: str, defines: Optional[Mapping] = None):
+        text = parse_source.read()
+        source_key = self._source_key(parser, text)
+        # Taken before parsing: the key must describe the symbols the file
+        # is parsed with, not what #set/#unset leave behind
+        symbols = dict(parser.symbols if defines is None else defines)
+
+        entry_key = self._entry_key(symbols, source_key)
+        if entry_key:
+            cached = self._read_entry(entry_key + suffix)
+            if cached is not None:
+                return cached
+
+        source = io.StringIO(text)
+        # Keep the name: #include files are found relative to it
+        source.name = getattr(parse_source, 'name', None)
+        # The tested symbols & includes of this run: the parser's are those
+        # of whichever parse finished last, maybe on another thread
+        stream = parser.pre_process_stream(source, symbols)
+        tree = parser.parse_pre_processed(stream)
+        ini_file = DataClassTransformer().transform(tree) if suffix == _INI_SUFFIX or self._keep_tree else None
+
+        self._write_json(source_key + _SYMBOLS_SUFFIX, {'symbols': sorted(stream.tested_symbols),
+                                                        'includes': sorted(str(path) for path in stream.included)})
+        entry_key = self._entry_key(symbols, source_key)
+        if ini_file is not None:
+            self._write_entry(entry_key + _INI_SUFFIX, ini_file)
+        if self._keep_tree:
+            self._write_entry(entry_key + _TREE_SUFFIX, tree)
+        self._evict()
+
+        return ini_file if suffix == _INI_SUFFIX else tree
+
+    def _source_key(self, parser: TsIniParser, text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(self._fingerprint.encode('utf-8'))
+        digest.update(b'1' if parser.ignore_hash_error else b'0')
+        digest.update(repr(parser.include_paths).encode('utf-8'))
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _entry_key(self, symbols: Mapping, source_key: str) -> Optional[str]:
+        # The preprocessor only tests whether a symbol is defined, so the
+        # defined subset of the tested symbols fully determines the output.
+        tested = self._read_json(source_key + _SYMBOLS_SUFFIX)
+        if tested is None:
+            return None
+        defined = [symbol for symbol in tested['symbols'] if symbol in symbols]
+        digest = hashlib.sha256(source_key.encode('utf-8'))
+        digest.update(json.dumps(defined).encode('utf-8'))
+        for include in tested['includes']:
+            try:
+                stat = os.stat(include)
+                digest.update(f'{include}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8'))
+            except OSError:
+                digest.update(f'{include}:missing'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entries(self):
+        return (entry for entry in self._cache_dir.iterdir()
+                if entry.name.endswith((_INI_SUFFIX, _TREE_SUFFIX, _SYMBOLS_SUFFIX)))
+
+    def _touch(self, path: Path):
+        # The file modification time drives LRU eviction
+        os.utime(path)
+
+    def _read_entry(self, name: str):
+        path = self._cache_dir / name
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:  # pylint: disable=broad-except
+            # Corrupt or incompatible entry: treat as a miss
+            path.unlink(missing_ok=True)
+            return None
+        self._touch(path)
+        return value
+
+    def _write_entry(self, name: str, value):
+        self._write_atomic(name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _read_json(self, name: str):
+        path = self._cache_dir / name
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                value = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(path)
+        return value
+
+    def _write_json(self, name: str, value):
+        self._write_atomic(name, json.dumps(value).encode('utf-8'))
+
+    def _write_atomic(self, name: str, data: bytes):
+        # Write to a temporary file & rename, so concurrent readers never
+        # see a partial entry
+        handle, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self._cache_dir / name)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def _evict(self):
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self._max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,86 @@
+from pathlib import Path
+from typing import Callable, Optional
+from lark import Transformer
+from lark.lexer import Lexer, LexerThread
+from lark.parsers.lalr_parser import LALR_Parser, _Parser
+from .grammar_cache import open_grammar
+from .instrumentation import StageStats
+
+
+class _CountingLexer:
+    """Counts the tokens a lexer yields, by terminal type"""
+
+    def __init__(self, lexer: Lexer, stats: StageStats):
+        self._lexer = lexer
+        self._stats = stats
+
+    def make_lexer_state(self, text):
+        return self._lexer.make_lexer_state(text)
+
+    def lex(self, lexer_state, parser_state):
+        return self._stats.counted(self._lexer.lex(lexer_state, parser_state))
+
+
+class SharedParser:
+    """A LALR parser that any number of parses can run through at once
+
+    Lark binds the transformer callbacks & the lexer to the Lark object, so
+    one Lark object can't run concurrent (or interleaved) parses if either
+    keeps per parse state. Here every parse gets its own callbacks, bound to
+    its own transformer, and its own lexer adapter around the shared lexer.
+    The grammar, parse table & compiled terminals are built once & shared.
+
+    lexer_adapter: wraps the shared lexer for each parse (e.g. TextIoLexer)
+    transformer: the default transformer. Only pass one that keeps no state,
+        since it is shared by all the parses that don't pass their own.
+
+    Pass stats (StageStats) to a parse to record its rule callbacks &
+    tokens: the callbacks are only wrapped for that parse.
+    """
+
+    def __init__(self, grammar: Path, lexer_adapter: Callable[[Lexer], Lexer],
+                 transformer: Optional[Transformer] = None, **options):
+        self._lark = open_grammar(grammar, **options)
+        self._lexer = self._lark.parser.lexer
+        self._parse_table = self._lark.parser.parser._parse_table  # pylint: disable=protected-access
+        self._lexer_adapter = lexer_adapter
+        self._transformer = transformer
+        self._default = self._lark.parser.parser if transformer is None else self._bind(transformer)
+
+    def _bind(self, transformer: Optional[Transformer], stats: Optional[StageStats] = None) -> LALR_Parser:
+        """A parser over the shared tables, calling back into the transformer"""
+        # pylint: disable=protected-access
+        callbacks = self._lark._parse_tree_builder.create_callback(transformer)
+        if stats is not None:
+            callbacks = {rule: stats.timed(rule.alias or rule.origin.name, callback)
+                         for rule, callback in callbacks.items()}
+        # Terminal callbacks run as each token is shifted
+        for terminal in self._lark.terminals:
+            callback = getattr(transformer, terminal.name, None)
+            if callback is not None:
+                callbacks[terminal.name] = callback
+        parser = LALR_Parser.__new__(LALR_Parser)
+        parser._parse_table = self._parse_table
+        parser.parser = _Parser(self._parse_table, callbacks)
+        return parser
+
+    def _prepare(self, text, transformer: Optional[Transformer], start, stats: Optional[StageStats]):
+        lexer = self._lexer_adapter(self._lexer)
+        if stats is None:
+            parser = self._default if transformer is None else self._bind(transformer)
+        else:
+            parser = self._bind(self._transformer if transformer is None else transformer, stats)
+            lexer = _CountingLexer(lexer, stats)
+        start = self._lark.parser._verify_start(start)  # pylint: disable=protected-access
+        return parser, LexerThread(lexer, text), start
+
+    def parse(self, text, transformer: Optional[Transformer] = None, start=None, on_error=None,
+              stats: Optional[StageStats] = None):
+        # pylint: disable=too-many-arguments
+        parser, lexer, start = self._prepare(text, transformer, start, stats)
+        return parser.parse(lexer, start, on_error=on_error)
+
+    def parse_interactive(self, text, transformer: Optional[Transformer] = None, start=None,
+                          stats: Optional[StageStats] = None):
+        parser, lexer, start = self._prepare(text, transformer, start, stats)
+        return parser.parse_interactive(lexer, start)
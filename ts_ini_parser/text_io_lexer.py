@@ -1,29 +1,51 @@
+import mmap
 from contextlib import suppress
-from io import TextIOBase
+from typing import Iterator
 from lark.lexer import Lexer
 
+# TunerStudio INI files are 8-bit text; bytes are decoded as this
+BYTES_ENCODING = 'latin-1'
+
+
+def _normalize_newlines(text: str) -> str:
+    # Universal newlines, as when reading a file in text mode
+    return text.replace('\r\n', '\n').replace('\r', '\n') if '\r' in text else text
+
 
 class TextIoLexer(Lexer):
+    """Lexes a text stream, feeding the inner lexer a block at a time
+
+    Restarting the inner lexer is relatively expensive, so it is fed blocks
+    of about block_size characters, each ending at a line end (no token
+    spans lines, other than whitespace). block_size=0 feeds it a line at a
+    time.
+
+    The input can be a text stream (anything with read() & readline()), a
+    str or bytes, a binary file or a memory mapped file (mmap). Bytes are
+    decoded as latin-1 with universal newlines.
+    """
 
     __future_interface__ = True
+    BLOCK_SIZE = 64 * 1024
 
-    def __init__(self, inner_lexer: Lexer):
+    def __init__(self, inner_lexer: Lexer, block_size: int = BLOCK_SIZE):
         self._inner_lexer = inner_lexer
-        self._input = None
+        self._block_size = block_size
+        self._blocks = None
         self._char_offset = 0
 
     def lex(self, lexer_state, parser_state):
         # pylint: disable=stop-iteration-return
-        while self._feed_next_line(lexer_state):
+        while self._feed_next_block(lexer_state):
             with suppress(StopIteration):
                 inner_tokenizer = self._inner_lexer.lex(lexer_state,
                                                         parser_state)
                 while True:
                     yield self._adjust_token_pos(next(inner_tokenizer))
 
-    def _feed_next_line(self, lexer_state):
+    def _feed_next_block(self, lexer_state):
         self._char_offset += lexer_state.line_ctr.char_pos
-        lexer_state.text = self._input.readline()
+        lexer_state.text = next(self._blocks, '')
         lexer_state.line_ctr.char_pos = 0
         lexer_state.line_ctr.column = 1
         lexer_state.line_ctr.line_start_pos = 0
@@ -34,8 +56,59 @@ class TextIoLexer(Lexer):
         token.end_pos = token.end_pos + self._char_offset
         return token
 
-    def make_lexer_state(self, text: TextIOBase):
-        self._input = text
+    def make_lexer_state(self, text):
+        self._blocks = self._read_blocks(text)
         state = self._inner_lexer.make_lexer_state('')
         self._char_offset = state.line_ctr.char_pos
         return state
+
+    def _read_blocks(self, source) -> Iterator[str]:
+        if isinstance(source, str):
+            yield from self._split_text(source)
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            # An mmap is also a stream, but read it in place: from the start
+            with memoryview(source) as view, view.cast('B') as data:
+                yield from self._split_bytes(data)
+        else:
+            yield from self._read_stream(source)
+
+    def _read_stream(self, stream) -> Iterator[str]:
+        while True:
+            if self._block_size:
+                block = stream.read(self._block_size)
+                # Finish the line
+                if block[-1:] not in ('\n', b'\n', '', b''):
+                    block += stream.readline()
+            else:
+                block = stream.readline()
+            if not block:
+                return
+            yield _normalize_newlines(block.decode(BYTES_ENCODING)) if isinstance(block, bytes) else block
+
+    def _split_text(self, text: str) -> Iterator[str]:
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + max(self._block_size - 1, 0))
+            end = len(text) if end == -1 else end + 1
+            yield text[start:end]
+            start = end
+
+    def _split_bytes(self, data: memoryview) -> Iterator[str]:
+        # bytes.find() needs a bytes-like object with find(): use the source
+        # object's if it has one (bytes, mmap) to avoid copying.
+        find = getattr(data.obj, 'find', None) or bytes(data).find
+        start = 0
+        while start < len(data):
+            end = find(b'\n', start + max(self._block_size - 1, 0))
+            end = len(data) if end == -1 else end + 1
+            yield _normalize_newlines(str(data[start:end], BYTES_ENCODING))
+            start = end
+
+
+def read_blocks(source, block_size: int = TextIoLexer.BLOCK_SIZE) -> Iterator[str]:
+    """The text of source in blocks of about block_size characters, each ending at a line end
+
+    source: any input TextIoLexer accepts
+    """
+    # pylint: disable=protected-access
+    return TextIoLexer(None, block_size)._read_blocks(source)
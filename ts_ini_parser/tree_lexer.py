@@ -1,7 +1,9 @@
 from contextlib import suppress
-from typing import Iterable
-from lark.lexer import Lexer, Token, LineCounter
+from typing import Iterable, Union
+from lark.lexer import Lexer, Token
+from lark.exceptions import UnexpectedInput
 from lark import Tree
+from .includes import IncludedToken, note_source
 
 
 class TokenLexerAdapter(Lexer):
@@ -11,6 +13,7 @@ class TokenLexerAdapter(Lexer):
         self._inner_lexer = inner_lexer
         self._input_tokens = None
         self._cur_input_token = None
+        self._cur_source = None
 
     def lex(self, lexer_state, parser_state):
         # pylint: disable=stop-iteration-return
@@ -18,34 +21,47 @@ class TokenLexerAdapter(Lexer):
             with suppress(StopIteration):
                 inner_tokenizer = self._inner_lexer.lex(lexer_state,
                                                         parser_state)
-                while True:
-                    yield self._adjust_token_pos(next(inner_tokenizer))
+                try:
+                    while True:
+                        yield self._adjust_token_pos(next(inner_tokenizer))
+                except UnexpectedInput as error:
+                    note_source(error, self._cur_source)
+                    raise
 
     def make_lexer_state(self, text: Iterable[Token]):
-        self._input_tokens = text
+        self._input_tokens = iter(text)
         return self._inner_lexer.make_lexer_state("")
 
     def _feed_next_input_token(self, lexer_state):
         try:
             self._cur_input_token = next(self._input_tokens)
-            lexer_state.text = self._cur_input_token.value
-            lexer_state.line_ctr = LineCounter('\n')
-            lexer_state.line_ctr.line = self._cur_input_token.line
-            return True
         except StopIteration:
             return False
+        self._cur_source = getattr(self._cur_input_token, 'source', None)
+        lexer_state.text = self._cur_input_token.value
+        # Rewind the line counter rather than allocate a new one per token
+        line_ctr = lexer_state.line_ctr
+        line_ctr.char_pos = 0
+        line_ctr.line = self._cur_input_token.line
+        line_ctr.column = 1
+        line_ctr.line_start_pos = 0
+        return True
 
     def _adjust_token_pos(self, token):
         token.start_pos = token.start_pos + self._cur_input_token.start_pos
         token.end_pos = token.end_pos + self._cur_input_token.start_pos
         token.column = token.column + self._cur_input_token.column - 1
         token.end_column = token.end_column + self._cur_input_token.column - 1
+        if self._cur_source is not None:
+            return IncludedToken.borrow(token, self._cur_source)
         return token
 
 
 class TreeLexerAdapter(TokenLexerAdapter):
+    """Lexes either a Tree (all tokens, in order) or an iterable of tokens"""
     __future_interface__ = True
 
-    def make_lexer_state(self, text: Tree):
-        return super().make_lexer_state(
-                            text.scan_values(lambda v: isinstance(v, Token)))
+    def make_lexer_state(self, text: Union[Tree, Iterable[Token]]):
+        if isinstance(text, Tree):
+            text = text.scan_values(lambda v: isinstance(v, Token))
+        return super().make_lexer_state(text)
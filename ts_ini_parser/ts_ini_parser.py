@@ -1,10 +1,17 @@
 from pathlib import Path
-from lark import Lark, Tree, Transformer
-from .ts_ini_preprocessor import TsIniPreProcessor
+from typing import Iterable, Mapping, Optional, Union
+from lark import Tree, Token, Transformer
+from lark.exceptions import UnexpectedInput
+from .ts_ini_preprocessor import TsIniPreProcessor, PreProcessStream
 from .tree_lexer import TreeLexerAdapter
+from .includes import IncludedFile, note_source
+from .shared_parser import SharedParser
+from .dataclasses.data_class_transformer import DataClassTransformer
+from .dataclasses.ts_ini_file import TsIniFile
+from .instrumentation import ParseStats
+from .model_pool import ModelPool
 
 _GRAMMAR = Path(__file__).parent / 'grammars' / 'ts_ini.lark'
-_GRAMMAR_CACHE = _GRAMMAR.with_suffix('.lark.cache')
 
 
 class TsIniParser:
@@ -16,6 +23,11 @@ class TsIniParser:
      there must be a blank line at the end
      Expression markers ("{", "}") and parentheses must be balanced
      All identifiers must be cnames (no spaces, quotes etc.)
+
+    One instance can parse several files at once, e.g. serve a thread pool:
+    the grammar tables are shared & each parse has its own lexer and
+    preprocessor symbols. Pass defines to parse() rather than calling
+    define() while other threads are parsing.
     """
 
     class TransformTerminals(Transformer):
@@ -39,14 +51,66 @@ class TsIniParser:
         KVP_ARRAY_TAG = _extract_key
         KVP_STRING_TAG = _extract_key
 
-    def __init__(self, ignore_hash_error: bool = False):
-        self._pre_processor = TsIniPreProcessor(ignore_hash_error)
-        self._ts_parser = Lark.open(_GRAMMAR,
-                                    parser='lalr',
-                                    cache=str(_GRAMMAR_CACHE),
-                                    transformer=TsIniParser.TransformTerminals())
+    class InlineDataClassTransformer:
+        # pylint: disable=protected-access,too-few-public-methods
+        """Runs DataClassTransformer as the parser reduces each rule
+
+        Passed to the parser in place of a transformer: no Tree is built.
+        Transformer.transform() does some work between a rule's children
+        and its callback (token values, Discard, #define expansion). The
+        parser doesn't, so each callback here does it first. One instance
+        per parse: the #define symbols are per file.
+        """
+
+        def __init__(self, stats: Optional[ParseStats] = None, pool: Optional[ModelPool] = None):
+            self._transformer = DataClassTransformer(stats=stats, pool=pool)
+            self._terminals = TsIniParser.TransformTerminals()
+
+        def __getattr__(self, name):
+            # Only called for the grammar's rule & terminal names
+            if name.lstrip('_')[:1].isupper():
+                return self._terminal_callback(getattr(self._terminals, name, None))
+            if name.startswith('_'):
+                # Inlined into the parent rule by the parser: keep it a Tree
+                raise AttributeError(name)
+            return self._rule_callback(name, getattr(self._transformer, name, None))
+
+        def _terminal_callback(self, transform_terminal):
+            default_token = self._transformer.__default_token__
+            if transform_terminal is None:
+                return default_token
+            return lambda token: default_token(transform_terminal(token))
+
+        def _rule_callback(self, name, method):
+            transformer = self._transformer
+
+            def callback(children):
+                children = list(transformer._transform_children(children))
+                if method is None:
+                    return transformer.__default__(name, children, None)
+                wrapper = getattr(method, 'visit_wrapper', None)
+                if wrapper is None:
+                    return method(children)
+                return wrapper(method, name, children, None)
+            return callback
+
+    def __init__(self, ignore_hash_error: bool = False, streaming: bool = False,
+                 include_paths: Optional[Iterable[Union[str, Path]]] = None, pre_processor_backend: str = 'lark'):
+        """
+        streaming: feed lines into the parser as the preprocessor keeps them,
+            rather than preprocessing the whole file into a Tree first.
+            Same result, lower peak memory.
+        include_paths: the folders to search for #include files, after the
+            including file's folder (when parsing a file). None skips
+            #include lines.
+        pre_processor_backend: 'lark' or 'scanner' (faster, same result).
+            See TsIniPreProcessor.
+        """
+        self._streaming = streaming
+        self._pre_processor = TsIniPreProcessor(ignore_hash_error, include_paths=include_paths,
+                                                backend=pre_processor_backend)
         # Adapt the parser lexer to consume the preprocessor output (a Tree)
-        self._ts_parser.parser.lexer = TreeLexerAdapter(self._ts_parser.parser.lexer)
+        self._ts_parser = SharedParser(_GRAMMAR, TreeLexerAdapter, transformer=TsIniParser.TransformTerminals())
 
     def define(self, symbol: str, value):
         """Define a preprocessor symbol to control preprocessing condtionals
@@ -55,13 +119,125 @@ class TsIniParser:
           #set CAN_COMMANDS
         becomes
           define('CAN_COMMANDS', True)
+
+        These are the symbols parse() uses when it isn't passed defines.
+        #set/#unset in a file don't change them.
         """
 
         self._pre_processor.define(symbol, value)
 
+    def undefine(self, symbol: str):
+        """Remove a preprocessor symbol
+
+        Equivalent of #unset in the INI file.
+        """
+
+        self._pre_processor.undefine(symbol)
+
+    @property
+    def symbols(self):
+        """The currently defined preprocessor symbols (read only)"""
+        return self._pre_processor.symbols
+
+    @property
+    def tested_symbols(self):
+        """The preprocessor symbols tested by the last parse to finish"""
+        return self._pre_processor.tested_symbols
+
+    @property
+    def included(self):
+        """The files #included by the last parse to finish, directly or not"""
+        return self._pre_processor.included
+
+    @property
+    def include_paths(self):
+        return self._pre_processor.include_paths
+
+    @property
+    def include_graph(self):
+        """Which files #include which (see IncludeGraph)"""
+        return self._pre_processor.include_graph
+
+    @property
+    def ignore_hash_error(self):
+        return self._pre_processor.ignore_hash_error
+
+    @property
+    def pre_processor_backend(self):
+        return self._pre_processor.backend
+
     def on_error(self, error_data):
         pass
 
-    def parse(self, parse_source) -> Tree:
-        preprocessed = self._pre_processor.pre_process(parse_source, on_error=self.on_error)
-        return self._ts_parser.parse(preprocessed, on_error=self.on_error)
+    def pre_process(self, parse_source, defines: Optional[Mapping] = None,
+                    stats: Optional[ParseStats] = None) -> Tree:
+        """Apply the preprocessor directives only
+
+        The result can be passed to parse_pre_processed(). Its shape
+        depends on pre_processor_backend (see TsIniPreProcessor.pre_process).
+        """
+        return self._pre_processor.pre_process(parse_source, on_error=self.on_error, defines=defines, stats=stats)
+
+    def pre_process_stream(self, parse_source, defines: Optional[Mapping] = None,
+                           stats: Optional[ParseStats] = None, backend: Optional[str] = None) -> PreProcessStream:
+        """Apply the preprocessor directives, yielding each kept line as a token
+
+        The result can be passed to parse_pre_processed()
+
+        backend: this file's preprocessor backend, if not pre_processor_backend
+        """
+        return self._pre_processor.pre_process_stream(parse_source, defines=defines, stats=stats, backend=backend)
+
+    def include(self, file_path: Token, symbols: Iterable[str], parse_source=None) -> Optional[IncludedFile]:
+        """Preprocess the file an #include line names (see TsIniPreProcessor.include)"""
+        return self._pre_processor.include(file_path, symbols, parse_source)
+
+    def parse_pre_processed(self, pre_processed: Union[Tree, Iterable[Token]],
+                            stats: Optional[ParseStats] = None) -> Tree:
+        """Parse the output of pre_process() or TsIniPreProcessor.pre_process_stream()
+
+        A syntax error (a Lark UnexpectedInput) has a source attribute: the
+        path of the #include file it is in, or None (see note_source).
+        """
+        try:
+            return self._ts_parser.parse(pre_processed, on_error=self.on_error,
+                                         stats=None if stats is None else stats.stage('parse'))
+        except UnexpectedInput as error:
+            # Lines spliced in from an #include file keep their own
+            # positions: say which file they are in
+            note_source(error, getattr(getattr(error, 'token', None), 'source', None))
+            raise
+
+    def parse(self, parse_source, defines: Optional[Mapping] = None, stats: Optional[ParseStats] = None) -> Tree:
+        """Preprocess & parse an INI file
+
+        defines: the preprocessor symbols ({symbol: value}), instead of
+            those set by define()
+        stats: record per rule & per terminal counts, and time, in this
+            ParseStats. Off by default.
+        """
+        if self._streaming:
+            return self.parse_pre_processed(self.pre_process_stream(parse_source, defines, stats), stats)
+        return self.parse_pre_processed(self.pre_process(parse_source, defines, stats), stats)
+
+    def parse_model(self, parse_source, defines: Optional[Mapping] = None,
+                    stats: Optional[ParseStats] = None, pool: Optional[ModelPool] = None) -> TsIniFile:
+        """Preprocess & parse an INI file straight to the model
+
+        Same result as DataClassTransformer().transform(parse(...)), but no
+        Tree is built: the model is built as the parser reduces each rule,
+        from the streaming preprocessor's lines. Faster & uses less memory,
+        but there are no line/column positions.
+
+        pool: share strings, value objects & identical pages with the other
+            files loaded with this ModelPool (see DataClassTransformer)
+        """
+        try:
+            return self._ts_parser.parse(self.pre_process_stream(parse_source, defines, stats),
+                                         TsIniParser.InlineDataClassTransformer(stats, pool), on_error=self.on_error,
+                                         stats=None if stats is None else stats.stage('parse_model'))
+        except UnexpectedInput as error:
+            # Lines spliced in from an #include file keep their own
+            # positions: say which file they are in
+            note_source(error, getattr(getattr(error, 'token', None), 'source', None))
+            raise
@@ -1,12 +1,39 @@
+from functools import partial
 from pathlib import Path
-from lark import Lark, Transformer, Tree, Token
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, Optional, Union
+from lark import Transformer, Tree, Token
+from lark.exceptions import UnexpectedInput
 from .text_io_lexer import TextIoLexer
+from .shared_parser import SharedParser
+from .line_scanner import LineScanner
+from .includes import (INCLUDE_CACHE, IncludeCache, IncludedFile, IncludedToken, IncludeGraph, find_include,
+                       note_source, source_path)
+from .instrumentation import ParseStats
 
 _GRAMMAR = Path(__file__).parent / 'grammars' / 'pre_processor.lark'
-_GRAMMAR_CACHE = _GRAMMAR.with_suffix('.lark.cache')
+
+
+class _ConditionalFrame:
+    """State of one #if/#elif/#else/#endif block while it is being parsed"""
+    __slots__ = ('parent_active', 'taken', 'active')
+
+    def __init__(self, parent_active: bool):
+        self.parent_active = parent_active
+        self.taken = False
+        self.active = False
+
+    def branch(self, condition: bool):
+        """Start an #if/#elif branch. The first true branch wins."""
+        self.active = self.parent_active and not self.taken and condition
+        self.taken = self.taken or condition
+
+    def else_branch(self):
+        self.branch(True)
 
 
 class TsIniPreProcessor:
+    # pylint: disable=too-many-instance-attributes
     """TunserStudio INI file pre-processpr
 
     The TS INI file uses pre-processing directives to include or exclude lines
@@ -16,52 +43,64 @@ class TsIniPreProcessor:
     """
 
     class PreProcessorTransformer(Transformer):
-        # pylint: disable=no-self-use
+        # pylint: disable=no-self-use,too-many-instance-attributes,too-many-public-methods
         """Transformer for the preprocessor grammar.
 
         Will apply #if directives to include/exclude lines from the
-        source file.
+        source file. One instance per preprocessing run.
+
+        symbol_table: the symbols for the run. #set/#unset change it.
+        sink: if not None, kept lines are appended to it as they are
+            processed and no tree is built.
+        includer: called to preprocess an #include: (FILE_PATH token,
+            transformer) -> IncludedFile. None skips #include lines.
+        include_chain: the files being included, outermost first
+        stats: if not None, the ParseStats to record the #if nesting in
         """
 
-        def __init__(self, symbol_table, ignore_hash_error: bool):
+        def __init__(self, symbol_table: dict, ignore_hash_error: bool, parse_source=None, sink=None,
+                     includer=None, include_chain: tuple = (), stats: Optional[ParseStats] = None):
+            # pylint: disable=too-many-arguments
             super().__init__()
             self._symbol_table = symbol_table
             self._ignore_hash_error = ignore_hash_error
-            self._parse_source = None
+            self._parse_source = parse_source
+            self._tested_symbols = set()
+            self._conditionals = []
+            self._awaiting_condition = False
+            self._sink = sink
+            self._pending_line = None
+            self._includer = includer
+            self._include_chain = include_chain
+            self._included = set()
+            self._direct_includes = set()
+            self._stats = stats
+
+        def _raise_directive(self, message, token):
+            raise SyntaxError(message,
+                              (self._parse_source,
+                               token.line,
+                               token.column,
+                               token.value))
 
         def pp_conditional(self, children):
 
             """Process pp_conditional tree object"""
 
-            def is_token(item, token_type_name: str) -> bool:
-                return isinstance(item, Token) and item.type == token_type_name
+            if self._sink is not None:
+                return None
 
             # The other rule processors will have applied the conditional
             # tests and generated either ppif_body or empty trees.
             # An If/ElseIf combo may generate more than one ppif_body, so
             # pick the first one - this will be the first that evaluated to
             # True which is the same logic the C preprocessor uses.
+            #
+            # Any #error/#exit in the selected body has already been
+            # raised by the terminal callbacks (see _check_directive)
             selected_body = [child for child in children if child]
             selected_body = selected_body[0] if selected_body else None
 
-            # Check for any error directives from the INI file
-            # We only expect these inside a pre-processor conditional
-            if selected_body:
-                errors = list(selected_body.scan_values(lambda v: is_token(v, 'ERROR_MSG')))
-                if errors:
-                    raise SyntaxError('#error directive triggered',
-                                      (self._parse_source,
-                                       errors[0].line,
-                                       errors[0].column,
-                                       errors[0].value))
-                exit_directives = list(selected_body.scan_values(lambda v: is_token(v, 'EXIT_TAG')))
-                if exit_directives:
-                    raise SyntaxError('#exit directive triggered',
-                                      (self._parse_source,
-                                       exit_directives[0].line,
-                                       exit_directives[0].column,
-                                       exit_directives[0].value))
-
             return selected_body
 
         def if_part(self, children):
@@ -92,7 +131,7 @@ class TsIniPreProcessor:
 
         def symbol(self, children):
             """ Process a symbol test"""
-            return children[0].value in self._symbol_table.keys()
+            return self._on_condition(self._is_defined(children[0].value))
 
         def expression(self, children):
             """Process an expression
@@ -100,34 +139,204 @@ class TsIniPreProcessor:
             Currently we only support (symbol | !symbol)
             """
             if len(children) > 1:  # Negated
-                return not children[1].value in self._symbol_table.keys()
-            return children[0].value in self._symbol_table.keys()
+                return self._on_condition(not self._is_defined(children[1].value))
+            return self._on_condition(self._is_defined(children[0].value))
+
+        def _is_defined(self, identifier):
+            self._tested_symbols.add(identifier)
+            return identifier in self._symbol_table.keys()
 
         def include(self, children):
-            # pylint: disable=unused-argument
-            # Just skip includes for now
-            return None
+            """Process #include: splice in the included file's kept lines"""
+            if self._includer is None or not self._active:
+                return None
+            included = self._includer(children[0], self)
+            if included is None:
+                self._raise_directive('#include file not found', children[0])
+            self._direct_includes.add(included.path)
+            self._included.add(included.path)
+            self._included.update(included.includes)
+            self._tested_symbols.update(included.tested_symbols)
+            # Apply the included file's #set/#unset
+            for symbol in set(self._symbol_table) - included.symbols:
+                del self._symbol_table[symbol]
+            for symbol in included.symbols:
+                self._symbol_table.setdefault(symbol, True)
+            if self._sink is not None:
+                self._sink.extend(included.lines)
+                return None
+            return Tree('include', list(included.lines))
 
         def error(self, children):
-            if self._ignore_hash_error:
+            if self._ignore_hash_error or self._sink is not None:
                 return None
             return Tree('error', children)
 
         def exit(self, children):
-            if self._ignore_hash_error:
+            if self._ignore_hash_error or self._sink is not None:
                 return None
             return Tree('exit', children)
 
-        def set_parse_source(self, parse_source):
-            self._parse_source = parse_source
+        def ppif_body(self, children):
+            return None if self._sink is not None else Tree('ppif_body', children)
+
+        def start(self, children):
+            return None if self._sink is not None else Tree('start', children)
+
+        # ================== Conditional tracking =====================
+        # The terminal callbacks below run as each token is shifted, i.e. in
+        # file order. So the conditional stack always describes the line being
+        # processed. Condition values arrive via expression()/symbol(),
+        # which are reduced before the conditional body is lexed.
+        #
+        # This is used to raise #error/#exit and, in streaming mode, to emit
+        # kept lines immediately.
+
+        # pylint: disable=invalid-name
+
+        @property
+        def _active(self):
+            return not self._conditionals or self._conditionals[-1].active
+
+        def _open_conditional(self, token):
+            self._conditionals.append(_ConditionalFrame(self._active))
+            if self._stats is not None:
+                self._stats.conditional_depths[len(self._conditionals)] += 1
+            self._awaiting_condition = True
+            return token
+
+        _PP_IF_TAG = _open_conditional
+        _PP_IFDEF_TAG = _open_conditional
+        _PP_IFNDEF_TAG = _open_conditional
+
+        def _ELIF_TAG(self, token):
+            self._awaiting_condition = True
+            return token
+
+        def _on_condition(self, value):
+            if self._awaiting_condition:
+                self._conditionals[-1].branch(value)
+                self._awaiting_condition = False
+            return value
+
+        def _ELSE_TAG(self, token):
+            self._conditionals[-1].else_branch()
+            return token
+
+        def _ENDIF_TAG(self, token):
+            self._conditionals.pop()
+            return token
+
+        def LINE(self, token):
+            if self._sink is None:
+                return token
+            self._pending_line = token if self._active else None
+            return None
+
+        def NEWLINE(self, token):
+            if self._sink is None:
+                return token
+            line = self._pending_line
+            if line is not None:
+                # Merge the line & its line ending: one token per line
+                # downstream
+                self._sink.append(Token('LINE', line + token,
+                                        line.start_pos, line.line, line.column,
+                                        token.end_line, token.end_column, token.end_pos))
+                self._pending_line = None
+            return None
+
+        def _check_directive(self, token, message):
+            # Raised as soon as the directive is seen if every enclosing
+            # conditional branch is selected. This is linear in the file
+            # size, however deeply the conditionals nest.
+            #
+            # We only expect these inside a pre-processor conditional
+            if not self._ignore_hash_error and self._conditionals and self._active:
+                self._raise_directive(message, token)
+            return token
+
+        def ERROR_MSG(self, token):
+            return self._check_directive(token, '#error directive triggered')
+
+        def EXIT_TAG(self, token):
+            return self._check_directive(token, '#exit directive triggered')
+
+        # pylint: enable=invalid-name
+
+        @property
+        def symbols(self):
+            return MappingProxyType(self._symbol_table)
+
+        @property
+        def tested_symbols(self):
+            return frozenset(self._tested_symbols)
+
+        @property
+        def included(self):
+            return frozenset(self._included)
+
+        @property
+        def direct_includes(self):
+            """The files #included by this file itself"""
+            return frozenset(self._direct_includes)
+
+        @property
+        def parse_source(self):
+            return self._parse_source
+
+        @property
+        def include_chain(self):
+            return self._include_chain
+
+        @property
+        def stats(self):
+            return self._stats
+
+        @property
+        def sink(self):
+            return self._sink
+
+        @property
+        def active(self):
+            """Whether the line being processed is kept"""
+            return self._active
+
+        @property
+        def ignore_hash_error(self):
+            return self._ignore_hash_error
+
+    BACKENDS = ('lark', 'scanner')
 
-    def __init__(self, ignore_hash_error: bool):
+    def __init__(self, ignore_hash_error: bool, block_size: int = TextIoLexer.BLOCK_SIZE,
+                 include_paths: Optional[Iterable[Union[str, Path]]] = None,
+                 include_cache: IncludeCache = INCLUDE_CACHE, backend: str = 'lark'):
+        # pylint: disable=too-many-arguments
+        """
+        block_size: the input is lexed in blocks of about this many
+            characters (0: a line at a time). See TextIoLexer.
+        include_paths: the folders to search for #include files, after the
+            including file's folder. None skips #include lines.
+        include_cache: where preprocessed #include files are kept. By
+            default, shared by every preprocessor in the process.
+        backend: 'lark' parses with the preprocessor grammar. 'scanner'
+            finds the directives with a line scanner (see LineScanner):
+            the same kept lines, several times faster.
+        """
+        if backend not in TsIniPreProcessor.BACKENDS:
+            raise ValueError(f'Unknown preprocessor backend: {backend}')
+        self._backend = backend
+        self._block_size = block_size
         self._symbol_table = {}
-        self._pp_transformer = TsIniPreProcessor.PreProcessorTransformer(self._symbol_table, ignore_hash_error)
-        self._processor = Lark.open(_GRAMMAR, parser='lalr',
-                                    transformer=self._pp_transformer,
-                                    cache=str(_GRAMMAR_CACHE))
-        self._processor.parser.lexer = TextIoLexer(self._processor.parser.lexer)
+        self._ignore_hash_error = ignore_hash_error
+        self._tested_symbols = frozenset()
+        self._included = frozenset()
+        self._include_paths = None if include_paths is None else tuple(Path(path) for path in include_paths)
+        self._include_cache = include_cache
+        # The per run state is in the transformer & the lexer adapter, so
+        # one instance can preprocess several files at once (e.g. from
+        # several threads).
+        self._processor = SharedParser(_GRAMMAR, partial(TextIoLexer, block_size=block_size))
 
     def define(self, symbol: str, value):
         """Define a preprocessor symbol to control preprocessing condtionals
@@ -136,10 +345,228 @@ class TsIniPreProcessor:
           #set CAN_COMMANDS
         becomes
           define('CAN_COMMANDS', True)
+
+        Sets the default symbols: #set/#unset in a file only change the
+        symbols for that file.
         """
 
         self._symbol_table[symbol] = value
 
-    def pre_process(self, parse_source, on_error=None) -> Tree:
-        self._pp_transformer.set_parse_source(parse_source)
-        return self._processor.parse(parse_source, on_error=on_error)
+    def undefine(self, symbol: str):
+        """Remove a preprocessor symbol. Equivalent of #unset in the INI file."""
+
+        self._symbol_table.pop(symbol, None)
+
+    @property
+    def symbols(self):
+        """The currently defined symbols (read only)"""
+        return MappingProxyType(self._symbol_table)
+
+    @property
+    def tested_symbols(self):
+        """The symbols tested by #if/#ifdef etc. during the last pre_process() call to finish"""
+        return self._tested_symbols
+
+    @property
+    def included(self):
+        """The files #included during the last pre_process() call to finish, directly or not"""
+        return self._included
+
+    @property
+    def include_paths(self):
+        return self._include_paths
+
+    @property
+    def include_graph(self) -> IncludeGraph:
+        """Which files #include which, for every file preprocessed through the include cache"""
+        return self._include_cache.graph
+
+    @property
+    def ignore_hash_error(self):
+        return self._ignore_hash_error
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def _transformer(self, parse_source, defines: Optional[Mapping], sink=None, include_chain: tuple = (),
+                     stats: Optional[ParseStats] = None):
+        # pylint: disable=too-many-arguments
+        symbol_table = dict(self._symbol_table if defines is None else defines)
+        includer = None if self._include_paths is None else self._include
+        return TsIniPreProcessor.PreProcessorTransformer(symbol_table, self._ignore_hash_error, parse_source, sink,
+                                                         includer, include_chain, stats)
+
+    @staticmethod
+    def _stage_stats(stats: Optional[ParseStats]):
+        return None if stats is None else stats.stage('pre_process')
+
+    def include(self, file_path: Token, symbols: Iterable[str], parse_source=None) -> Optional[IncludedFile]:
+        """Preprocess the file an #include line names, through the include cache
+
+        file_path: the #include argument
+        symbols: the symbols defined where the file is included
+        parse_source: the including file, whose folder is searched first
+
+        Returns None if there is no such file, or no include paths (the
+        #include is skipped).
+        """
+        if self._include_paths is None:
+            return None
+        return self._include_file(file_path, symbols, parse_source, (), None)
+
+    def _include(self, file_path: Token, transformer) -> Optional[IncludedFile]:
+        return self._include_file(file_path, transformer.symbols, transformer.parse_source,
+                                  transformer.include_chain, transformer.stats)
+
+    def _include_file(self, file_path: Token, symbols: Iterable[str], parse_source, include_chain: tuple,
+                      stats: Optional[ParseStats]) -> Optional[IncludedFile]:
+        # pylint: disable=too-many-arguments
+        including = source_path(parse_source)
+        path = find_include(file_path.value, self._include_paths, including)
+        if path is None:
+            return None
+        if path == including or path in include_chain:
+            raise SyntaxError('recursive #include', (parse_source, file_path.line, file_path.column, file_path.value))
+        key = self._include_cache.key(path, symbols, self._ignore_hash_error, self._include_paths)
+        included = self._include_cache.get(key)
+        if included is None:
+            included = self._pre_process_include(path, symbols, include_chain + (path,), stats)
+            self._include_cache.put(key, included)
+        return included
+
+    def _pre_process_include(self, path: Path, symbols: Iterable[str], include_chain: tuple,
+                             stats: Optional[ParseStats]) -> IncludedFile:
+        # Only whether a symbol is defined matters to the preprocessor, so
+        # the cache is keyed on the symbol names.
+        sink = []
+        with open(path, 'rb') as source:
+            transformer = self._transformer(source, dict.fromkeys(symbols, True), sink, include_chain, stats)
+            try:
+                for _ in self._steps(source, transformer, stats):
+                    pass
+            except (SyntaxError, UnexpectedInput) as error:
+                note_source(error, path)
+                raise
+        self._record_includes(transformer)
+        # Lines spliced in from the file's own #includes already have a source
+        lines = tuple(line if isinstance(line, IncludedToken) else IncludedToken.borrow(line, path) for line in sink)
+        return IncludedFile(path, lines, frozenset(transformer.symbols), transformer.tested_symbols,
+                            transformer.included)
+
+    def _record_includes(self, transformer):
+        # At the end of a run: the file's #includes replace those recorded
+        # before, so a file that stops including another is no longer one
+        # of its dependents
+        including = source_path(transformer.parse_source) if self._include_paths is not None else None
+        if including is not None:
+            self._include_cache.graph.replace(including, transformer.direct_includes)
+
+    def pre_process(self, parse_source, on_error=None, defines: Optional[Mapping] = None,
+                    stats: Optional[ParseStats] = None) -> Tree:
+        """Apply the preprocessor directives
+
+        The tree depends on the backend. 'lark' returns the preprocessor
+        grammar's tree: LINE & NEWLINE tokens, with the kept #if bodies as
+        ppif_body subtrees. 'scanner' returns Tree('start', lines): the
+        kept lines' LINE tokens, newline included, as pre_process_stream()
+        yields them. Both have the same lines at the same positions &
+        parse to the same result.
+
+        defines: the symbols to preprocess with, instead of those set by
+            define()
+        stats: record the rules, tokens & #if nesting in this ParseStats
+        """
+        if self._backend == 'scanner':
+            # Only the kept lines: as pre_process_stream()
+            sink = []
+            transformer = self._transformer(parse_source, defines, sink, stats=stats)
+            for _ in self._steps(parse_source, transformer, stats):
+                pass
+            tree = Tree('start', sink)
+        else:
+            transformer = self._transformer(parse_source, defines, stats=stats)
+            tree = self._processor.parse(parse_source, transformer, on_error=on_error,
+                                         stats=self._stage_stats(stats))
+        self._tested_symbols = transformer.tested_symbols
+        self._included = transformer.included
+        self._record_includes(transformer)
+        return tree
+
+    def pre_process_stream(self, parse_source, defines: Optional[Mapping] = None,
+                           stats: Optional[ParseStats] = None, backend: Optional[str] = None) -> 'PreProcessStream':
+        """Streaming version of pre_process()
+
+        Returns an iterator of a LINE token for each line that is kept,
+        yielded as soon as it is processed. No Tree is built.
+
+        backend: preprocess this file with another backend (e.g. the
+            faster 'scanner'): the same lines
+        """
+        if backend not in (None,) + TsIniPreProcessor.BACKENDS:
+            raise ValueError(f'Unknown preprocessor backend: {backend}')
+        sink = []
+        transformer = self._transformer(parse_source, defines, sink, stats=stats)
+        return PreProcessStream(self, transformer, self._steps(parse_source, transformer, stats, backend), sink)
+
+    def _steps(self, parse_source, transformer, stats: Optional[ParseStats],
+               backend: Optional[str] = None) -> Iterator[None]:
+        # Preprocesses parse_source into the transformer's sink, a step at a
+        # time
+        if (backend or self._backend) == 'scanner':
+            return LineScanner(transformer, self._stage_stats(stats)).scan(parse_source, self._block_size)
+        interactive = self._processor.parse_interactive(parse_source, transformer, stats=self._stage_stats(stats))
+        return _feed(interactive)
+
+
+def _feed(interactive) -> Iterator[None]:
+    token = None
+    for token in interactive.lexer_state.lex(interactive.parser_state):
+        interactive.feed_token(token)
+        yield
+    interactive.feed_eof(token)
+
+
+class PreProcessStream:
+    """The lines kept by a streaming preprocessor run (an iterator of LINE tokens)
+
+    symbols & tested_symbols are for this run only: symbols changes as the
+    #set/#unset lines are processed.
+    """
+
+    def __init__(self, pre_processor: TsIniPreProcessor, transformer, steps: Iterator[None], sink: list):
+        """steps: preprocesses into sink, a step at a time"""
+        self._transformer = transformer
+        self._lines = self._generate(pre_processor, steps, sink)
+
+    def _generate(self, pre_processor, steps, sink) -> Iterator[Token]:
+        for _ in steps:
+            if sink:
+                yield from sink
+                sink.clear()
+        yield from sink
+        # pylint: disable=protected-access
+        pre_processor._tested_symbols = self.tested_symbols
+        pre_processor._included = self.included
+        pre_processor._record_includes(self._transformer)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Token:
+        return next(self._lines)
+
+    @property
+    def symbols(self):
+        """The symbols defined at this point in the file (read only)"""
+        return self._transformer.symbols
+
+    @property
+    def tested_symbols(self):
+        """The symbols tested so far"""
+        return self._transformer.tested_symbols
+
+    @property
+    def included(self):
+        """The files #included so far, directly or not"""
+        return self._transformer.included
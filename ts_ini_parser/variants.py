@@ -0,0 +1,244 @@
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Union
+from lark import Transformer, Token
+from .text_io_lexer import TextIoLexer
+from .ts_ini_parser import TsIniParser
+from .ts_ini_preprocessor import _GRAMMAR
+from .shared_parser import SharedParser
+from .lazy_ini_file import LazyTsIniFile, _index_sections
+from .dataclasses.ts_ini_file import TsIniFile
+
+# Sections that table & curve bins reference: the wired tables & curves
+# can only be shared by variants that share these.
+_REFERENCED_SECTIONS = ('Constants', 'PcVariables', 'OutputChannels')
+_REFERENCING_SECTIONS = ('TableEditor', 'CurveEditor')
+
+# Built on first use & shared by all VariantSource objects
+_STRUCTURE_PARSER: Optional[SharedParser] = None
+
+
+class _Conditional(NamedTuple):
+    """An unresolved #if/#elif/#else/#endif block"""
+    # [(condition, body)]. The condition is (symbol, negated) or None for
+    # #else
+    branches: list
+
+
+class _Directive(NamedTuple):
+    """A #set, #unset, #error, #exit or #include line"""
+    kind: str
+    token: Token
+
+
+class _StructureTransformer(Transformer):
+    # pylint: disable=no-self-use
+    """Transformer for the preprocessor grammar that keeps the conditionals
+
+    Builds a list of nodes: a LINE token for each unconditional line, with
+    its line ending; _Conditional for each #if block & _Directive for the
+    other directives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pending_line = None
+
+    @staticmethod
+    def _body(children):
+        return [child for child in children if child is not None]
+
+    def start(self, children):
+        return self._body(children)
+
+    def ppif_body(self, children):
+        return self._body(children)
+
+    def pp_conditional(self, children):
+        return _Conditional([branch if isinstance(branch, tuple) else (None, branch) for branch in children])
+
+    def if_part(self, children):
+        return (children[0], children[1])
+
+    elif_part = if_part
+
+    def symbol(self, children):
+        # Same as the resolving preprocessor: #ifndef tests for the symbol
+        # being defined, like #ifdef.
+        return (children[0].value, False)
+
+    def expression(self, children):
+        if len(children) > 1:  # Negated
+            return (children[1].value, True)
+        return (children[0].value, False)
+
+    def set(self, children):
+        return _Directive('set', children[0])
+
+    def unset(self, children):
+        return _Directive('unset', children[0])
+
+    def error(self, children):
+        return _Directive('error', children[0])
+
+    def exit(self, children):
+        return _Directive('exit', children[0])
+
+    def include(self, children):
+        return _Directive('include', children[0])
+
+    # pylint: disable=invalid-name
+
+    def LINE(self, token):
+        self._pending_line = token
+
+    def NEWLINE(self, token):
+        # Merge the line & its line ending, as the streaming preprocessor does
+        line = self._pending_line
+        self._pending_line = None
+        return Token('LINE', line + token,
+                     line.start_pos, line.line, line.column,
+                     token.end_line, token.end_column, token.end_pos)
+
+    # pylint: enable=invalid-name
+
+
+def _structure_parser() -> SharedParser:
+    global _STRUCTURE_PARSER  # pylint: disable=global-statement
+    if _STRUCTURE_PARSER is None:
+        _STRUCTURE_PARSER = SharedParser(_GRAMMAR, TextIoLexer)
+    return _STRUCTURE_PARSER
+
+
+class VariantSource:
+    """An INI file preprocessed once, with its #if blocks left unresolved
+
+    Materializes the file for any set of preprocessor symbols without
+    preprocessing it again. Sections that come out the same in several
+    variants are parsed & transformed once and shared by the variants.
+    Treat the results as read only: a change to a shared section is seen
+    by every variant sharing it.
+    """
+
+    def __init__(self, parser: TsIniParser, parse_source):
+        self._parser = parser
+        self._parse_source = parse_source
+        self._nodes = _structure_parser().parse(parse_source, _StructureTransformer())
+        # Shared between variants
+        self._sections: Dict[tuple, object] = {}
+        self._file_headers: Dict[tuple, list] = {}
+        self._variants: Dict[tuple, TsIniFile] = {}
+
+    def lines(self, defines: Union[Mapping, Iterable[str]]) -> List[Token]:
+        """The lines kept when preprocessing with the defines
+
+        defines: the preprocessor symbols, as passed to TsIniParser.define(),
+            or just the symbol names. Replaces the parser's symbols.
+        """
+        symbols = dict(defines) if isinstance(defines, Mapping) else dict.fromkeys(defines, True)
+        kept = []
+        self._resolve(self._nodes, symbols, True, 0, kept)
+        return kept
+
+    def _resolve(self, nodes, symbols: dict, active: bool, depth: int, kept: list):
+        # pylint: disable=too-many-arguments
+        # Mirrors TsIniPreProcessor: every branch is visited in file order
+        # since #set/#unset apply even in branches that aren't selected.
+        for node in nodes:
+            if isinstance(node, Token):
+                if active:
+                    kept.append(node)
+            elif isinstance(node, _Conditional):
+                taken = False
+                for condition, body in node.branches:
+                    if condition is None:
+                        selected = not taken
+                    else:
+                        symbol, negated = condition
+                        selected = not taken and (symbol in symbols) != negated
+                    taken = taken or selected
+                    self._resolve(body, symbols, active and selected, depth + 1, kept)
+            elif node.kind == 'set':
+                symbols[node.token.value] = True
+            elif node.kind == 'unset':
+                symbols.pop(node.token.value, None)
+            elif node.kind == 'include':
+                if active:
+                    self._include(node.token, symbols, kept)
+            elif active and depth and not self._parser.ignore_hash_error:
+                # #error/#exit, only raised inside a selected conditional
+                raise SyntaxError(f'#{node.kind} directive triggered',
+                                  (self._parse_source, node.token.line, node.token.column, node.token.value))
+
+    def _include(self, file_path: Token, symbols: dict, kept: list):
+        # Same as the resolving preprocessor: the included file is
+        # preprocessed (or taken from the include cache) for the symbols
+        # defined here, and its #set/#unset apply after it
+        if self._parser.include_paths is None:
+            return
+        included = self._parser.include(file_path, symbols, self._parse_source)
+        if included is None:
+            raise SyntaxError('#include file not found',
+                              (self._parse_source, file_path.line, file_path.column, file_path.value))
+        for symbol in set(symbols) - included.symbols:
+            del symbols[symbol]
+        for symbol in included.symbols:
+            symbols.setdefault(symbol, True)
+        kept.extend(included.lines)
+
+    def parse(self, defines: Union[Mapping, Iterable[str]]) -> TsIniFile:
+        """The TsIniFile for one set of defines (see lines())
+
+        Defines that keep the same lines return the same TsIniFile.
+        """
+        lines = self.lines(defines)
+        # Included lines are positioned within their own file
+        variant_key = tuple((getattr(line, 'source', None), line.start_pos) for line in lines)
+        variant = self._variants.get(variant_key)
+        if variant is None:
+            variant = self._variants[variant_key] = self._materialize(lines)
+        return variant
+
+    def _materialize(self, lines: List[Token]) -> TsIniFile:
+        header_lines, sections = _index_sections(lines, {})
+        lazy = LazyTsIniFile(self._parser, header_lines, sections)
+
+        # A section's model depends on its lines & the #defines before it
+        header_key = tuple(line.value for line in header_lines)
+        section_keys = {}
+        defines = ()
+        for section in sections:
+            _, section_lines = section_keys.get(section.name, ((), ()))
+            section_keys[section.name] = (defines, section_lines + tuple(line.value for line in section.lines))
+            defines += tuple(line.value for line in section.hashdef_lines)
+        section_keys = {name: (header_key,) + key for name, key in section_keys.items()}
+        references = tuple(section_keys.get(name) for name in _REFERENCED_SECTIONS)
+
+        def load_order(name):
+            return 0 if name in _REFERENCED_SECTIONS else 2 if name in _REFERENCING_SECTIONS else 1
+
+        for name in sorted(section_keys, key=load_order):
+            key = section_keys[name] + (references if name in _REFERENCING_SECTIONS else ())
+            if key in self._sections:
+                lazy.data[name] = self._sections[key]
+            else:
+                self._sections[key] = lazy[name]
+
+        file_header = self._file_headers.get(header_key)
+        if file_header is None:
+            file_header = self._file_headers[header_key] = lazy.file_header
+        return TsIniFile(dict_data=lazy.data, file_header=file_header)
+
+
+def parse_variants(parser: TsIniParser,
+                   parse_source,
+                   define_sets: Iterable[Union[Mapping, Iterable[str]]]) -> List[TsIniFile]:
+    """Parse one INI file for many sets of preprocessor symbols
+
+    Much cheaper than a parse per define set: the file is preprocessed
+    once & sections that are the same in several variants are parsed once.
+    Define sets that select the same lines share a TsIniFile. E.g.
+        lambda_file, afr_file = parse_variants(parser, file, [{'LAMBDA'}, {}])
+
+    Returns a TsIniFile per define set, in the same order.
+    """
+    source = VariantSource(parser, parse_source)
+    return [source.parse(defines) for defines in define_sets]